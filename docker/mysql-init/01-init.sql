@@ -12,9 +12,8 @@ USE dwh;
 -- GRANT SELECT ON dwh.* TO 'grafana'@'%';
 
 -- Index pour améliorer les performances
-CREATE INDEX IF NOT EXISTS idx_releve_date ON Releve(dateReleve);
-CREATE INDEX IF NOT EXISTS idx_releve_region ON Releve(idRegion);
-CREATE INDEX IF NOT EXISTS idx_releve_maladie ON Releve(idMaladie);
+-- Index de Releve : gérés par les migrations de l'API (fast-api/API/migrations),
+-- dont la clé unique (idRegion, dateReleve, idMaladie)
 CREATE INDEX IF NOT EXISTS idx_region_pays ON Regions(idPays);
 CREATE INDEX IF NOT EXISTS idx_pays_continent ON Pays(idContinent);
 
@@ -36,6 +35,7 @@ CREATE TABLE IF NOT EXISTS performance_metrics (
     endpoint VARCHAR(100) NOT NULL,
     response_time DECIMAL(10,3) NOT NULL,
     status_code INT NOT NULL,
+    payload_size INT NULL,  -- ajoutée aux bases existantes par la migration 0003
     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     INDEX idx_service_time (service_name, timestamp)
 );
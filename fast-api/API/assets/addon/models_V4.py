@@ -0,0 +1,91 @@
+# Architectures des modèles temporels V4 : une seule définition, partagée par
+# train_model_V4.py, evaluate_model_V4.py et l'API (services/temporal_models.py).
+# Les poids sont enregistrés en state_dict : déplacer les classes ne change rien
+# aux fichiers .pth existants.
+
+import torch.nn as nn
+
+class TimeSeriesModel(nn.Module):
+    def __init__(self, rnn_type, inp_sz, hid, nl, do, out_w):
+        super().__init__()
+        if rnn_type.upper() == "LSTM":
+            R = nn.LSTM
+        elif rnn_type.upper() == "GRU":
+            R = nn.GRU
+        else:
+            R = nn.RNN
+        self.rnn  = R(inp_sz, hid, nl, dropout=do, batch_first=True)
+        self.proj = nn.Linear(hid, out_w)
+    def forward(self, x):
+        out, _ = self.rnn(x)
+        return self.proj(out[:, -1, :])
+
+class TCNNModel(nn.Module):
+    def __init__(self, inp_sz, out_w):
+        super().__init__()
+        self.conv1 = nn.Conv1d(inp_sz, 64, kernel_size=3, padding=1)
+        self.relu  = nn.ReLU()
+        self.pool  = nn.AdaptiveAvgPool1d(1)
+        self.fc    = nn.Linear(64, out_w)
+    def forward(self, x):
+        x = x.transpose(1, 2)
+        x = self.relu(self.conv1(x))
+        x = self.pool(x).squeeze(-1)
+        return self.fc(x)
+    
+class NBEATSBlock(nn.Module):
+    def __init__(self, input_size, theta_size, hidden_size, n_layers):
+        super().__init__()
+        layers = []
+        for _ in range(n_layers):
+            layers += [nn.Linear(input_size, hidden_size), nn.ReLU()]
+            input_size = hidden_size
+        layers += [nn.Linear(hidden_size, theta_size)]
+        self.net = nn.Sequential(*layers)
+    def forward(self, x):
+        return self.net(x)
+
+class NBEATSModel(nn.Module):
+    def __init__(self, input_window, output_window, 
+                 stack_types, nb_blocks, layer_width):
+        super().__init__()
+        self.input_window = input_window
+        self.output_window = output_window
+        self.blocks = nn.ModuleList()
+        for _ in range(nb_blocks):
+            # ici on ignore stack_types pour simplifier
+            self.blocks.append(
+                NBEATSBlock(input_window, output_window, layer_width, n_layers=2)
+            )
+    def forward(self, x):
+        # x: (B, T, F) → on aplatie temporellement
+        inp = x[:, :, -1]  # on prend la target feature
+        y = 0
+        for b in self.blocks:
+            y = y + b(inp)
+        return y  # (B, output_window)
+
+class TransformerTSModel(nn.Module):
+    def __init__(self, input_window, num_features, d_model, n_heads,
+                 num_layers, dim_feedforward, dropout, output_window):
+        super().__init__()
+        self.input_window = input_window
+        self.src_mask = None
+        encoder_layer = nn.TransformerEncoderLayer(
+            d_model=d_model,
+            nhead=n_heads,
+            dim_feedforward=dim_feedforward,
+            dropout=dropout,
+            batch_first=True
+        )
+        self.transformer = nn.TransformerEncoder(encoder_layer, num_layers=num_layers)
+        self.input_proj  = nn.Linear(num_features, d_model)
+        self.output_proj = nn.Linear(d_model, output_window)
+
+    def forward(self, x):
+        # x: (B, T, F) → projet en (B, T, d_model)
+        x = self.input_proj(x)
+        # transformer expects (B, T, d_model) when batch_first=True
+        y = self.transformer(x, mask=self.src_mask)
+        # on prend la dernière position temporelle
+        return self.output_proj(y[:, -1, :])
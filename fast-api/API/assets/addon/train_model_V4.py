@@ -43,6 +43,9 @@ models_dir      = cfg['paths']['models_dir']
 metrics_dir     = cfg['paths']['metrics_dir']
 n_trials        = cfg['optuna']['n_trials']
 direction       = cfg['optuna']['direction']
+pruner_cfg      = cfg['optuna'].get('pruner', {}) or {}
+warm_cfg        = cfg.get('warm_start', {}) or {}
+drift_tolerance = float(warm_cfg.get('drift_tolerance', 0.1))
 models_cfg      = [m for m in cfg['models'] if m.get('use', False)]
 selected_country= cfg['data_selection'].get('single_country', None)
 cv_splits       = cfg.get('cv_splits', 3)
@@ -66,91 +69,8 @@ if selected_country:
 os.makedirs(models_dir, exist_ok=True)
 os.makedirs(metrics_dir, exist_ok=True)
 
-# 3. Modèles
-class TimeSeriesModel(nn.Module):
-    def __init__(self, rnn_type, inp_sz, hid, nl, do, out_w):
-        super().__init__()
-        if rnn_type.upper() == "LSTM":
-            R = nn.LSTM
-        elif rnn_type.upper() == "GRU":
-            R = nn.GRU
-        else:
-            R = nn.RNN
-        self.rnn  = R(inp_sz, hid, nl, dropout=do, batch_first=True)
-        self.proj = nn.Linear(hid, out_w)
-    def forward(self, x):
-        out, _ = self.rnn(x)
-        return self.proj(out[:, -1, :])
-
-class TCNNModel(nn.Module):
-    def __init__(self, inp_sz, out_w):
-        super().__init__()
-        self.conv1 = nn.Conv1d(inp_sz, 64, kernel_size=3, padding=1)
-        self.relu  = nn.ReLU()
-        self.pool  = nn.AdaptiveAvgPool1d(1)
-        self.fc    = nn.Linear(64, out_w)
-    def forward(self, x):
-        x = x.transpose(1, 2)
-        x = self.relu(self.conv1(x))
-        x = self.pool(x).squeeze(-1)
-        return self.fc(x)
-    
-class NBEATSBlock(nn.Module):
-    def __init__(self, input_size, theta_size, hidden_size, n_layers):
-        super().__init__()
-        layers = []
-        for _ in range(n_layers):
-            layers += [nn.Linear(input_size, hidden_size), nn.ReLU()]
-            input_size = hidden_size
-        layers += [nn.Linear(hidden_size, theta_size)]
-        self.net = nn.Sequential(*layers)
-    def forward(self, x):
-        return self.net(x)
-
-class NBEATSModel(nn.Module):
-    def __init__(self, input_window, output_window, 
-                 stack_types, nb_blocks, layer_width):
-        super().__init__()
-        self.input_window = input_window
-        self.output_window = output_window
-        self.blocks = nn.ModuleList()
-        for _ in range(nb_blocks):
-            # ici on ignore stack_types pour simplifier
-            self.blocks.append(
-                NBEATSBlock(input_window, output_window, layer_width, n_layers=2)
-            )
-    def forward(self, x):
-        # x: (B, T, F) → on aplatie temporellement
-        inp = x[:, :, -1]  # on prend la target feature
-        y = 0
-        for b in self.blocks:
-            y = y + b(inp)
-        return y  # (B, output_window)
-
-class TransformerTSModel(nn.Module):
-    def __init__(self, input_window, num_features, d_model, n_heads,
-                 num_layers, dim_feedforward, dropout, output_window):
-        super().__init__()
-        self.input_window = input_window
-        self.src_mask = None
-        encoder_layer = nn.TransformerEncoderLayer(
-            d_model=d_model,
-            nhead=n_heads,
-            dim_feedforward=dim_feedforward,
-            dropout=dropout,
-            batch_first=True
-        )
-        self.transformer = nn.TransformerEncoder(encoder_layer, num_layers=num_layers)
-        self.input_proj  = nn.Linear(num_features, d_model)
-        self.output_proj = nn.Linear(d_model, output_window)
-
-    def forward(self, x):
-        # x: (B, T, F) → projet en (B, T, d_model)
-        x = self.input_proj(x)
-        # transformer expects (B, T, d_model) when batch_first=True
-        y = self.transformer(x, mask=self.src_mask)
-        # on prend la dernière position temporelle
-        return self.output_proj(y[:, -1, :])
+# 3. Modèles (définitions communes : models_V4.py)
+from models_V4 import TimeSeriesModel, TCNNModel, NBEATSModel, TransformerTSModel
 
 # 4. SMAPE
 def smape(y_true, y_pred):
@@ -158,11 +78,82 @@ def smape(y_true, y_pred):
     diff  = np.abs(y_true - y_pred)
     return np.mean(2 * diff / np.where(denom==0, 1, denom)) * 100
 
-# 5. Objective avec CV temps et gap
+# 5. Pruner multi-fidélité
+def max_epochs(m_cfg):
+    """Nombre d'époques maximal d'un fold (borne haute de l'espace de recherche)"""
+    space = m_cfg['hyperparameters'].get('epochs', {})
+    if 'values' in space:
+        return int(max(space['values']))
+    return int(space.get('high', 20))
+
+def build_pruner(m_cfg):
+    """Instancie le pruner décrit par optuna.pruner dans config_V4.yaml.
+
+    Les pas reportés vont de 0 à cv_splits * max_epochs(m_cfg) - 1 : chaque fold
+    occupe une plage fixe de max_epochs pas, quel que soit le nombre d'époques
+    tiré pour l'essai, afin que les essais restent comparables pas à pas.
+    """
+    kind         = str(pruner_cfg.get('type', 'median')).lower()
+    min_resource = int(pruner_cfg.get('min_resource', 1))
+    reduction    = int(pruner_cfg.get('reduction_factor', 3))
+    max_resource = cv_splits * max_epochs(m_cfg)
+
+    if kind == 'hyperband':
+        return optuna.pruners.HyperbandPruner(
+            min_resource=min_resource,
+            max_resource=max_resource,
+            reduction_factor=reduction
+        )
+    if kind == 'asha':
+        return optuna.pruners.SuccessiveHalvingPruner(
+            min_resource=min_resource,
+            reduction_factor=reduction
+        )
+    if kind == 'none':
+        return optuna.pruners.NopPruner()
+    return optuna.pruners.MedianPruner(
+        n_startup_trials=int(pruner_cfg.get('n_startup_trials', 5)),
+        n_warmup_steps=int(pruner_cfg.get('n_warmup_steps', 0)),
+        interval_steps=1
+    )
+
+def trial_efficiency(study):
+    """Résumé des époques réellement entraînées par rapport au budget prévu.
+
+    Les époques non entraînées sont réparties entre l'élagueur (reste du budget
+    d'un essai élagué) et l'early stopping (fin anticipée d'un fold par la
+    patience, dans tous les essais).
+    """
+    run = budget = early_stopped = 0
+    pruned = complete = 0
+    for t in study.trials:
+        run    += t.user_attrs.get('epochs_run', 0)
+        budget += t.user_attrs.get('epochs_budget', 0)
+        early_stopped += t.user_attrs.get('epochs_early_stopped', 0)
+        if t.state == optuna.trial.TrialState.PRUNED:
+            pruned += 1
+        elif t.state == optuna.trial.TrialState.COMPLETE:
+            complete += 1
+    pruned_saved = budget - run - early_stopped
+    return {
+        'pruner': pruner_cfg.get('type', 'median'),
+        'n_trials': len(study.trials),
+        'n_complete': complete,
+        'n_pruned': pruned,
+        'epochs_run': run,
+        'epochs_budget': budget,
+        'epochs_pruned_saved': pruned_saved,
+        'epochs_early_stopping_saved': early_stopped,
+        'epochs_pruned_saved_fraction': (pruned_saved / budget) if budget else 0.0,
+        'epochs_saved_fraction': (1 - run / budget) if budget else 0.0
+    }
+
+# 6. Objective avec CV temps et gap
 def get_objective(m_cfg, X_tr, y_tr):
     tscv = TimeSeriesSplit(n_splits=cv_splits)
+    fold_stride = max_epochs(m_cfg)
     def objective(trial):
-        # 5.1. suggestion hyperparams
+        # 6.1. suggestion hyperparams
         params = {}
         for hp, space in m_cfg['hyperparameters'].items():
             if 'values' in space:
@@ -176,18 +167,21 @@ def get_objective(m_cfg, X_tr, y_tr):
         if m_cfg['name']=="TransformerTS":
             d_model = int(params['d_model']); n_heads=int(params['n_heads'])
             if d_model % n_heads != 0:
-                raise TrialPruned()       
+                trial.set_user_attr('epochs_run', 0)
+                trial.set_user_attr('epochs_budget', 0)
+                raise TrialPruned()
                     
         lr = params.get('learning_rate', 1e-3)
         bs = int(params.get('batch_size', 32))
-        hid= int(params.get('hidden_size', 16))
-        nl = int(params.get('num_layers', 1))
-        do = float(params.get('dropout', 0.0))
         epochs = int(params.get('epochs', 20))
 
+        # budget d'époques de l'essai, pour le rapport d'efficacité
+        epochs_run = epochs_early_stopped = 0
+        trial.set_user_attr('epochs_budget', epochs * cv_splits)
+
         fold_losses = []
         for fold_id, (train_idx, val_idx) in enumerate(tscv.split(X_tr)):
-            # 5.2. purge gap pour éviter fuite
+            # 6.2. purge gap pour éviter fuite
             val_start = val_idx.min()
             train_idx = train_idx[train_idx < val_start - input_window]
 
@@ -202,34 +196,13 @@ def get_objective(m_cfg, X_tr, y_tr):
                 batch_size=bs, shuffle=False
             )
 
-            # 5.3. instanciation modèle
-            if m_cfg['name'] == "TCNN":
-                model = TCNNModel(X_tr.shape[2], y_tr.shape[1])
-            elif m_cfg['name'] == "NBEATS":
-    # récupérer params spécifiques
-                stack = params['stack_types']
-                nblk  = int(params['nb_blocks_per_stack'])
-                width = int(params['layer_width'])
-                model = NBEATSModel(input_window, output_window, stack, nblk, width)
-            elif m_cfg['name'] == "TransformerTS":
-                model = TransformerTSModel(
-                    input_window,
-                    X_tr.shape[2],
-                    d_model=int(params['d_model']),
-                    n_heads=int(params['n_heads']),
-                    num_layers=int(params['num_layers']),
-                    dim_feedforward=int(params['dim_feedforward']),
-                    dropout=float(params['dropout']),
-                    output_window=y_tr.shape[1]
-                )
-            else:
-                model = TimeSeriesModel(m_cfg['name'],
-                                        X_tr.shape[2], hid, nl, do, y_tr.shape[1])
+            # 6.3. instanciation modèle
+            model = build_model(m_cfg['name'], params, X_tr.shape[2], y_tr.shape[1])
             model.to(device)
             optimizer = torch.optim.Adam(model.parameters(), lr=lr)
             loss_fn   = nn.MSELoss()
 
-            # 5.4. entraînement
+            # 6.4. entraînement
             model.train()
             best_val_loss = float('inf')
             patience_counter = 0
@@ -267,114 +240,219 @@ def get_objective(m_cfg, X_tr, y_tr):
                         val_loss_es += loss_fn(pred_val, yb_val).item()
     
                 val_loss_es /= len(val_loader_es)
+                epochs_run += 1
+
+                # 6.5. pruning à chaque époque (pas global aligné sur le fold)
+                trial.report(val_loss_es, fold_id * fold_stride + epoch)
+                if trial.should_prune():
+                    trial.set_user_attr('epochs_run', epochs_run)
+                    raise TrialPruned()
     
                 # Logique early stopping
                 if val_loss_es < best_val_loss:
                     best_val_loss = val_loss_es
                     patience_counter = 0
-                    best_model_state = model.state_dict().copy()
+                    best_model_state = {k: v.detach().clone() for k, v in model.state_dict().items()}
                 else:
                     patience_counter += 1
     
             # Arrêt si pas d'amélioration
                 if patience_counter >= patience:
                     print(f"Early stopping à l'époque {epoch+1}/{epochs}")
+                    epochs_early_stopped += epochs - (epoch + 1)
+                    trial.set_user_attr('epochs_early_stopped', epochs_early_stopped)
                     break
 
-    # Restaurer les meilleurs poids
-                if best_model_state is not None:
-                    model.load_state_dict(best_model_state)
+            # Restaurer les meilleurs poids du fold, une fois la boucle d'époques terminée
+            if best_model_state is not None:
+                model.load_state_dict(best_model_state)
 
 
-            # 5.5. évaluation fold (même loss_fn)
+            # 6.6. évaluation fold (même loss_fn)
             model.eval()
             with torch.no_grad():
                 pred = model(torch.tensor(X_val, dtype=torch.float32).to(device))
                 val_loss = loss_fn(pred, torch.tensor(y_val, dtype=torch.float32).to(device)).item()
 
-            # 5.6. pruning
-            trial.report(val_loss, fold_id)
-            if trial.should_prune():
-                raise TrialPruned()
-
             fold_losses.append(val_loss)
 
+        trial.set_user_attr('epochs_run', epochs_run)
         return float(np.mean(fold_losses))
     return objective
 
-# 6. Boucle entraînement + Optuna + évaluation sur test set
+# 7. Warm-start à partir du dernier entraînement
+def build_model(name, params, n_features, out_w):
+    """Instancie l'architecture `name` avec les hyperparamètres `params`"""
+    if name == "TCNN":
+        return TCNNModel(n_features, out_w)
+    if name == "NBEATS":
+        return NBEATSModel(input_window, output_window,
+                           params.get('stack_types'),
+                           int(params.get('nb_blocks_per_stack')),
+                           int(params.get('layer_width')))
+    if name == "TransformerTS":
+        return TransformerTSModel(
+            input_window,
+            n_features,
+            d_model=int(params['d_model']),
+            n_heads=int(params['n_heads']),
+            num_layers=int(params['num_layers']),
+            dim_feedforward=int(params['dim_feedforward']),
+            dropout=float(params['dropout']),
+            output_window=out_w
+        )
+    return TimeSeriesModel(name, n_features,
+                           int(params.get('hidden_size', 16)),
+                           int(params.get('num_layers', 1)),
+                           float(params.get('dropout', 0.0)),
+                           out_w)
+
+def data_signature(dat):
+    """Empreinte des données d'entraînement, stockée avec les métriques"""
+    X, y  = dat['X'], dat['y']
+    dates = dat.get('dates')
+    sig = {
+        'n_samples': int(len(X)),
+        'n_features': int(X.shape[2]),
+        'output_window': int(y.shape[1]),
+        'first_date': None,
+        'last_date': None
+    }
+    if dates is not None and len(dates):
+        sig['first_date'] = str(np.datetime_as_string(np.datetime64(dates[0]), unit='D'))
+        sig['last_date']  = str(np.datetime_as_string(np.datetime64(dates[-1]), unit='D'))
+    return sig
+
+def load_previous_run(country, name):
+    """Dernières métriques (best_params, val_loss, data) et poids d'un modèle"""
+    mets = sorted(glob.glob(os.path.join(metrics_dir, f"{country}_{name}_metrics_*.json")),
+                  key=os.path.getmtime, reverse=True)
+    if not mets:
+        return None
+    with open(mets[0], 'r') as f:
+        prev = json.load(f)
+    if 'best_params' not in prev:
+        return None
+    mpath = prev.get('model_path')
+    if not mpath or not os.path.exists(mpath):
+        pths = sorted(glob.glob(os.path.join(models_dir, f"{country}_{name}_*.pth")),
+                      key=os.path.getmtime, reverse=True)
+        mpath = pths[0] if pths else None
+    prev['model_path'] = mpath
+    return prev
+
+def only_appended(prev, sig):
+    """Vrai si les données actuelles prolongent celles du dernier entraînement"""
+    old = prev.get('data')
+    if not old or not prev.get('model_path'):
+        return False
+    if old['n_features'] != sig['n_features'] or old['output_window'] != sig['output_window']:
+        return False
+    if old['first_date'] != sig['first_date'] or old['last_date'] is None or sig['last_date'] is None:
+        return False
+    return sig['last_date'] >= old['last_date'] and sig['n_samples'] >= old['n_samples']
+
+def validation_loss(model, X_val, y_val, loss_fn):
+    model.eval()
+    with torch.no_grad():
+        pred = model(torch.tensor(X_val, dtype=torch.float32).to(device))
+        return loss_fn(pred, torch.tensor(y_val, dtype=torch.float32).to(device)).item()
+
+# 8. Boucle entraînement + Optuna + évaluation sur test set
 for country, dat in data_dict.items():
     X, y = dat['X'], dat['y']
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    sig = data_signature(dat)
 
-    # 6.1. split train / test pour éval finale
+    # 8.1. split train / test pour éval finale
     split_idx   = int(len(X) * train_size)
     X_tr_full   = X[:split_idx]
     y_tr_full   = y[:split_idx]
     X_test      = X[split_idx:]
     y_test      = y[split_idx:]
 
-    for m_cfg in models_cfg:
-        # 6.2. création de l’étude avec pruning
-        study = optuna.create_study(
-            direction=direction,
-            sampler=optuna.samplers.TPESampler(seed=seed),
-            pruner=optuna.pruners.MedianPruner(
-                n_startup_trials=5,
-                n_warmup_steps=0,
-                interval_steps=1
-            )
-        )
-        objective = get_objective(m_cfg, X_tr_full, y_tr_full)
-        study.optimize(objective, n_trials=n_trials, catch=(TrialPruned, AssertionError))
+    # validation interne (fin de X_tr_full) pour l'early stopping final et le contrôle de dérive
+    val_split = 0.1
+    val_size = int(len(X_tr_full) * val_split)
+    X_train_es = X_tr_full[:-val_size] if val_size > 0 else X_tr_full
+    y_train_es = y_tr_full[:-val_size] if val_size > 0 else y_tr_full
+    X_val_es = X_tr_full[-val_size:] if val_size > 0 else X_tr_full[-10:]  # Au moins 10 échantillons
+    y_val_es = y_tr_full[-val_size:] if val_size > 0 else y_tr_full[-10:]
 
-        best = study.best_params
+    for m_cfg in models_cfg:
+        name    = m_cfg['name']
+        loss_fn = nn.MSELoss()
+
+        # 8.2. warm-start : reprise des meilleurs hyperparamètres / poids précédents
+        prev     = load_previous_run(country, name) if warm_cfg.get('enabled', False) else None
+        appended = prev is not None and only_appended(prev, sig)
+        warm_info = {
+            'enabled': bool(warm_cfg.get('enabled', False)),
+            'previous_run': prev is not None,
+            'only_appended': appended,
+            'drift_val_loss': None,
+            'search_skipped': False,
+            'finetuned': False
+        }
 
-        # 6.3. ré-entraînement final sur X_tr_full
+        if appended and prev.get('val_loss') is not None:
+            try:
+                prev_model = build_model(name, prev['best_params'], X.shape[2], y.shape[1]).to(device)
+                prev_model.load_state_dict(torch.load(prev['model_path'], map_location=device))
+                drift_loss = validation_loss(prev_model, X_val_es, y_val_es, loss_fn)
+                warm_info['drift_val_loss'] = drift_loss
+                warm_info['search_skipped'] = drift_loss <= prev['val_loss'] * (1 + drift_tolerance)
+                print(f"[train_model] {country}|{name} contrôle de dérive : perte {drift_loss:.4f} "
+                      f"vs {prev['val_loss']:.4f} précédente → "
+                      f"{'recherche ignorée' if warm_info['search_skipped'] else 'recherche relancée'}")
+            except Exception as e:
+                print(f"[train_model] {country}|{name} modèle précédent inutilisable ({e}), recherche complète")
+                appended = False
+                warm_info['only_appended'] = False
+
+        if warm_info['search_skipped']:
+            best = prev['best_params']
+            efficiency = None
+        else:
+            # 8.3. création de l’étude avec pruning multi-fidélité
+            study = optuna.create_study(
+                direction=direction,
+                sampler=optuna.samplers.TPESampler(seed=seed),
+                pruner=build_pruner(m_cfg)
+            )
+            if prev is not None:
+                # le meilleur essai précédent est évalué en premier
+                study.enqueue_trial(prev['best_params'], skip_if_exists=True)
+            objective = get_objective(m_cfg, X_tr_full, y_tr_full)
+            study.optimize(objective, n_trials=n_trials, catch=(TrialPruned, AssertionError))
+
+            best = study.best_params
+
+            # rapport d'efficacité des essais (fraction d'époques économisées)
+            efficiency = trial_efficiency(study)
+            epath = unique_path(os.path.join(metrics_dir,
+                                             f"{country}_{name}_trial_efficiency_{ts}.json"))
+            with open(epath, 'w') as f:
+                json.dump(efficiency, f, indent=2)
+            print(f"[train_model] {country}|{name} → {efficiency['n_pruned']}/{efficiency['n_trials']} essais élagués, "
+                  f"{efficiency['epochs_pruned_saved_fraction']:.1%} des époques économisées par l'élagage, "
+                  f"{efficiency['epochs_saved_fraction']:.1%} au total avec l'early stopping ({epath})")
+
+        # 8.4. ré-entraînement final sur X_tr_full
         bs = int(best.get('batch_size', 32))
-        hid= int(best.get('hidden_size', 16))
-        nl = int(best.get('num_layers', 1))
-        do = float(best.get('dropout', 0.0))
         lr = best.get('learning_rate', 1e-3)
         epochs = int(best.get('epochs', 20))
 
-        loader = DataLoader(
-            TensorDataset(
-                torch.tensor(X_tr_full, dtype=torch.float32),
-                torch.tensor(y_tr_full, dtype=torch.float32)
-            ),
-            batch_size=bs, shuffle=False
-        )
-        if m_cfg['name'] == "TCNN":
-            model = TCNNModel(X.shape[2], y.shape[1])
-        elif m_cfg['name'] == "NBEATS":
-            model = NBEATSModel(input_window, output_window,
-                                best.get('stack_types'),
-                                int(best.get('nb_blocks_per_stack')),
-                                int(best.get('layer_width')))
-        elif m_cfg['name'] == "TransformerTS":
-            model = TransformerTSModel(
-                input_window,
-                X.shape[2],
-                d_model=int(best['d_model']),
-                n_heads=int(best['n_heads']),
-                num_layers=int(best['num_layers']),
-                dim_feedforward=int(best['dim_feedforward']),
-                dropout=float(best['dropout']),
-                output_window=y.shape[1]
-            )
-        else:
-            model = TimeSeriesModel(m_cfg['name'], X.shape[2], hid, nl, do, y.shape[1])
+        model = build_model(name, best, X.shape[2], y.shape[1])
+        if appended and best == prev['best_params']:
+            # mêmes hyperparamètres : on affine les poids précédents sur les nouvelles dates
+            model.load_state_dict(torch.load(prev['model_path'], map_location='cpu'))
+            epochs = int(warm_cfg.get('finetune_epochs', 5))
+            lr = lr * float(warm_cfg.get('finetune_lr_factor', 0.1))
+            warm_info['finetuned'] = True
+            print(f"[train_model] {country}|{name} fine-tuning depuis {prev['model_path']} ({epochs} époques)")
         model.to(device)
         optimizer = torch.optim.Adam(model.parameters(), lr=lr)
-        loss_fn   = nn.MSELoss()
-
-        val_split = 0.1
-        val_size = int(len(X_tr_full) * val_split)
-        X_train_es = X_tr_full[:-val_size] if val_size > 0 else X_tr_full
-        y_train_es = y_tr_full[:-val_size] if val_size > 0 else y_tr_full
-        X_val_es = X_tr_full[-val_size:] if val_size > 0 else X_tr_full[-10:]  # Au moins 10 échantillons
-        y_val_es = y_tr_full[-val_size:] if val_size > 0 else y_tr_full[-10:]
 
         # Loaders pour entraînement final
         train_loader_final = DataLoader(
@@ -424,7 +502,7 @@ for country, dat in data_dict.items():
             if val_loss_final < best_val_loss_final:
                 best_val_loss_final = val_loss_final
                 patience_counter_final = 0
-                best_model_state_final = model.state_dict().copy()
+                best_model_state_final = {k: v.detach().clone() for k, v in model.state_dict().items()}
             else:
                 patience_counter_final += 1
     
@@ -437,12 +515,12 @@ for country, dat in data_dict.items():
             model.load_state_dict(best_model_state_final)
                 
         # --- sauvegarde du modèle entraîné ---
-        mpath = unique_path(os.path.join(models_dir, f"{country}_{m_cfg['name']}_{ts}.pth"))
+        mpath = unique_path(os.path.join(models_dir, f"{country}_{name}_{ts}.pth"))
         torch.save(model.state_dict(), mpath)
         print(f"[train_model] Modèle sauvegardé → {mpath}")
         # --- fin sauvegarde modèle ---
 
-        # 6.4. évaluation finale sur X_test
+        # 8.5. évaluation finale sur X_test
         model.eval()
         with torch.no_grad():
             pred_test = model(torch.tensor(X_test, dtype=torch.float32).to(device)).cpu().numpy()
@@ -455,11 +533,16 @@ for country, dat in data_dict.items():
 
         metrics = {
             'MSE': mse, 'RMSE': rmse, 'MAE': mae, 'R2': r2, 'SMAPE': smap,
-            'best_params': best
+            'best_params': best,
+            'val_loss': best_val_loss_final,
+            'data': sig,
+            'model_path': mpath,
+            'warm_start': warm_info,
+            'trial_efficiency': efficiency
         }
         jpath = unique_path(os.path.join(metrics_dir,
-                                          f"{country}_{m_cfg['name']}_metrics_{ts}.json"))
+                                          f"{country}_{name}_metrics_{ts}.json"))
         with open(jpath, 'w') as f:
             json.dump(metrics, f, indent=2)
 
-        print(f"[train_model] {country}|{m_cfg['name']} → modèle : {mpath}, métriques : {jpath}")
\ No newline at end of file
+        print(f"[train_model] {country}|{name} → modèle : {mpath}, métriques : {jpath}")
\ No newline at end of file
@@ -0,0 +1,2 @@
+
+# Scripts de mesure de performance (python -m API.benchmarks.<script>)
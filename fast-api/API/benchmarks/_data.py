@@ -0,0 +1,44 @@
+
+# Base SQLite en mémoire et jeu de relevés synthétique communs aux benchmarks.
+# À importer avant l'application : l'engine MySQL est remplacé dès l'import.
+
+from datetime import date, timedelta
+import random
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from .. import database
+
+database.engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+database.SessionLocal.configure(bind=database.engine)
+
+from .. import models  # noqa: E402
+
+# le schéma est créé au démarrage de l'application (lifespan), pas à son import
+database.Base.metadata.create_all(bind=database.engine)
+
+N_REGIONS = 26
+
+
+def populate(db, n_rows: int, seed: int = 0):
+    """`n_rows` relevés répartis sur 26 régions, un jour toutes les 26 lignes"""
+    rng = random.Random(seed)
+    db.add(models.Continent(idContinent=1, nomContinent="Europe"))
+    db.add(models.Pays(idPays=1, nomPays="Suisse", isoPays="CHE", idContinent=1, populationTotale=8_700_000))
+    db.add(models.Maladie(idMaladie=1, nomMaladie="covid"))
+    for r in range(1, N_REGIONS + 1):
+        db.add(models.Regions(idRegion=r, nomEtat=f"Region {r}", codeEtat=f"R{r}", idPays=1))
+    start = date(2022, 1, 1)
+    rows = []
+    for i in range(n_rows):
+        cases = rng.randint(0, 5000)
+        rows.append({
+            "dateReleve": start + timedelta(days=i // N_REGIONS), "idRegion": i % N_REGIONS + 1, "idMaladie": 1,
+            "nbNouveauCas": cases, "nbDeces": rng.randint(0, cases // 50 + 1), "nbGueri": rng.randint(0, cases),
+            "nbHospitalisation": rng.randint(0, cases // 10 + 1), "nbHospiSoinsIntensif": rng.randint(0, 60),
+            "nbVaccineTotalement": rng.randint(0, 10 ** 6), "nbSousRespirateur": rng.randint(0, 30),
+            "nbVaccine": rng.randint(0, 10 ** 6), "nbTeste": rng.randint(0, 10 ** 5),
+        })
+    db.bulk_insert_mappings(models.Releve, rows)
+    db.commit()
+    return start, start + timedelta(days=(n_rows - 1) // N_REGIONS)
@@ -0,0 +1,66 @@
+
+# Mesure : démarrage à froid d'un worker (import de API.main, lifespan, première réponse)
+#
+#   cd fast-api && python -m API.benchmarks.cold_start --runs 5
+#
+# Chaque essai est un nouvel interpréteur (base SQLite en mémoire) ; les
+# durées sont comptées depuis le lancement du processus.
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ("torch", "pandas", "numpy", "sklearn", "xgboost")
+
+# exécuté dans le processus mesuré ; `launched` : instant du lancement (horloge murale)
+_CHILD = """
+import json, sys, time
+launched = float(sys.argv[1])
+from API.benchmarks import _data
+t_data = time.time()
+from API import main
+t_import = time.time()
+from fastapi.testclient import TestClient
+with TestClient(main.API) as client:
+    t_lifespan = time.time()
+    live = client.get("/health/live").status_code
+    t_live = time.time()
+    ready = client.get("/health/ready").status_code
+    t_ready = time.time()
+print(json.dumps({
+    "interpreter": t_data - launched,
+    "import": t_import - t_data,
+    "lifespan": t_lifespan - t_import,
+    "first_live": t_live - launched,
+    "first_ready": t_ready - launched,
+    "status": [live, ready],
+    "loaded": [m for m in %r if m in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def run_once() -> dict:
+    launched = time.time()
+    output = subprocess.run([sys.executable, "-c", _CHILD, repr(launched)], capture_output=True, text=True,
+                            check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    results = [run_once() for _ in range(args.runs)]
+    print(f"{args.runs} démarrages, médiane (ms) :")
+    for key in ("interpreter", "import", "lifespan", "first_live", "first_ready"):
+        print(f"  {key:<12} {statistics.median(r[key] for r in results) * 1000:8.0f}")
+    print(f"  statuts /health/live, /health/ready : {results[-1]['status']}")
+    print(f"  modules lourds chargés : {', '.join(results[-1]['loaded']) or 'aucun'}")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,68 @@
+
+# Mesure : taille des réponses et latence de bout en bout, sans compression / gzip / brotli
+#
+#   cd fast-api && python -m API.benchmarks.compression --rows 20000 --mbps 20
+
+import argparse
+import statistics
+import time
+from fastapi.testclient import TestClient
+
+from . import _data
+from .. import database, main
+from ..compression import brotli
+
+# requêtes typiques des tableaux de bord (méthode, url, paramètres)
+QUERIES = [
+    ("GET", "/releves/range/", {"start_date": "2022-01-01", "end_date": "2022-01-31"}),
+    ("GET", "/releves/range/", {"start_date": "2022-01-01", "end_date": "2022-12-31", "limit": 2000}),
+    ("GET", "/releves/range/", {"start_date": "2022-01-01", "end_date": "2022-12-31", "limit": 2000,
+                                "fields": "dateReleve,idRegion,nbNouveauCas"}),
+    ("POST", "/etl/extract/releves", {"start_date": "2022-01-01", "end_date": "2022-03-31"}),
+    ("POST", "/technical/analytics/trends", {"country": "suisse", "start_date": "2022-01-01", "end_date": "2022-06-30"}),
+    ("GET", "/regions/", {}),
+]
+
+
+def run(client, method, url, params, encoding, repeats):
+    headers = {"Accept-Encoding": encoding}
+    response = client.request(method, url, params=params, headers=headers)
+    response.raise_for_status()
+    size = response.num_bytes_downloaded
+    timings = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        client.request(method, url, params=params, headers=headers).read()
+        timings.append(time.perf_counter() - t0)
+    return size, statistics.median(timings) * 1000
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=20000, help="nombre de relevés générés")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--mbps", type=float, default=20.0, help="débit supposé du client (Mbit/s)")
+    args = parser.parse_args()
+
+    db = database.SessionLocal()
+    _data.populate(db, args.rows)
+    db.close()
+    client = TestClient(main.API)
+
+    encodings = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+    print(f"{args.rows} relevés, débit client {args.mbps:g} Mbit/s, "
+          f"temps total = temps serveur + taille / débit")
+    for method, url, params in QUERIES:
+        label = f"{method} {url} " + "&".join(f"{k}={v}" for k, v in params.items())
+        print(label)
+        baseline = None
+        for encoding in encodings:
+            size, server_ms = run(client, method, url, params, encoding, args.repeats)
+            total_ms = server_ms + size * 8 / (args.mbps * 1e6) * 1000
+            baseline = baseline or (size, total_ms)
+            print(f"  {encoding:9}{size / 1024:9.1f} Kio ({size / baseline[0]:5.0%})"
+                  f"{server_ms:9.2f} ms serveur{total_ms:9.2f} ms total ({baseline[1] / total_ms:4.1f}x)")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,86 @@
+
+# Mesure : sérialisation d'une page de 2000 relevés, chemin ORM + Pydantic vs colonnes + orjson
+#
+#   cd fast-api && python -m API.benchmarks.serialization --rows 2000 --repeats 30
+
+import argparse
+import json
+import statistics
+import time
+from pydantic import TypeAdapter
+
+from . import _data
+from .. import database, main, models, crud
+from ..fast_json import rows_response, schema_columns, orjson
+
+
+def orm_serialize(rows, adapter):
+    """Ce que faisait FastAPI : validation from_attributes, dump JSON, json.dumps"""
+    content = adapter.dump_python(adapter.validate_python(rows, from_attributes=True), mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def orm_path(db, start, end, limit, adapter):
+    rows = crud.get_releves_by_date_range(db, start, end, 0, limit)
+    body = orm_serialize(rows, adapter)
+    db.expunge_all()
+    return body
+
+
+def fast_path(db, start, end, limit, columns):
+    return rows_response(columns, crud.get_releves_by_date_range(db, start, end, 0, limit, columns=columns)).body
+
+
+def measure(fn, repeats):
+    fn()  # échauffement
+    timings = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    return statistics.median(timings) * 1000
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=2000, help="taille de la page")
+    parser.add_argument("--repeats", type=int, default=30)
+    parser.add_argument("--fields", default="dateReleve,nbNouveauCas", help="projection comparée (fields=)")
+    args = parser.parse_args()
+
+    db = database.SessionLocal()
+    start, end = _data.populate(db, args.rows)
+    adapter = TypeAdapter(list[main.Releve])
+    columns = schema_columns(models.Releve, main.Releve)
+
+    old = orm_path(db, start, end, args.rows, adapter)
+    new = fast_path(db, start, end, args.rows, columns)
+    assert json.loads(old) == json.loads(new), "les deux chemins doivent produire le même JSON"
+
+    # sérialisation seule, lignes déjà chargées
+    orm_rows = crud.get_releves_by_date_range(db, start, end, 0, args.rows)
+    tuples = crud.get_releves_by_date_range(db, start, end, 0, args.rows, columns=columns)
+    s_old = measure(lambda: orm_serialize(orm_rows, adapter), args.repeats)
+    s_new = measure(lambda: rows_response(columns, tuples).body, args.repeats)
+    db.expunge_all()
+
+    # requête + sérialisation (base SQLite en mémoire)
+    t_old = measure(lambda: orm_path(db, start, end, args.rows, adapter), args.repeats)
+    t_new = measure(lambda: fast_path(db, start, end, args.rows, columns), args.repeats)
+
+    # projection : seules les colonnes demandées sont lues et sérialisées
+    subset = schema_columns(models.Releve, main.Releve, args.fields)
+    sparse = fast_path(db, start, end, args.rows, subset)
+    t_sparse = measure(lambda: fast_path(db, start, end, args.rows, subset), args.repeats)
+
+    print(f"{args.rows} relevés ({len(new) / 1024:.0f} Kio), encodeur: {'orjson' if orjson else 'json'}")
+    print(f"{'':24}{'ORM + Pydantic':>16}{'colonnes':>12}{'gain':>8}")
+    print(f"{'sérialisation seule':24}{s_old:13.2f} ms{s_new:9.2f} ms{s_old / s_new:7.1f}x")
+    print(f"{'requête + sérialisation':24}{t_old:13.2f} ms{t_new:9.2f} ms{t_old / t_new:7.1f}x")
+    print(f"fields={args.fields}: {t_sparse:.2f} ms, {len(sparse) / 1024:.0f} Kio "
+          f"({len(sparse) / len(new):.0%} des octets de la réponse complète)")
+    db.close()
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,566 @@
+
+# Cache partagé entre workers : mémoire, fichier SQLite ou serveur Redis (protocole RESP)
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+import argparse
+import hashlib
+import os
+import pickle
+import secrets
+import socket
+import socketserver
+import sqlite3
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class NamespaceConfig:
+    ttl: Optional[float] = 300          # secondes, None = pas d'expiration
+    max_entries: int = 1000
+    max_value_bytes: int = 1_000_000    # les valeurs plus grosses ne sont pas mises en cache
+
+
+# Réglages par défaut ; "reference/maladies" utilise la configuration de "reference"
+DEFAULT_NAMESPACES = {
+    "reference": NamespaceConfig(ttl=24 * 3600, max_entries=512, max_value_bytes=5_000_000),
+    "queries": NamespaceConfig(ttl=300, max_entries=1000),
+    "aggregates": NamespaceConfig(ttl=600, max_entries=500),
+    "forecasts": NamespaceConfig(ttl=3600, max_entries=2000),
+}
+
+
+# ------------------ Backends ------------------
+class MemoryBackend:
+    """Dictionnaire du processus courant, LRU par espace de noms"""
+
+    shared = False   # ni entre workers, ni d'un démarrage à l'autre
+
+    def __init__(self):
+        self._data: Dict[str, "OrderedDict[str, Tuple[bytes, Optional[float]]]"] = {}
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str, namespace: str = "") -> Optional[bytes]:
+        with self._lock:
+            entries = self._data.get(namespace)
+            item = entries.get(key) if entries else None
+            if item is None:
+                return None
+            if item[1] is not None and item[1] < time.time():
+                del entries[key]
+                return None
+            entries.move_to_end(key)
+            return item[0]
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None,
+            namespace: str = "", max_entries: Optional[int] = None):
+        expires = time.time() + ttl if ttl else None
+        with self._lock:
+            entries = self._data.setdefault(namespace, OrderedDict())
+            entries[key] = (value, expires)
+            entries.move_to_end(key)
+            while max_entries and len(entries) > max_entries:
+                entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str, namespace: str = ""):
+        with self._lock:
+            self._data.get(namespace, {}).pop(key, None)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._counters.clear()
+
+    def size(self) -> int:
+        with self._lock:
+            return sum(len(entries) for entries in self._data.values())
+
+
+class SQLiteBackend:
+    """Fichier SQLite (WAL) partagé par les workers d'une même machine.
+
+    La limite de taille est appliquée par espace de noms en supprimant les
+    entrées les plus anciennes (FIFO), vérifiée toutes les `check_every` écritures.
+    """
+
+    shared = True
+
+    def __init__(self, path: str, check_every: int = 64):
+        self.path = path
+        self.check_every = check_every
+        self._local = threading.local()
+        self._writes: Dict[str, int] = {}
+        self.evictions = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute("""CREATE TABLE IF NOT EXISTS cache_entries (
+                            key TEXT PRIMARY KEY, namespace TEXT NOT NULL,
+                            value BLOB NOT NULL, expires REAL, created REAL NOT NULL)""")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_ns_created ON cache_entries (namespace, created)")
+        conn.execute("CREATE TABLE IF NOT EXISTS cache_counters (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _conn(self) -> sqlite3.Connection:
+        # une connexion par thread et par processus (jamais réutilisée après un fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key: str, namespace: str = "") -> Optional[bytes]:
+        row = self._conn().execute("SELECT value, expires FROM cache_entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] is not None and row[1] < time.time():
+            self.delete(key)
+            return None
+        return row[0]
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None,
+            namespace: str = "", max_entries: Optional[int] = None):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO cache_entries (key, namespace, value, expires, created) "
+                     "VALUES (?, ?, ?, ?, ?)", (key, namespace, value, now + ttl if ttl else None, now))
+        n = self._writes[namespace] = self._writes.get(namespace, 0) + 1
+        if max_entries and n % self.check_every == 0:
+            conn.execute("DELETE FROM cache_entries WHERE expires IS NOT NULL AND expires < ?", (now,))
+            excess = conn.execute("SELECT COUNT(*) FROM cache_entries WHERE namespace = ?",
+                                  (namespace,)).fetchone()[0] - max_entries
+            if excess > 0:
+                conn.execute("DELETE FROM cache_entries WHERE key IN (SELECT key FROM cache_entries "
+                             "WHERE namespace = ? ORDER BY created LIMIT ?)", (namespace, excess))
+                self.evictions += excess
+
+    def delete(self, key: str, namespace: str = ""):
+        self._conn().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def incr(self, key: str) -> int:
+        conn = self._conn()
+        conn.execute("INSERT INTO cache_counters (key, value) VALUES (?, 1) "
+                     "ON CONFLICT(key) DO UPDATE SET value = value + 1", (key,))
+        return conn.execute("SELECT value FROM cache_counters WHERE key = ?", (key,)).fetchone()[0]
+
+    def counter(self, key: str) -> int:
+        row = self._conn().execute("SELECT value FROM cache_counters WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM cache_entries")
+        conn.execute("DELETE FROM cache_counters")
+
+    def size(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+
+
+class RedisError(Exception):
+    pass
+
+
+class RespConnection:
+    """Connexion minimale au protocole RESP2 (Redis ou serveur local de remplacement)"""
+
+    def __init__(self, host: str, port: int, db: int = 0, password: Optional[str] = None, timeout: float = 2.0):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+        if password:
+            self.execute("AUTH", password)
+        if db:
+            self.execute("SELECT", db)
+
+    def execute(self, *args):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self.sock.sendall(b"".join(parts))
+        return read_resp(self.reader)
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+def read_resp(reader):
+    line = reader.readline()
+    if not line:
+        raise ConnectionError("connexion fermée")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload.decode()
+    if kind == b"-":
+        raise RedisError(payload.decode())
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        n = int(payload)
+        if n < 0:
+            return None
+        data = reader.read(n + 2)
+        return data[:-2]
+    if kind == b"*":
+        n = int(payload)
+        return None if n < 0 else [read_resp(reader) for _ in range(n)]
+    raise RedisError(f"réponse RESP invalide: {line!r}")
+
+
+class RedisBackend:
+    """Serveur Redis (ou `LocalRespServer`) : une connexion par thread, reconnexion automatique.
+
+    La taille est bornée par les TTL et la politique `maxmemory` du serveur.
+    """
+
+    shared = True
+
+    def __init__(self, url: str, prefix: str = "api:", retry_after: float = 5.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.password = parsed.password
+        self.prefix = prefix
+        self.retry_after = retry_after
+        self._down_until = 0.0
+        self._local = threading.local()
+        self.evictions = 0
+
+    def _call(self, *args):
+        if time.time() < self._down_until:
+            raise ConnectionError(f"{self.host}:{self.port} indisponible")
+        try:
+            return self._send(*args)
+        except (OSError, ConnectionError):
+            # on ne retente pas à chaque requête tant que le serveur est injoignable
+            self._down_until = time.time() + self.retry_after
+            raise
+
+    def _send(self, *args):
+        for attempt in (0, 1):
+            conn = getattr(self._local, "conn", None)
+            if conn is not None and self._local.pid != os.getpid():
+                conn = None  # socket hérité du processus parent
+            try:
+                if conn is None:
+                    conn = self._local.conn = RespConnection(self.host, self.port, self.db, self.password)
+                    self._local.pid = os.getpid()
+                return conn.execute(*args)
+            except (OSError, ConnectionError):
+                if conn is not None:
+                    conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+
+    def get(self, key: str, namespace: str = "") -> Optional[bytes]:
+        return self._call("GET", self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None,
+            namespace: str = "", max_entries: Optional[int] = None):
+        if ttl:
+            self._call("SET", self.prefix + key, value, "PX", int(ttl * 1000))
+        else:
+            self._call("SET", self.prefix + key, value)
+
+    def delete(self, key: str, namespace: str = ""):
+        self._call("DEL", self.prefix + key)
+
+    def incr(self, key: str) -> int:
+        return self._call("INCR", self.prefix + key)
+
+    def counter(self, key: str) -> int:
+        value = self._call("GET", self.prefix + key)
+        return int(value) if value is not None else 0
+
+    def clear(self):
+        self._call("FLUSHDB")
+
+    def size(self) -> int:
+        return self._call("DBSIZE")
+
+
+# ------------------ Cache par espaces de noms ------------------
+class SharedCache:
+    """Cache clé/valeur par espaces de noms, au-dessus d'un backend.
+
+    Chaque espace de noms a une version (compteur du backend) incluse dans les
+    clés : `invalidate(ns)` l'incrémente, ce qui rend caduques toutes les
+    entrées de l'espace de noms pour tous les workers à la fois. Les valeurs
+    sont sérialisées avec pickle : le backend ne doit être partagé qu'entre
+    processus de confiance. Une panne du backend est traitée comme un défaut
+    de cache (l'API continue de répondre sans cache) : `version` retourne
+    alors None et rien n'est lu ni écrit.
+
+    `epoch` distingue les versions d'un backend propre au processus
+    (MemoryBackend) : ses compteurs repartent de 0 à chaque démarrage, une
+    version seule ne suffit donc pas à identifier un état des données.
+    """
+
+    def __init__(self, backend, namespaces: Optional[Dict[str, NamespaceConfig]] = None,
+                 default: Optional[NamespaceConfig] = None):
+        self.backend = backend
+        self.namespaces = dict(DEFAULT_NAMESPACES if namespaces is None else namespaces)
+        self.default = default or NamespaceConfig()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._last_warning = 0.0
+        self.epoch = "" if getattr(backend, "shared", True) else secrets.token_hex(4)
+
+    def _error(self, namespace: str, message: str):
+        # au plus un avertissement toutes les 30 s quand le backend est en panne
+        self._count(namespace, "errors")
+        now = time.time()
+        if now - self._last_warning > 30:
+            self._last_warning = now
+            logger.warning(message)
+
+    @staticmethod
+    def _group(namespace: str) -> str:
+        return namespace.split("/", 1)[0]
+
+    def config(self, namespace: str) -> NamespaceConfig:
+        return self.namespaces.get(namespace) or self.namespaces.get(self._group(namespace)) or self.default
+
+    def _count(self, namespace: str, event: str, n: int = 1):
+        with self._lock:
+            stats = self._stats.setdefault(self._group(namespace), {
+                "hits": 0, "misses": 0, "sets": 0, "skipped": 0, "errors": 0, "invalidations": 0})
+            stats[event] += n
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        """Clé courte et stable à partir de paramètres quelconques"""
+        return hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+    def version(self, namespace: str) -> Optional[int]:
+        """Version courante ; None si le backend ne répond pas (version inconnue)"""
+        try:
+            return self.backend.counter(f"{namespace}:__version__")
+        except Exception as e:
+            self._error(namespace, f"Cache indisponible ({namespace}): {e}")
+            return None
+
+    def last_modified(self, namespace: str) -> Optional[float]:
+        """Date de la dernière invalidation de l'espace de noms (tous workers confondus)"""
+        try:
+            value = self.backend.get(f"{namespace}:__modified__", "__meta__")
+            return float(value) if value is not None else None
+        except Exception as e:
+            self._error(namespace, f"Cache indisponible ({namespace}): {e}")
+            return None
+
+    def invalidate(self, *namespaces: str):
+        for namespace in namespaces:
+            try:
+                self.backend.incr(f"{namespace}:__version__")
+                self.backend.set(f"{namespace}:__modified__", repr(time.time()).encode(), None, "__meta__")
+                self._count(namespace, "invalidations")
+            except Exception as e:
+                self._error(namespace, f"Invalidation du cache impossible ({namespace}): {e}")
+
+    def _key(self, namespace: str, key: str, version: Optional[int]) -> Optional[str]:
+        if version is None:
+            version = self.version(namespace)
+        return None if version is None else f"{namespace}:{version}:{key}"
+
+    def get(self, namespace: str, key: str, version: Optional[int] = None) -> Tuple[bool, Any]:
+        """(trouvé, valeur)"""
+        full_key = self._key(namespace, key, version)
+        if full_key is None:
+            return False, None
+        try:
+            raw = self.backend.get(full_key, self._group(namespace))
+        except Exception as e:
+            self._error(namespace, f"Lecture du cache impossible ({namespace}): {e}")
+            return False, None
+        if raw is None:
+            self._count(namespace, "misses")
+            return False, None
+        self._count(namespace, "hits")
+        return True, pickle.loads(raw)
+
+    def set(self, namespace: str, key: str, value: Any, version: Optional[int] = None):
+        cfg = self.config(namespace)
+        raw = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(raw) > cfg.max_value_bytes:
+            self._count(namespace, "skipped")
+            return
+        full_key = self._key(namespace, key, version)
+        if full_key is None:
+            return
+        try:
+            self.backend.set(full_key, raw, cfg.ttl,
+                             self._group(namespace), cfg.max_entries)
+            self._count(namespace, "sets")
+        except Exception as e:
+            self._error(namespace, f"Écriture du cache impossible ({namespace}): {e}")
+
+    def get_or_set(self, namespace: str, key: str, loader: Callable[[], Any]) -> Any:
+        """Valeur en cache, ou `loader()` mis en cache sous la version lue avant le chargement"""
+        version = self.version(namespace)
+        if version is None:
+            return loader()
+        found, value = self.get(namespace, key, version)
+        if found:
+            return value
+        value = loader()
+        self.set(namespace, key, value, version)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            groups = {name: dict(values) for name, values in self._stats.items()}
+        for values in groups.values():
+            lookups = values["hits"] + values["misses"]
+            values["hit_ratio"] = values["hits"] / lookups if lookups else None
+        try:
+            size = self.backend.size()
+        except Exception:
+            size = None
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": size,
+            "evictions": getattr(self.backend, "evictions", None),
+            "namespaces": groups,
+        }
+
+
+def backend_from_env():
+    """CACHE_BACKEND = memory (défaut) | sqlite | redis"""
+    kind = os.getenv("CACHE_BACKEND", "memory").lower()
+    if kind == "sqlite":
+        return SQLiteBackend(os.getenv("CACHE_SQLITE_PATH", "/tmp/api_cache.sqlite3"))
+    if kind == "redis":
+        return RedisBackend(os.getenv("CACHE_URL") or os.getenv("REDIS_URL", "redis://localhost:6379"))
+    return MemoryBackend()
+
+
+# Instance partagée par l'API
+shared_cache = SharedCache(backend_from_env())
+
+
+# ------------------ Serveur RESP local ------------------
+class LocalRespServer(socketserver.ThreadingTCPServer):
+    """Remplaçant local de Redis (GET/SET/DEL/INCR/EXPIRE/TTL/DBSIZE/FLUSHDB/PING).
+
+    Pour le développement et les tests multi-workers sans serveur Redis :
+        python -m API.cache_backend serve --port 6379
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=("127.0.0.1", 6379)):
+        self.store: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self.store_lock = threading.Lock()
+        super().__init__(address, _RespHandler)
+
+    def _live(self, key: bytes):
+        item = self.store.get(key)
+        if item is not None and item[1] is not None and item[1] < time.time():
+            del self.store[key]
+            return None
+        return item
+
+    def command(self, args: List[bytes]):
+        name = args[0].upper()
+        with self.store_lock:
+            if name == b"PING":
+                return "PONG"
+            if name in (b"SELECT", b"AUTH"):
+                return "OK"
+            if name == b"GET":
+                item = self._live(args[1])
+                return item[0] if item else None
+            if name == b"SET":
+                expires = None
+                opts = [a.upper() for a in args[3:]]
+                if b"PX" in opts:
+                    expires = time.time() + int(args[3 + opts.index(b"PX") + 1]) / 1000
+                elif b"EX" in opts:
+                    expires = time.time() + int(args[3 + opts.index(b"EX") + 1])
+                self.store[args[1]] = (args[2], expires)
+                return "OK"
+            if name == b"DEL":
+                return sum(1 for k in args[1:] if self.store.pop(k, None) is not None)
+            if name == b"INCR":
+                item = self._live(args[1])
+                value = int(item[0]) + 1 if item else 1
+                self.store[args[1]] = (str(value).encode(), item[1] if item else None)
+                return value
+            if name == b"EXPIRE":
+                item = self._live(args[1])
+                if item is None:
+                    return 0
+                self.store[args[1]] = (item[0], time.time() + int(args[2]))
+                return 1
+            if name == b"TTL":
+                item = self._live(args[1])
+                if item is None:
+                    return -2
+                return -1 if item[1] is None else int(item[1] - time.time())
+            if name == b"DBSIZE":
+                return len(self.store)
+            if name == b"FLUSHDB":
+                self.store.clear()
+                return "OK"
+        return RedisError(f"ERR unknown command '{name.decode()}'")
+
+
+class _RespHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                args = read_resp(self.rfile)
+            except (ConnectionError, OSError):
+                return
+            reply = self.server.command(args)
+            self.wfile.write(_encode_reply(reply))
+
+
+def _encode_reply(reply) -> bytes:
+    if isinstance(reply, RedisError):
+        return f"-{reply}\r\n".encode()
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, bytes):
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+    return f"+{reply}\r\n".encode()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serveur RESP local (remplaçant de Redis pour le cache)")
+    parser.add_argument("command", choices=["serve"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    server = LocalRespServer((args.host, args.port))
+    logger.info(f"Serveur RESP local sur {args.host}:{args.port}")
+    server.serve_forever()
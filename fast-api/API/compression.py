@@ -0,0 +1,184 @@
+
+# Compression des réponses (gzip, brotli si disponible), compatible avec les réponses en flux
+
+from typing import Iterable, List, Optional, Tuple
+import zlib
+
+try:
+    import brotli
+except ImportError:  # dépendance optionnelle : gzip uniquement
+    brotli = None
+
+# types de contenu compressés par défaut (text/event-stream est toujours exclu)
+DEFAULT_CONTENT_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "text/csv",
+    "text/html",
+    "text/plain",
+    "application/javascript",
+)
+
+
+def _accepted_encodings(accept_encoding: str) -> List[str]:
+    """Encodages acceptés par le client (q=0 exclu)"""
+    accepted = []
+    for item in accept_encoding.lower().split(","):
+        name, *params = [part.strip() for part in item.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if name and q > 0:
+            accepted.append(name)
+    return accepted
+
+
+class _Encoder:
+    def __init__(self, encoding: str, level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._gz = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 : en-tête gzip
+
+    def compress(self, data: bytes, flush: bool) -> bytes:
+        """`flush=True` : vide le tampon pour que le client reçoive ce morceau tout de suite"""
+        if self.encoding == "br":
+            out = self._br.process(data)
+            return out + self._br.flush() if flush else out
+        out = self._gz.compress(data)
+        return out + self._gz.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._br.finish()
+        return self._gz.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    """Middleware ASGI de compression.
+
+    - brotli est préféré si le module est installé et accepté par le client ;
+    - une réponse plus petite que `minimum_size` est envoyée telle quelle ;
+    - une réponse en flux est mise en tampon jusqu'à `minimum_size` octets,
+      puis compressée morceau par morceau (chaque morceau est vidé vers le
+      client) ; les flux SSE (text/event-stream) ne sont jamais compressés ;
+    - seuls les types de `content_types` sont compressés.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, level: int = 6, brotli_quality: int = 4,
+                 content_types: Iterable[str] = DEFAULT_CONTENT_TYPES):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+        self.brotli_quality = brotli_quality
+        self.content_types = tuple(content_types)
+
+    def _choose(self, scope) -> Optional[str]:
+        headers = dict(scope.get("headers") or [])
+        accepted = _accepted_encodings(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = self._choose(scope)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressingSend(self, encoding, send)
+        await self.app(scope, receive, responder)
+
+
+class _CompressingSend:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send):
+        self.mw = middleware
+        self.encoding = encoding
+        self.send = send
+        self.start: Optional[dict] = None
+        self.buffer = b""
+        self.encoder: Optional[_Encoder] = None
+        self.passthrough = False
+
+    def _compressible(self, message: dict) -> bool:
+        if message["status"] < 200 or message["status"] in (204, 304):
+            return False
+        headers = {k.lower(): v for k, v in message.get("headers", [])}
+        if b"content-encoding" in headers:
+            return False
+        content_type = headers.get(b"content-type", b"").decode("latin-1").split(";")[0].strip().lower()
+        if content_type == "text/event-stream":
+            return False
+        return content_type in self.mw.content_types
+
+    def _headers(self, length: Optional[int]) -> List[Tuple[bytes, bytes]]:
+        headers = []
+        vary = None
+        for key, value in self.start.get("headers", []):
+            name = key.lower()
+            if name == b"content-length":
+                continue
+            if name == b"vary":
+                vary = value
+                continue
+            if name == b"etag" and not value.startswith(b"W/"):
+                # le corps compressé n'est plus identique octet pour octet
+                value = b"W/" + value
+            headers.append((key, value))
+        headers.append((b"content-encoding", self.encoding.encode()))
+        headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+        if length is not None:
+            headers.append((b"content-length", str(length).encode()))
+        return headers
+
+    async def __call__(self, message: dict):
+        kind = message["type"]
+        if kind == "http.response.start":
+            self.start = message
+            self.passthrough = not self._compressible(message)
+            if self.passthrough:
+                await self.send(message)
+            return
+        if kind != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more = message.get("more_body", False)
+
+        if self.encoder is None:
+            self.buffer += body
+            if not more and len(self.buffer) < self.mw.minimum_size:
+                # trop petit : réponse d'origine, inchangée
+                await self.send(self.start)
+                await self.send({"type": "http.response.body", "body": self.buffer})
+                return
+            if more and len(self.buffer) < self.mw.minimum_size:
+                return
+            self.encoder = _Encoder(self.encoding, self.mw.level, self.mw.brotli_quality)
+            body, self.buffer = self.buffer, b""
+            if not more:
+                # réponse complète : Content-Length connu
+                data = self.encoder.compress(body, flush=False) + self.encoder.finish()
+                await self.send({**self.start, "headers": self._headers(len(data))})
+                await self.send({"type": "http.response.body", "body": data})
+                return
+            await self.send({**self.start, "headers": self._headers(None)})
+
+        if more:
+            data = self.encoder.compress(body, flush=True)
+            if data:
+                await self.send({"type": "http.response.body", "body": data, "more_body": True})
+        else:
+            data = self.encoder.compress(body, flush=False) + self.encoder.finish()
+            await self.send({"type": "http.response.body", "body": data})
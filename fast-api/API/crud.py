@@ -1,6 +1,23 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload, raiseload, selectinload
 from .models import Maladie, Continent, Symptome, Variant, Traitement, Pays, Regions, Releve
-from sqlalchemy import or_, func, distinct
+from sqlalchemy import and_, not_, or_, func
+from typing import List, Optional
+from .services.anomaly_monitor import anomaly_monitor
+from .cache_backend import shared_cache
+from . import date_catalog, partitions
+from .http_cache import reference_cache
+from .name_search import pays_index, regions_index
+
+# espaces de noms du cache dérivés des relevés, invalidés à chaque écriture
+RELEVE_CACHE_NAMESPACES = ("queries/releves", "aggregates/releves")
+
+def _releve_key(releve):
+    return tuple(getattr(releve, column) for column in date_catalog.KEY_COLUMNS)
+
+def _invalidate_releves(dates_changed: bool):
+    shared_cache.invalidate(*RELEVE_CACHE_NAMESPACES)
+    if dates_changed:
+        reference_cache.invalidate(date_catalog.CACHE_NAME)
 
 # --- CRUD pour Maladie ---
 def create_maladie(db: Session, nomMaladie: str):
@@ -35,6 +52,19 @@ def delete_maladie(db: Session, maladie_id: int):
 def get_variants_by_maladie(db: Session, maladie_id: int):
     return db.query(Variant).filter(Variant.idMaladie == maladie_id).all()
 
+# Graphe maladie -> variants -> symptômes, + traitements : 4 requêtes quel que soit le
+# nombre de maladies (raiseload : toute autre relation parcourue lève une erreur au lieu
+# d'émettre une requête par parent)
+def get_maladies_graph(db: Session, maladie_id: Optional[int] = None):
+    query = db.query(Maladie).options(
+        selectinload(Maladie.variants).selectinload(Variant.symptomes),
+        selectinload(Maladie.traitements),
+        raiseload("*"),
+    )
+    if maladie_id is not None:
+        return query.filter(Maladie.idMaladie == maladie_id).first()
+    return query.order_by(Maladie.idMaladie).all()
+
 # --- CRUD pour Continent ---
 def create_continent(db: Session, nomContinent: str):
     db_continent = Continent(nomContinent=nomContinent)
@@ -152,6 +182,13 @@ def delete_traitement(db: Session, traitement_id: int):
         db.commit()
     return db_traitement
 
+# Graphe continent -> pays -> régions : 3 requêtes
+def get_continents_graph(db: Session):
+    return db.query(Continent).options(
+        selectinload(Continent.pays).selectinload(Pays.regions),
+        raiseload("*"),
+    ).order_by(Continent.idContinent).all()
+
 # --- CRUD pour Pays ---
 def create_pays(db: Session, isoPays: str, nomPays: str, populationTotale: int, idContinent: int, **kwargs):
     """
@@ -177,26 +214,33 @@ def create_pays(db: Session, isoPays: str, nomPays: str, populationTotale: int,
     db.refresh(db_pays)
     return db_pays
 
-def get_pays(db: Session, skip: int = 0, limit: int = 150):
-    return db.query(Pays).offset(skip).limit(limit).all()
+def _select(db: Session, entity, columns=None):
+    # `columns` : colonnes explicites -> tuples sans passer par l'identity map de l'ORM
+    return db.query(*columns) if columns else db.query(entity)
+
+def get_pays(db: Session, skip: int = 0, limit: int = 150, columns=None):
+    return _select(db, Pays, columns).offset(skip).limit(limit).all()
 
 def get_pays_by_id(db: Session, pays_id: int):
     return db.query(Pays).filter(Pays.idPays == pays_id).first()
 
-def get_pays_by_nom(db: Session, nomPays: str, skip: int = 0, limit: int = 150):
-    return db.query(Pays).filter(Pays.nomPays.ilike(f"%{nomPays}%")).offset(skip).limit(limit).all()
+def get_pays_by_nom(db: Session, nomPays: str, skip: int = 0, limit: int = 150, columns=None):
+    # index en mémoire (name_search.py) : sous-chaîne, sans tenir compte des accents ni de la casse
+    ids = pays_index.ids(db, nomPays, columns=["nomPays"])
+    return _select(db, Pays, columns).filter(Pays.idPays.in_(ids)).offset(skip).limit(limit).all() if ids else []
 
-def get_pays_by_iso(db: Session, isoPays: str, skip: int = 0, limit: int = 150):
-    return db.query(Pays).filter(Pays.isoPays.ilike(f"%{isoPays}%")).offset(skip).limit(limit).all()
+def get_pays_by_iso(db: Session, isoPays: str, skip: int = 0, limit: int = 150, columns=None):
+    ids = pays_index.ids(db, isoPays, columns=["isoPays"])
+    return _select(db, Pays, columns).filter(Pays.idPays.in_(ids)).offset(skip).limit(limit).all() if ids else []
 
-def get_pays_by_superficie_range(db: Session, min_superficie: int, max_superficie: int, skip: int = 0, limit: int = 150):
-    return db.query(Pays).filter(
+def get_pays_by_superficie_range(db: Session, min_superficie: int, max_superficie: int, skip: int = 0, limit: int = 150, columns=None):
+    return _select(db, Pays, columns).filter(
         Pays.Superficie >= min_superficie,
         Pays.Superficie <= max_superficie
     ).offset(skip).limit(limit).all()
 
-def get_pays_by_population_range(db: Session, min_population: int, max_population: int, skip: int = 0, limit: int = 150):
-    return db.query(Pays).filter(
+def get_pays_by_population_range(db: Session, min_population: int, max_population: int, skip: int = 0, limit: int = 150, columns=None):
+    return _select(db, Pays, columns).filter(
         Pays.populationTotale >= min_population,
         Pays.populationTotale <= max_population
     ).offset(skip).limit(limit).all()
@@ -241,24 +285,44 @@ def create_region(db: Session, nomEtat: str, codeEtat: str, idPays: int):
     db.refresh(db_region)
     return db_region
 
-def get_regions(db: Session, skip: int = 0, limit: int = 2000):
-    return db.query(Regions).offset(skip).limit(limit).all()
+def get_regions(db: Session, skip: int = 0, limit: int = 2000, columns=None):
+    return _select(db, Regions, columns).offset(skip).limit(limit).all()
 
 def get_region(db: Session, region_id: int):
     return db.query(Regions).filter(Regions.idRegion == region_id).first()
 
-def get_regions_by_nomEtat(db: Session, nomEtat: str, skip: int = 0, limit: int = 2000):
-    return db.query(Regions).filter(Regions.nomEtat.ilike(f"%{nomEtat}%")).offset(skip).limit(limit).all()
+def get_regions_by_nomEtat(db: Session, nomEtat: str, skip: int = 0, limit: int = 2000, columns=None):
+    ids = regions_index.ids(db, nomEtat, columns=["nomEtat"])
+    return _select(db, Regions, columns).filter(Regions.idRegion.in_(ids)).offset(skip).limit(limit).all() if ids else []
+
+# Graphe pays (+ continent) -> régions : 2 requêtes
+def get_pays_graph(db: Session, pays_id: Optional[int] = None, idContinent: Optional[int] = None):
+    query = db.query(Pays).options(
+        joinedload(Pays.continent),
+        selectinload(Pays.regions),
+        raiseload("*"),
+    )
+    if pays_id is not None:
+        return query.filter(Pays.idPays == pays_id).first()
+    if idContinent is not None:
+        query = query.filter(Pays.idContinent == idContinent)
+    return query.order_by(Pays.idPays).all()
 
-def get_regions_by_pays(db: Session, idPays: int):
-    return db.query(Regions).filter(Regions.idPays == idPays).all()
+def get_regions_by_pays(db: Session, idPays: int, columns=None):
+    return _select(db, Regions, columns).filter(Regions.idPays == idPays).all()
 
 
 def update_region(db: Session, region_id: int, region_data: dict):
     db_region = db.query(Regions).filter(Regions.idRegion == region_id).first()
     if db_region:
+        old_pays = db_region.idPays
         for key, value in region_data.items():
             setattr(db_region, key, value)
+        if db_region.idPays != old_pays:
+            # région rattachée à un autre pays : ses dates changent de pays dans le catalogue
+            db.flush()
+            date_catalog.rebuild(db)
+            reference_cache.invalidate(date_catalog.CACHE_NAME)
         db.commit()
         db.refresh(db_region)
     return db_region
@@ -294,80 +358,127 @@ def create_releve(db: Session, dateReleve: str, idRegion: int, idMaladie: int, *
         **kwargs
     )
     db.add(db_releve)
+    dates_changed = date_catalog.record(db, [_releve_key(db_releve)])
+    alerts = anomaly_monitor.observe(db, db_releve)
     db.commit()
     db.refresh(db_releve)
+    _invalidate_releves(dates_changed)
+    anomaly_monitor.notify(alerts)
     return db_releve
 
-def get_releves(db: Session, skip: int = 0, limit: int = 1000):
-    return db.query(Releve).offset(skip).limit(limit).all()
+def create_releves_bulk(db: Session, releves: List[dict]):
+    db_releves = [Releve(**data) for data in releves]
+    db.add_all(db_releves)
+    dates_changed = date_catalog.record(db, [_releve_key(releve) for releve in db_releves])
+    alerts = anomaly_monitor.observe_many(db, releves)
+    db.commit()
+    _invalidate_releves(dates_changed)
+    anomaly_monitor.notify(alerts)
+    return {"created_count": len(db_releves)}
+
+def get_releves(db: Session, skip: int = 0, limit: int = 1000, columns=None):
+    return _select(db, Releve, columns).offset(skip).limit(limit).all()
 
 def get_releve(db: Session, releve_id: int):
     return db.query(Releve).filter(Releve.idReleve == releve_id).first()
 
-def get_releves_by_date_range(db: Session, start_date: str, end_date: str, skip: int = 0, limit: int = 100):
-    return db.query(Releve).filter(
+def get_releves_by_date_range(db: Session, start_date: str, end_date: str, skip: int = 0, limit: int = 100, columns=None):
+    return _select(db, Releve, columns).filter(
         Releve.dateReleve >= start_date,
         Releve.dateReleve <= end_date
     ).offset(skip).limit(limit).all()
 
-def get_releves_by_date(db: Session, date: str, skip: int = 0, limit: int = 1000):
-    return db.query(Releve).filter(Releve.dateReleve == date).offset(skip).limit(limit).all()
+def get_releves_by_date(db: Session, date: str, skip: int = 0, limit: int = 1000, columns=None):
+    return _select(db, Releve, columns).filter(Releve.dateReleve == date).offset(skip).limit(limit).all()
 
 def update_releve(db: Session, releve_id: int, releve_data: dict):
     db_releve = db.query(Releve).filter(Releve.idReleve == releve_id).first()
     if db_releve:
+        old_key = _releve_key(db_releve)
         for key, value in releve_data.items():
             setattr(db_releve, key, value)
+        dates_changed = False
+        if _releve_key(db_releve) != old_key:
+            dates_changed = date_catalog.record(db, [old_key], sign=-1)
+            dates_changed |= date_catalog.record(db, [_releve_key(db_releve)])
         db.commit()
         db.refresh(db_releve)
+        _invalidate_releves(dates_changed)
     return db_releve
 
 def delete_releve(db: Session, releve_id: int):
     db_releve = db.query(Releve).filter(Releve.idReleve == releve_id).first()
     if db_releve:
         db.delete(db_releve)
+        dates_changed = date_catalog.record(db, [_releve_key(db_releve)], sign=-1)
         db.commit()
+        _invalidate_releves(dates_changed)
     return db_releve
 
 def delete_releves_by_date_range(db: Session, start_date: str, end_date: str):
+    # Releve partitionnée : les partitions entièrement couvertes sont vidées
+    # sans parcourir leurs lignes, il ne reste que les bords de la plage.
+    # TRUNCATE PARTITION valide implicitement la transaction : bords et catalogue
+    # sont supprimés et validés d'abord, la troncature vient en dernier (non
+    # transactionnelle ; en cas d'échec, relancer la suppression la termine)
+    covered = partitions.covered_partitions(db, start_date, end_date)
     releves = db.query(Releve).filter(
         Releve.dateReleve >= start_date,
-        Releve.dateReleve <= end_date
+        Releve.dateReleve <= end_date,
+        *[not_(and_(Releve.dateReleve >= p.lower, Releve.dateReleve < p.upper)) for p in covered]
     ).all()
     for releve in releves:
         db.delete(releve)
+    dates_changed = date_catalog.remove_range(db, start_date, end_date)
     db.commit()
-    return {"deleted_count": len(releves)}
+    try:
+        deleted_count = partitions.truncate_partitions(db, covered)
+    finally:
+        _invalidate_releves(dates_changed)
+    return {"deleted_count": deleted_count + len(releves)}
 
 def update_releves_by_date_range(db: Session, start_date: str, end_date: str, update_data: dict):
     releves = db.query(Releve).filter(
         Releve.dateReleve >= start_date,
         Releve.dateReleve <= end_date
     ).all()
+    old_keys = [_releve_key(releve) for releve in releves]
     for releve in releves:
         for key, value in update_data.items():
             setattr(releve, key, value)
+    new_keys = [_releve_key(releve) for releve in releves]
+    dates_changed = False
+    if new_keys != old_keys:
+        dates_changed = date_catalog.record(db, old_keys, sign=-1)
+        dates_changed |= date_catalog.record(db, new_keys)
     db.commit()
+    _invalidate_releves(dates_changed)
     return {"updated_count": len(releves)}
 
-def get_releves_by_region_and_date_range(db: Session, idRegion: int, start_date: str, end_date: str, skip: int = 0, limit: int = 100):
-    return db.query(Releve).filter(
+def get_releves_by_region_and_date_range(db: Session, idRegion: int, start_date: str, end_date: str, skip: int = 0, limit: int = 100, columns=None):
+    return _select(db, Releve, columns).filter(
         Releve.idRegion == idRegion,
         Releve.dateReleve >= start_date,
         Releve.dateReleve <= end_date
     ).offset(skip).limit(limit).all()
 
+def get_releves_by_regions_and_date_range(db: Session, region_ids: List[int], start_date: str, end_date: str, columns=None):
+    return _select(db, Releve, columns).filter(
+        Releve.idRegion.in_(region_ids),
+        Releve.dateReleve >= start_date,
+        Releve.dateReleve <= end_date
+    ).all()
+
 # Nouvelle fonction pour récupérer les dates disponibles
-def get_available_dates(db: Session):
+def get_available_dates(db: Session, idPays: Optional[int] = None, idMaladie: Optional[int] = None):
     """
-    Récupère toutes les dates distinctes pour lesquelles des relevés existent.
+    Récupère toutes les dates distinctes pour lesquelles des relevés existent,
+    éventuellement pour un pays et / ou une maladie.
     Retourne une liste de chaînes au format 'YYYY-MM-DD'.
     """
     try:
-        # Obtenir les dates distinctes des relevés
-        dates = db.query(distinct(Releve.dateReleve)).order_by(Releve.dateReleve.desc()).all()
-        # Formater les dates en strings YYYY-MM-DD
-        return [date[0].strftime("%Y-%m-%d") for date in dates]
+        # Lues dans le catalogue des dates (date_catalog.py), pas dans Releve
+        return date_catalog.available_dates(db, idPays=idPays, idMaladie=idMaladie)
     except Exception as e:
         print(f"Erreur lors de la récupération des dates disponibles: {str(e)}")
         return []
@@ -0,0 +1,134 @@
+
+# Catalogue des dates de relevé : (date, pays, maladie) -> nombre de relevés
+#
+# Tenu à jour par crud.py dans la même transaction que les écritures sur
+# Releve : la liste des dates disponibles se lit dans cette petite table
+# (quelques lignes par jour) au lieu d'un DISTINCT sur toute la table Releve.
+# Les écritures faites hors de crud.py (import SQL direct) se rattrapent avec
+#   cd fast-api && python -m API.date_catalog rebuild
+
+from collections import Counter
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+import sys
+from sqlalchemy import delete, exists, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .models import Regions, Releve, ReleveDateCatalog as Catalog
+
+# colonnes de Releve qui déterminent la clé du catalogue
+KEY_COLUMNS = ("dateReleve", "idRegion", "idMaladie")
+# espace de noms de reference_cache des réponses /releves/available-dates/
+CACHE_NAME = "releve_dates"
+
+_checked = False
+
+
+def _as_date(value) -> date:
+    return value if isinstance(value, date) else date.fromisoformat(str(value))
+
+def _pays_of_regions(db: Session, region_ids: Iterable[int]) -> Dict[int, int]:
+    rows = db.execute(select(Regions.idRegion, Regions.idPays).where(Regions.idRegion.in_(set(region_ids))))
+    return dict(rows.all())
+
+
+def record(db: Session, rows: Iterable[Tuple], sign: int = 1) -> bool:
+    """Ajoute (`sign=1`) ou retire (`sign=-1`) des relevés (dateReleve, idRegion, idMaladie) du catalogue.
+
+    Retourne True si l'ensemble des dates du catalogue a changé (clé créée ou
+    supprimée), False si seuls les compteurs ont bougé. Ne valide pas la transaction.
+    """
+    rows = list(rows)
+    if not rows:
+        return False
+    pays = _pays_of_regions(db, (row[1] for row in rows))
+    deltas = Counter()
+    for dateReleve, idRegion, idMaladie in rows:
+        deltas[(_as_date(dateReleve), pays.get(idRegion), idMaladie)] += sign
+
+    changed = False
+    for (dateReleve, idPays, idMaladie), delta in deltas.items():
+        if delta == 0 or idPays is None:
+            continue
+        key = (Catalog.dateReleve == dateReleve, Catalog.idPays == idPays, Catalog.idMaladie == idMaladie)
+        updated = db.execute(update(Catalog).where(*key).values(nbReleves=Catalog.nbReleves + delta)).rowcount
+        if updated or delta < 0:
+            continue
+        try:
+            with db.begin_nested():
+                db.execute(insert(Catalog).values(dateReleve=dateReleve, idPays=idPays,
+                                                  idMaladie=idMaladie, nbReleves=delta))
+            changed = True
+        except IntegrityError:
+            # clé créée entre-temps par un autre worker
+            db.execute(update(Catalog).where(*key).values(nbReleves=Catalog.nbReleves + delta))
+    if sign < 0:
+        changed |= bool(db.execute(delete(Catalog).where(Catalog.nbReleves <= 0)).rowcount)
+    return changed
+
+def remove_range(db: Session, start_date, end_date) -> bool:
+    """Retire toutes les dates de [start_date, end_date] (suppression de relevés par plage)"""
+    return bool(db.execute(delete(Catalog).where(
+        Catalog.dateReleve >= _as_date(start_date), Catalog.dateReleve <= _as_date(end_date)
+    )).rowcount)
+
+def rebuild(db: Session) -> int:
+    """Recalcule tout le catalogue depuis Releve ; retourne le nombre de lignes. Ne valide pas la transaction."""
+    db.execute(delete(Catalog))
+    aggregated = select(Releve.dateReleve, Regions.idPays, Releve.idMaladie, func.count()) \
+        .join(Regions, Regions.idRegion == Releve.idRegion) \
+        .group_by(Releve.dateReleve, Regions.idPays, Releve.idMaladie)
+    db.execute(insert(Catalog).from_select(["dateReleve", "idPays", "idMaladie", "nbReleves"], aggregated))
+    return db.scalar(select(func.count()).select_from(Catalog))
+
+def ensure_built(db: Session):
+    """Construit le catalogue s'il est vide alors que Releve ne l'est pas (une fois par processus)"""
+    global _checked
+    if _checked:
+        return
+    if db.scalar(select(exists().select_from(Catalog))) or not db.scalar(select(exists().select_from(Releve))):
+        _checked = True
+        return
+    rebuild(db)
+    db.commit()
+    _checked = True
+
+
+def _scoped(query, idPays: Optional[int], idMaladie: Optional[int]):
+    if idPays is not None:
+        query = query.where(Catalog.idPays == idPays)
+    if idMaladie is not None:
+        query = query.where(Catalog.idMaladie == idMaladie)
+    return query
+
+def available_dates(db: Session, idPays: Optional[int] = None, idMaladie: Optional[int] = None) -> List[str]:
+    """Dates distinctes, de la plus récente à la plus ancienne, au format YYYY-MM-DD"""
+    ensure_built(db)
+    query = _scoped(select(Catalog.dateReleve).distinct(), idPays, idMaladie).order_by(Catalog.dateReleve.desc())
+    return [day.strftime("%Y-%m-%d") for day in db.scalars(query)]
+
+def summary(db: Session, idPays: Optional[int] = None, idMaladie: Optional[int] = None) -> dict:
+    """Première et dernière date, nombre de dates distinctes"""
+    ensure_built(db)
+    query = _scoped(select(func.min(Catalog.dateReleve), func.max(Catalog.dateReleve),
+                           func.count(func.distinct(Catalog.dateReleve))), idPays, idMaladie)
+    first, last, count = db.execute(query).one()
+    return {
+        "min": first.strftime("%Y-%m-%d") if first else None,
+        "max": last.strftime("%Y-%m-%d") if last else None,
+        "count": count,
+    }
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        print("usage : python -m API.date_catalog rebuild")
+        sys.exit(2)
+    from .database import SessionLocal
+    from .http_cache import reference_cache
+    with SessionLocal() as session:
+        total = rebuild(session)
+        session.commit()
+    reference_cache.invalidate(CACHE_NAME)
+    print(f"Catalogue des dates reconstruit : {total} lignes")
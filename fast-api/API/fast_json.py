@@ -0,0 +1,76 @@
+
+# Sérialisation JSON rapide des grandes listes (colonnes brutes, sans validation Pydantic par ligne)
+
+from decimal import Decimal
+from typing import Any, Iterable, List, Optional, Sequence
+import datetime
+import json
+from fastapi import HTTPException, Query, Response
+
+try:
+    import orjson
+except ImportError:  # dépendance optionnelle : repli sur json de la bibliothèque standard
+    orjson = None
+
+
+# paramètre `fields=` commun aux routes de liste
+FIELDS_QUERY = Query(None, description="Champs à retourner, séparés par des virgules "
+                                       "(ex: dateReleve,nbNouveauCas) ; tous par défaut")
+
+
+def _default(value: Any):
+    # même rendu que Pydantic v2 en mode JSON : Decimal en chaîne, dates ISO 8601
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    raise TypeError(f"Type {type(value).__name__} non sérialisable en JSON")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, default=_default, ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """Réponse JSON encodée avec orjson (ou json si orjson est absent)"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def schema_columns(model, schema, fields: Optional[str] = None) -> List:
+    """Colonnes du modèle SQLAlchemy dans l'ordre des champs du schéma Pydantic de sortie.
+
+    `fields` ("dateReleve,nbNouveauCas") restreint la liste aux champs demandés ;
+    un champ inconnu du schéma, ou aucun champ (ex: ","), donne une erreur 400.
+    """
+    names = list(schema.model_fields)
+    if fields:
+        requested = {name.strip() for name in fields.split(",") if name.strip()}
+        if not requested:
+            raise HTTPException(status_code=400, detail=f"Aucun champ demandé (champs possibles: {', '.join(names)})")
+        unknown = requested - set(names)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Champs inconnus: {', '.join(sorted(unknown))} "
+                                                        f"(champs possibles: {', '.join(names)})")
+        names = [name for name in names if name in requested]
+    return [getattr(model, name) for name in names]
+
+
+def rows_content(columns: Sequence, rows: Iterable[Sequence]) -> List[dict]:
+    names = [column.key for column in columns]
+    return [dict(zip(names, row)) for row in rows]
+
+
+def rows_response(columns: Sequence, rows: Iterable[Sequence]) -> FastJSONResponse:
+    """Réponse JSON à partir de tuples (une valeur par colonne), sans passer par l'ORM.
+
+    Les routes gardent leur `response_model` : le schéma OpenAPI est inchangé,
+    mais FastAPI ne revalide pas un objet `Response` retourné tel quel.
+    """
+    return FastJSONResponse(rows_content(columns, rows))
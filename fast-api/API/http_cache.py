@@ -0,0 +1,109 @@
+
+# Cache HTTP des données de référence (ETag / Last-Modified, invalidé par les écritures)
+
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Callable, Dict, Hashable, List, Optional
+import time
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from .cache_backend import SharedCache, shared_cache
+from .fast_json import dumps
+
+
+class ReferenceCache:
+    """Réponses JSON sérialisées des entités de référence, par espace de noms.
+
+    Chaque espace de noms (maladies, pays, regions, ...) a un numéro de version
+    incrémenté à chaque écriture : l'ETag d'une réponse est dérivé de cette
+    version, donc toute écriture rend caduques les ETags et les corps en cache
+    de l'espace de noms sans avoir à les parcourir. Versions et corps vivent
+    dans `shared_cache` : avec un backend partagé, tous les workers servent
+    les mêmes ETags.
+    """
+
+    def __init__(self, cache: SharedCache):
+        self.cache = cache
+        self._adapters: Dict[Any, TypeAdapter] = {}
+        self._listeners: Dict[str, List[Callable[[], None]]] = {}
+        self._started = time.time()
+
+    @staticmethod
+    def _namespace(name: str) -> str:
+        return f"reference/{name}"
+
+    def invalidate(self, *names: str):
+        """À appeler après chaque écriture sur les espaces de noms concernés"""
+        self.cache.invalidate(*[self._namespace(name) for name in names])
+        for name in names:
+            for listener in self._listeners.get(name, ()):
+                listener()
+
+    def version(self, name: str) -> Optional[int]:
+        """Version courante de l'espace de noms (partagée entre workers) ; None si inconnue"""
+        return self.cache.version(self._namespace(name))
+
+    def subscribe(self, name: str, listener: Callable[[], None]):
+        """`listener()` est appelé à chaque invalidation de `name` dans ce processus"""
+        self._listeners.setdefault(name, []).append(listener)
+
+    @staticmethod
+    def _not_modified(request: Request, etag: str, modified: float) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+            return etag in tags or "*" in tags
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                return int(modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _serialize(self, schema, value) -> bytes:
+        if schema is None:
+            # contenu déjà réduit à des types JSON (ex: fast_json.rows_content)
+            return dumps(value)
+        adapter = self._adapters.get(schema)
+        if adapter is None:
+            adapter = self._adapters[schema] = TypeAdapter(schema)
+        return adapter.dump_json(value)
+
+    def respond(self, request: Request, name: str, key: Hashable,
+                loader: Callable[[], Any], schema) -> Response:
+        """Réponse 304, corps en cache, ou `loader()` sérialisé avec `schema` puis mis en cache.
+
+        `schema=None` : `loader()` retourne directement des dicts / listes JSON.
+
+        La version est lue avant le chargement : si une écriture a lieu pendant
+        `loader()`, le corps est rangé sous l'ancienne version et sera ignoré.
+        Version inconnue (backend en panne) : ni ETag, ni 304, ni cache.
+        """
+        namespace = self._namespace(name)
+        version = self.cache.version(namespace)
+        if version is None:
+            return Response(content=self._serialize(schema, loader()), media_type="application/json",
+                            headers={"Cache-Control": "no-cache"})
+        modified = self.cache.last_modified(namespace) or self._started
+        digest = self.cache.make_key(key)
+        # epoch : vide pour un backend partagé, aléatoire par processus sinon
+        etag = '"' + "-".join(part for part in (name, self.cache.epoch, str(version), digest[:12]) if part) + '"'
+        headers = {
+            "ETag": etag,
+            "Last-Modified": formatdate(modified, usegmt=True),
+            "Cache-Control": "no-cache",
+        }
+        if self._not_modified(request, etag, modified):
+            return Response(status_code=304, headers=headers)
+
+        found, body = self.cache.get(namespace, digest, version)
+        if not found:
+            body = self._serialize(schema, loader())
+            self.cache.set(namespace, digest, body, version)
+
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+# Instance partagée par les routes de référence
+reference_cache = ReferenceCache(shared_cache)
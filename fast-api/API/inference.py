@@ -0,0 +1,361 @@
+
+# Exécution des inférences hors du processus de l'API
+#
+# Les prédictions (model.predict sklearn/boosters, passes avant torch) occupent
+# le CPU et le GIL : exécutées dans le worker de l'API, une rafale de prévisions
+# ralentit toutes les autres requêtes. Les routes de prédiction les confient à
+# un exécuteur (INFERENCE_BACKEND) :
+#   - process (défaut) : INFERENCE_WORKERS processus dédiés, démarrés à la
+#     première prédiction. Chaque tâche a une clé (cible/modèle + pays) qui la
+#     dirige toujours vers le même processus : chaque modèle n'est chargé que
+#     dans un processus, dont le cache reste chaud. Si ce processus est plein, la
+#     tâche va au processus le moins chargé ;
+#   - socket : service d'inférence local partagé par tous les workers de l'API
+#     (utile avec python -m API.serve ou uvicorn --workers) :
+#         INFERENCE_AUTHKEY=... python -m API.inference serve --workers 4
+#     Les messages sont des pickles : INFERENCE_AUTHKEY (secret partagé, sans
+#     valeur par défaut) authentifie les deux côtés, et la socket est placée
+#     dans un répertoire privé (0700) au nom de l'utilisateur du service ;
+#   - inline : dans le thread de la requête (développement, tests).
+#
+# Au plus INFERENCE_MAX_PENDING tâches en cours ou en attente par processus :
+# au-delà, InferenceSaturated (HTTP 429). Une tâche sans réponse après
+# INFERENCE_TIMEOUT secondes lève InferenceTimeout (HTTP 504) ; elle continue
+# dans son processus et y occupe sa place jusqu'à la fin, la limite reste donc
+# exacte. workers × max_pending doit rester sous la taille du pool de threads
+# de l'API (40) : les routes attendent le résultat dans un de ces threads.
+
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from multiprocessing.connection import Client, Listener
+from typing import Any, Dict, List, Optional, Sequence
+import argparse
+import logging
+import multiprocessing
+import os
+import stat
+import threading
+import zlib
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceSaturated(Exception):
+    """Tous les processus d'inférence ont atteint leur file maximale"""
+
+
+class InferenceTimeout(Exception):
+    """Pas de résultat dans le délai"""
+
+
+# ---------- tâches (exécutées dans les processus d'inférence) ----------
+def predict_classical(target: str, country: str, rows: List[Dict[str, Any]]) -> List[float]:
+    """Prédictions d'un modèle classique pour des lignes de variables ; FileNotFoundError si absent"""
+    import pandas as pd
+    from .services.model_registry import load_classical_model
+
+    model = load_classical_model(target, country.lower())
+    return [float(value) for value in model.predict(pd.DataFrame(rows))]
+
+
+@lru_cache()
+def _temporal_service():
+    from .services.temporal_predictor import TemporalPredictionService
+    return TemporalPredictionService()
+
+
+def predict_temporal(country: str, historical_data: Dict, model_type: str, prediction_horizon: int,
+                     uncertainty: Optional[str] = None, mc_samples: int = 50,
+                     confidence_level: float = 0.9) -> Dict:
+    return _temporal_service().predict(country=country, historical_data=historical_data,
+                                       model_type=model_type, prediction_horizon=prediction_horizon,
+                                       uncertainty=uncertainty, mc_samples=mc_samples,
+                                       confidence_level=confidence_level)
+
+
+def predict_grid(target: str, country: str, features: List[str], fixed: Dict[str, float],
+                 axes: List) -> List[float]:
+    from .services.scenario_sweep import score_grid
+    return score_grid(target, country, features, fixed, axes)
+
+
+TASKS = {
+    "classical": predict_classical,
+    "temporal": predict_temporal,
+    "sweep": predict_grid,
+}
+
+
+def _run_task(task: str, args: Sequence):
+    """Dans un processus d'inférence : résultat et chargements de modèles faits par la tâche.
+
+    Les métriques de ce processus ne sont pas exportées : les durées de
+    chargement (MODEL_LOAD_DURATION) sont renvoyées avec le résultat et
+    reportées dans le processus de l'API. Une tâche à la fois par processus,
+    l'écart entre deux instantanés est donc exactement celui de la tâche.
+    """
+    from .prometheus import MODEL_LOAD_DURATION
+
+    before = MODEL_LOAD_DURATION.snapshot()
+    result = TASKS[task](*args)
+    return result, MODEL_LOAD_DURATION.delta(before)
+
+
+def _merge_loads(loads: List):
+    from .prometheus import MODEL_LOAD_DURATION
+    MODEL_LOAD_DURATION.merge(loads)
+
+
+def _init_worker(threads: int):
+    # un processus = un cœur : pas de sursouscription par les pools OpenMP/BLAS/torch
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[name] = str(threads)
+
+
+# ---------- exécuteurs ----------
+class InlineExecutor:
+    """Dans le thread appelant (comportement historique)"""
+
+    def run(self, task: str, key: str, args: Sequence, timeout: Optional[float] = None):
+        return TASKS[task](*args)
+
+    def stats(self) -> Dict:
+        return {"backend": "inline"}
+
+    def shutdown(self):
+        pass
+
+
+class ProcessPoolInference:
+    """Un ProcessPoolExecutor à un processus par worker, pour diriger chaque clé vers le sien"""
+
+    def __init__(self, workers: int = 2, max_pending: int = 4, timeout: float = 30.0, threads: int = 1,
+                 start_method: str = "spawn"):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.threads = threads
+        # spawn : les workers de l'API ont des threads, fork pourrait copier un verrou tenu
+        self._context = multiprocessing.get_context(start_method)
+        self._executors: List[Optional[ProcessPoolExecutor]] = [None] * workers
+        self._pending = [0] * workers
+        self._lock = threading.Lock()
+        self.completed = self.rejected = self.timeouts = self.spilled = 0
+
+    def _executor(self, index: int) -> ProcessPoolExecutor:
+        with self._lock:
+            executor = self._executors[index]
+            if executor is None:
+                executor = self._executors[index] = ProcessPoolExecutor(
+                    max_workers=1, mp_context=self._context, initializer=_init_worker, initargs=(self.threads,))
+        return executor
+
+    def _reserve(self, key: str) -> int:
+        """Processus affecté à `key`, ou le moins chargé s'il est plein"""
+        preferred = zlib.crc32(key.encode()) % self.workers
+        with self._lock:
+            index = preferred
+            if self._pending[index] >= self.max_pending:
+                index = min(range(self.workers), key=self._pending.__getitem__)
+                if self._pending[index] >= self.max_pending:
+                    self.rejected += 1
+                    raise InferenceSaturated(
+                        f"Capacité d'inférence atteinte ({self.workers} processus × {self.max_pending} tâches)")
+                self.spilled += 1
+            self._pending[index] += 1
+        return index
+
+    def _release(self, index: int, future: Future):
+        with self._lock:
+            self._pending[index] -= 1
+            self.completed += 1
+
+    def _discard(self, index: int):
+        """Processus mort (ex. mémoire épuisée) : remplacé à la tâche suivante"""
+        with self._lock:
+            executor, self._executors[index] = self._executors[index], None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, task: str, key: str, args: Sequence, timeout: Optional[float] = None):
+        result, loads = self.run_with_loads(task, key, args, timeout)
+        _merge_loads(loads)
+        return result
+
+    def run_with_loads(self, task: str, key: str, args: Sequence, timeout: Optional[float] = None):
+        """(résultat, chargements de modèles) : voir _run_task"""
+        timeout = timeout if timeout is not None else self.timeout
+        index = self._reserve(key)
+        try:
+            future = self._executor(index).submit(_run_task, task, args)
+        except BrokenProcessPool:
+            with self._lock:
+                self._pending[index] -= 1
+            self._discard(index)
+            raise
+        future.add_done_callback(lambda f: self._release(index, f))
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            future.cancel()   # sans effet si la tâche a commencé
+            self.timeouts += 1
+            raise InferenceTimeout(f"Pas de résultat d'inférence après {timeout:.0f} s")
+        except BrokenProcessPool:
+            self._discard(index)
+            raise
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "backend": "process",
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": list(self._pending),
+                "started": [executor is not None for executor in self._executors],
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "spilled": self.spilled,
+                "timeouts": self.timeouts,
+            }
+
+    def shutdown(self):
+        for index, executor in enumerate(self._executors):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executors[index] = None
+
+
+class SocketInference:
+    """Client du service d'inférence local (`python -m API.inference serve`), une connexion par tâche"""
+
+    def __init__(self, address: str, authkey: bytes, timeout: float = 30.0):
+        self.address = address
+        self.authkey = authkey
+        self.timeout = timeout
+        self.rejected = self.timeouts = 0
+
+    def run(self, task: str, key: str, args: Sequence, timeout: Optional[float] = None):
+        timeout = timeout if timeout is not None else self.timeout
+        with Client(self.address, family="AF_UNIX", authkey=self.authkey) as conn:
+            conn.send((task, key, tuple(args), timeout))
+            # marge pour la sérialisation : le service applique lui-même le délai
+            if not conn.poll(timeout + 5):
+                self.timeouts += 1
+                raise InferenceTimeout(f"Pas de réponse du service d'inférence après {timeout:.0f} s")
+            status, value = conn.recv()
+        if status == "ok":
+            result, loads = value
+            _merge_loads(loads)
+            return result
+        if status == "saturated":
+            self.rejected += 1
+            raise InferenceSaturated(value)
+        if status == "timeout":
+            self.timeouts += 1
+            raise InferenceTimeout(value)
+        raise value
+
+    def stats(self) -> Dict:
+        return {"backend": "socket", "address": self.address, "rejected": self.rejected,
+                "timeouts": self.timeouts}
+
+    def shutdown(self):
+        pass
+
+
+def _private_directory(path: str):
+    """Crée `path` en 0700 ; refuse un répertoire d'un autre utilisateur ou ouvert aux autres"""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.stat(path)
+    if info.st_uid != os.getuid() or info.st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+        raise RuntimeError(f"{path} doit appartenir à l'utilisateur du service et être en 0700")
+
+
+def serve_socket(address: str, authkey: bytes, pool: ProcessPoolInference):
+    """Service d'inférence : un thread par connexion, tâches confiées à `pool`"""
+    _private_directory(os.path.dirname(os.path.abspath(address)))
+    if os.path.exists(address):
+        os.unlink(address)
+    listener = Listener(address, family="AF_UNIX", authkey=authkey)
+    os.chmod(address, 0o600)
+
+    def handle(conn):
+        with conn:
+            try:
+                task, key, args, timeout = conn.recv()
+                reply = ("ok", pool.run_with_loads(task, key, args, timeout))
+            except InferenceSaturated as e:
+                reply = ("saturated", str(e))
+            except InferenceTimeout as e:
+                reply = ("timeout", str(e))
+            except Exception as e:
+                reply = ("error", e)
+            try:
+                conn.send(reply)
+            except Exception as e:
+                # exception non sérialisable, ou client parti après son délai
+                logger.warning(f"Réponse d'inférence non envoyée: {e}")
+
+    logger.info(f"Service d'inférence sur {address} ({pool.workers} processus)")
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                # authentification refusée : connexion ignorée
+                logger.warning(f"Connexion refusée: {e}")
+                continue
+            threading.Thread(target=handle, args=(conn,), daemon=True).start()
+    finally:
+        listener.close()
+        pool.shutdown()
+
+
+def _pool_from_env(workers: Optional[int] = None) -> ProcessPoolInference:
+    return ProcessPoolInference(
+        workers=workers or int(os.getenv("INFERENCE_WORKERS", "2")),
+        max_pending=int(os.getenv("INFERENCE_MAX_PENDING", "4")),
+        timeout=float(os.getenv("INFERENCE_TIMEOUT", "30")),   # secondes
+        threads=int(os.getenv("INFERENCE_THREADS", "1")),
+    )
+
+
+def default_socket() -> str:
+    # XDG_RUNTIME_DIR (/run/user/<uid>) est déjà privé ; sinon un répertoire dans le HOME
+    base = os.getenv("XDG_RUNTIME_DIR") or os.path.expanduser("~")
+    return os.getenv("INFERENCE_SOCKET") or os.path.join(base, ".api-inference", "inference.sock")
+
+
+def authkey_from_env() -> bytes:
+    """Secret du service d'inférence ; obligatoire, aucune valeur par défaut"""
+    key = os.getenv("INFERENCE_AUTHKEY", "")
+    if not key:
+        raise RuntimeError("INFERENCE_AUTHKEY doit être défini pour INFERENCE_BACKEND=socket "
+                           "(secret partagé entre l'API et le service d'inférence)")
+    return key.encode()
+
+
+def executor_from_env():
+    """INFERENCE_BACKEND = process (défaut) | socket | inline"""
+    kind = os.getenv("INFERENCE_BACKEND", "process").lower()
+    if kind == "inline":
+        return InlineExecutor()
+    if kind == "socket":
+        return SocketInference(default_socket(), authkey_from_env(),
+                               timeout=float(os.getenv("INFERENCE_TIMEOUT", "30")))
+    return _pool_from_env()
+
+
+# Instance partagée par les routes de prédiction
+executor = executor_from_env()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Service d'inférence local partagé par les workers de l'API")
+    parser.add_argument("command", choices=["serve"])
+    parser.add_argument("--socket", default=default_socket())
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    serve_socket(args.socket, authkey_from_env(), _pool_from_env(args.workers))
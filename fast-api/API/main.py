@@ -1,25 +1,53 @@
-from fastapi import FastAPI, Depends, HTTPException, Query, Body, APIRouter, UploadFile, File
+from fastapi import FastAPI, Depends, HTTPException, Query, Body, APIRouter, UploadFile, File, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, Field
 from typing import List, Optional, Union
 from datetime import date
 from decimal import Decimal
-import pandas as pd
-import pickle
 from fastapi import HTTPException
+from contextlib import asynccontextmanager
 from functools import lru_cache
-from pathlib import Path
 import os
 import io
+import logging
+import threading
 
 # Importer Base depuis le module database
-from .database import Base, engine, SessionLocal
+from .database import Base, engine, SessionLocal, get_db
 from . import models, crud  # S'assurer que les modèles et fonctions CRUD sont importés
+from . import date_catalog, inference, name_search, profiling, prometheus, request_metrics, sql_profiler
+from .http_cache import reference_cache
+from .cache_backend import shared_cache
+from .compression import CompressionMiddleware, DEFAULT_CONTENT_TYPES
+from .fast_json import FIELDS_QUERY, rows_content, rows_response, schema_columns
 from .schemas.temporal_prediction import TemporalPredictionInput, TemporalPredictionOutput
-from .services.temporal_predictor import TemporalPredictionService
-
-Base.metadata.create_all(bind=engine)
+from .schemas.scenario_sweep import ScenarioSweepInput, SweepSurface
+from .services import scenario_sweep
+# pandas et torch sont importés à la première prédiction, pas au démarrage du worker
+
+logger = logging.getLogger(__name__)
+
+# levé en fin de démarrage, lu par /health/ready
+_ready = threading.Event()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Démarrage / arrêt d'un worker : tout ce qui touche la base ou lance des threads"""
+    # schéma complet depuis les modèles ; DB_CREATE_ALL=false si la base est gérée à part
+    if os.getenv("DB_CREATE_ALL", "true").lower() == "true":
+        Base.metadata.create_all(bind=engine)
+    prime_anomaly_monitor()
+    build_name_search()
+    start_request_metrics()
+    _ready.set()
+    yield
+    _ready.clear()
+    stop_request_metrics()
+    inference.executor.shutdown()
 
 
 tags_metadata = [
@@ -66,6 +94,7 @@ API = FastAPI(
     description="📊 API pour la gestion et le suivi des maladies, variants, releves epidemiologiques, etc.",
     version="1.0.0",
     openapi_tags=tags_metadata,
+    lifespan=lifespan,
     contact={
         "name": "Rose Jérôme",
         "email": "jerome.rose@ecoles-epsi.net",
@@ -94,20 +123,37 @@ API.add_middleware(
     expose_headers=["*"],  # Exposer tous les en-têtes
 )
 
-# Initialize temporal prediction service
-temporal_predictor = TemporalPredictionService()
+# Compression des réponses (gzip, ou brotli si le module est installé)
+API.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")),  # octets
+    level=int(os.getenv("COMPRESSION_LEVEL", "6")),                # gzip 1-9
+    brotli_quality=int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4")),
+    content_types=os.getenv("COMPRESSION_CONTENT_TYPES", ",".join(DEFAULT_CONTENT_TYPES)).split(","),
+)
+
+# Requêtes SQL par requête HTTP : route en commentaire SQL, journal des requêtes lentes
+# (SQL_SLOW_QUERY_MS), en-têtes X-DB-Queries / X-DB-Time si SQL_PROFILER_HEADERS=true
+API.add_middleware(sql_profiler.SQLProfilerMiddleware)
+
+# Profilage à la demande (POST /technical/admin/profile, PROFILING_TOKEN) : sans session, un test d'attribut
+API.add_middleware(profiling.ProfilingMiddleware, profiler=profiling.profiler)
+
+# Temps de réponse par route, écrits par lots dans performance_metrics ; ajouté en
+# dernier, donc à l'extérieur : durée et taille mesurées après compression
+if os.getenv("METRICS_ENABLED", "true").lower() == "true":
+    API.add_middleware(request_metrics.RequestMetricsMiddleware, recorder=request_metrics.recorder)
+
+# Service de prédiction temporelle, construit (avec torch) à la première utilisation
+@lru_cache()
+def get_temporal_predictor():
+    from .services.temporal_predictor import TemporalPredictionService
+    return TemporalPredictionService()
 
 # Ajout des imports pour les nouveaux services
 from .services.etl_service import etl_service
 from .services.technical_api import technical_api_service
-
-# ------------------ Dépendance DB ------------------
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+from .services.anomaly_monitor import anomaly_monitor
 
 # ------------------ Pydantic Schemas ------------------
 class MaladieBase(BaseModel):
@@ -197,6 +243,37 @@ class Releve(ReleveBase):
     class Config:
         from_attributes = True
 
+# Graphes imbriqués (chargés en un nombre fixe de requêtes, voir crud.get_*_graph)
+class VariantGraph(Variant):
+    symptomes: List[Symptome] = []
+
+class MaladieGraph(Maladie):
+    variants: List[VariantGraph] = []
+    traitements: List[Traitement] = []
+
+class PaysRegions(Pays):
+    regions: List[Region] = []
+
+class PaysGraph(PaysRegions):
+    continent: Optional[Continent] = None
+
+class ContinentGraph(Continent):
+    pays: List[PaysRegions] = []
+
+class DateSummary(BaseModel):
+    min: Optional[str] = None
+    max: Optional[str] = None
+    count: int
+
+class Suggestion(BaseModel):
+    type: str
+    id: int
+    label: str
+    match: str
+    isoPays: Optional[str] = None
+    codeEtat: Optional[str] = None
+    idPays: Optional[int] = None
+
 class MortalityPredictionInput(BaseModel):
     nbNouveauCas: int
     nbDeces: int
@@ -213,31 +290,66 @@ class MortalityPredictionOutput(BaseModel):
 
 
 # ------------------ Routes Génériques ------------------
-def generate_routes(model_name: str, schema_in, schema_out, crud_create, crud_get_all, crud_get_one, crud_update, crud_delete, tag: str):
+def generate_routes(model_name: str, schema_in, schema_out, crud_create, crud_get_all, crud_get_one, crud_update, crud_delete, tag: str, cached: bool = False, fast_model=None):
+    """
+    `cached=True` pour les données de référence : les lectures sont servies par
+    `reference_cache` (ETag / 304) et chaque écriture invalide l'espace de noms.
+    `fast_model` (modèle SQLAlchemy) : `read_all` sélectionne les colonnes brutes
+    (`crud_get_all(..., columns=...)`), restreintes par `fields=`, et les
+    sérialise sans validation par ligne.
+    """
+    def invalidate():
+        if cached:
+            reference_cache.invalidate(model_name)
+
     @API.post(f"/{model_name}/", response_model=schema_out, tags=[tag])
     def create(item: schema_in, db: Session = Depends(get_db)):
         """
         Créer un nouvel élément.
         """
         # Conversion de l'objet Pydantic en dictionnaire pour être compatible avec les fonctions CRUD
-        return crud_create(db, **item.model_dump())
-
-    @API.get(f"/{model_name}/", response_model=List[schema_out], tags=[tag])
-    def read_all(skip: int = 0, limit: int = 2000, db: Session = Depends(get_db)):
-        """
-        Récupérer tous les éléments.
-        """
-        return crud_get_all(db, skip, limit)
+        created = crud_create(db, **item.model_dump())
+        invalidate()
+        return created
+
+    if fast_model is not None:
+        @API.get(f"/{model_name}/", response_model=List[schema_out], tags=[tag])
+        def read_all(request: Request, skip: int = 0, limit: int = 2000,
+                     fields: Optional[str] = FIELDS_QUERY, db: Session = Depends(get_db)):
+            """
+            Récupérer tous les éléments (`fields` pour ne sélectionner que certaines colonnes).
+            """
+            columns = schema_columns(fast_model, schema_out, fields)
+            if cached:
+                return reference_cache.respond(
+                    request, model_name, ("all", skip, limit, tuple(c.key for c in columns)),
+                    lambda: rows_content(columns, crud_get_all(db, skip, limit, columns=columns)), None)
+            return rows_response(columns, crud_get_all(db, skip, limit, columns=columns))
+    else:
+        @API.get(f"/{model_name}/", response_model=List[schema_out], tags=[tag])
+        def read_all(request: Request, skip: int = 0, limit: int = 2000, db: Session = Depends(get_db)):
+            """
+            Récupérer tous les éléments.
+            """
+            if cached:
+                return reference_cache.respond(request, model_name, ("all", skip, limit),
+                                               lambda: crud_get_all(db, skip, limit), List[schema_out])
+            return crud_get_all(db, skip, limit)
 
     @API.get(f"/{model_name}/{{item_id}}", response_model=schema_out, tags=[tag])
-    def read_one(item_id: int, db: Session = Depends(get_db)):
+    def read_one(request: Request, item_id: int, db: Session = Depends(get_db)):
         """
         Récupérer un élément par son ID.
         """
-        item = crud_get_one(db, item_id)
-        if not item:
-            raise HTTPException(status_code=404, detail="Non trouvé")
-        return item
+        def load():
+            item = crud_get_one(db, item_id)
+            if not item:
+                raise HTTPException(status_code=404, detail="Non trouvé")
+            return item
+
+        if cached:
+            return reference_cache.respond(request, model_name, ("one", item_id), load, schema_out)
+        return load()
 
     @API.put(f"/{model_name}/{{item_id}}", response_model=schema_out, tags=[tag])
     def update(item_id: int, item: schema_in, db: Session = Depends(get_db)):
@@ -248,6 +360,7 @@ def generate_routes(model_name: str, schema_in, schema_out, crud_create, crud_ge
         updated = crud_update(db, item_id, item.model_dump())
         if not updated:
             raise HTTPException(status_code=404, detail="Non trouvé")
+        invalidate()
         return updated
 
     @API.delete(f"/{model_name}/{{item_id}}", tags=[tag])
@@ -258,15 +371,18 @@ def generate_routes(model_name: str, schema_in, schema_out, crud_create, crud_ge
         deleted = crud_delete(db, item_id)
         if not deleted:
             raise HTTPException(status_code=404, detail="Non trouvé")
+        invalidate()
         return {"message": "Supprimé avec succès"}
 
 #-----------Routes pour Releve------------------
 @API.get("/releves/date/{date}", response_model=List[Releve], tags=["Releves"])
-def read_releves_by_date(date: date, skip: int = 0, limit: int = 2000, db: Session = Depends(get_db)):
+def read_releves_by_date(date: date, skip: int = 0, limit: int = 2000,
+                         fields: Optional[str] = FIELDS_QUERY, db: Session = Depends(get_db)):
     """
     Récupérer les relevés à une date spécifique.
     """
-    return crud.get_releves_by_date(db, date=date, skip=skip, limit=limit)
+    columns = schema_columns(models.Releve, Releve, fields)
+    return rows_response(columns, crud.get_releves_by_date(db, date=date, skip=skip, limit=limit, columns=columns))
 
 @API.get("/releves/range/", response_model=List[Releve], tags=["Releves"])
 def read_releves_by_date_range(
@@ -274,20 +390,39 @@ def read_releves_by_date_range(
     end_date: date = Query(..., description="Date de fin (YYYY-MM-DD)"),
     skip: int = 0, 
     limit: int = 2000, 
+    fields: Optional[str] = FIELDS_QUERY,
     db: Session = Depends(get_db)
 ):
     """
     Récupérer les relevés entre deux dates.
     """
-    return crud.get_releves_by_date_range(db, start_date=start_date, end_date=end_date, skip=skip, limit=limit)
-
-@API.get("/releves/available-dates/", response_model=List[str], tags=["Releves"])
-def read_available_dates(db: Session = Depends(get_db)):
+    columns = schema_columns(models.Releve, Releve, fields)
+    return rows_response(columns, crud.get_releves_by_date_range(db, start_date=start_date, end_date=end_date,
+                                                                 skip=skip, limit=limit, columns=columns))
+
+@API.get("/releves/available-dates/", response_model=Union[List[str], DateSummary], tags=["Releves"])
+def read_available_dates(
+    request: Request,
+    idPays: Optional[int] = Query(None, description="Restreindre aux relevés d'un pays"),
+    idMaladie: Optional[int] = Query(None, description="Restreindre aux relevés d'une maladie"),
+    summary: bool = Query(False, description="Retourner seulement min / max / count"),
+    db: Session = Depends(get_db)
+):
     """
-    Récupérer la liste des dates pour lesquelles des relevés existent.
+    Récupérer la liste des dates pour lesquelles des relevés existent
+    (ou leur résumé avec `summary=true`).
     """
-    dates = crud.get_available_dates(db)
-    return dates
+    if summary:
+        loader = lambda: date_catalog.summary(db, idPays=idPays, idMaladie=idMaladie)
+    else:
+        loader = lambda: crud.get_available_dates(db, idPays=idPays, idMaladie=idMaladie)
+    return reference_cache.respond(request, date_catalog.CACHE_NAME, (idPays, idMaladie, summary),
+                                   loader, schema=None)
+
+@API.post("/releves/bulk/", response_model=dict, tags=["Releves"])
+def create_releves_bulk(releves: List[ReleveBase] = Body(...), db: Session = Depends(get_db)):
+    """Créer plusieurs relevés en une seule transaction"""
+    return crud.create_releves_bulk(db, [releve.dict() for releve in releves])
 
 @API.delete("/releves/range/", tags=["Releves"])
 def delete_releves_by_date_range(
@@ -316,11 +451,13 @@ def update_releves_by_date_range(
 
 #----------------Routes pour région----------------
 @API.get("/regions/nom/{nomEtat}", response_model=List[Region], tags=["Regions"])
-def read_regions_by_nom(nomEtat: str, skip: int = 0, limit: int = 2000, db: Session = Depends(get_db)):
+def read_regions_by_nom(nomEtat: str, skip: int = 0, limit: int = 2000,
+                        fields: Optional[str] = FIELDS_QUERY, db: Session = Depends(get_db)):
     """
-    Récupérer les régions par nom (recherche insensible à la casse et partielle).
+    Récupérer les régions par nom (recherche partielle, insensible à la casse et aux accents).
     """
-    return crud.get_regions_by_nomEtat(db, nomEtat=nomEtat, skip=skip, limit=limit)
+    columns = schema_columns(models.Regions, Region, fields)
+    return rows_response(columns, crud.get_regions_by_nomEtat(db, nomEtat=nomEtat, skip=skip, limit=limit, columns=columns))
 
 @API.delete("/regions/nom/{nomEtat}", tags=["Regions"])
 def delete_regions_by_nom(
@@ -328,7 +465,9 @@ def delete_regions_by_nom(
     db: Session = Depends(get_db)
 ):
     """Supprimer les régions par nom (insensible à la casse)"""
-    return crud.delete_regions_by_nomEtat(db, nomEtat=nomEtat)
+    result = crud.delete_regions_by_nomEtat(db, nomEtat=nomEtat)
+    reference_cache.invalidate("regions")
+    return result
 
 @API.put("/regions/nom/{nomEtat}", response_model=dict, tags=["Regions"])
 def update_regions_by_nom(
@@ -343,27 +482,75 @@ def update_regions_by_nom(
     except AttributeError:
         data = update_data.dict()  # Fallback pour les anciennes versions de Pydantic
     
-    return crud.update_regions_by_nomEtat(db, nomEtat=nomEtat, update_data=data)
+    result = crud.update_regions_by_nomEtat(db, nomEtat=nomEtat, update_data=data)
+    reference_cache.invalidate("regions")
+    return result
+
+#----------------Graphes imbriqués----------------
+# Déclarés avant generate_routes : /maladies/graph/ ne doit pas être pris pour /maladies/{item_id}.
+# Sans la barre finale, /maladies/graph correspondrait à /maladies/{item_id} (422) avant toute
+# redirection : chaque liste est aussi déclarée sous ce chemin, hors du schéma OpenAPI.
+@API.get("/maladies/graph", response_model=List[MaladieGraph], include_in_schema=False)
+@API.get("/maladies/graph/", response_model=List[MaladieGraph], tags=["Maladies"])
+def read_maladies_graph(db: Session = Depends(get_db)):
+    """Maladies avec leurs variants (et leurs symptômes) et leurs traitements"""
+    return crud.get_maladies_graph(db)
+
+@API.get("/maladies/{maladie_id}/graph", response_model=MaladieGraph, tags=["Maladies"])
+def read_maladie_graph(maladie_id: int, db: Session = Depends(get_db)):
+    """Une maladie avec ses variants (et leurs symptômes) et ses traitements"""
+    maladie = crud.get_maladies_graph(db, maladie_id=maladie_id)
+    if maladie is None:
+        raise HTTPException(status_code=404, detail="Maladie non trouvée")
+    return maladie
+
+@API.get("/pays/graph", response_model=List[PaysGraph], include_in_schema=False)
+@API.get("/pays/graph/", response_model=List[PaysGraph], tags=["Pays"])
+def read_pays_graph(idContinent: Optional[int] = None, db: Session = Depends(get_db)):
+    """Pays avec leur continent et leurs régions"""
+    return crud.get_pays_graph(db, idContinent=idContinent)
+
+@API.get("/pays/{pays_id}/graph", response_model=PaysGraph, tags=["Pays"])
+def read_one_pays_graph(pays_id: int, db: Session = Depends(get_db)):
+    """Un pays avec son continent et ses régions"""
+    pays = crud.get_pays_graph(db, pays_id=pays_id)
+    if pays is None:
+        raise HTTPException(status_code=404, detail="Pays non trouvé")
+    return pays
+
+@API.get("/continents/graph", response_model=List[ContinentGraph], include_in_schema=False)
+@API.get("/continents/graph/", response_model=List[ContinentGraph], tags=["Continents"])
+def read_continents_graph(db: Session = Depends(get_db)):
+    """Continents avec leurs pays et les régions de chaque pays"""
+    return crud.get_continents_graph(db)
 
 @API.get("/regions/by_pays/{idPays}", response_model=List[Region], tags=["Regions"])
-def read_regions_by_pays(idPays: int, db: Session = Depends(get_db)):
+def read_regions_by_pays(request: Request, idPays: int, fields: Optional[str] = FIELDS_QUERY,
+                         db: Session = Depends(get_db)):
     """Récupérer les régions par pays"""
-    return crud.get_regions_by_pays(db, idPays=idPays)
+    columns = schema_columns(models.Regions, Region, fields)
+    return reference_cache.respond(request, "regions", ("by_pays", idPays, tuple(c.key for c in columns)),
+                                   lambda: rows_content(columns, crud.get_regions_by_pays(db, idPays=idPays, columns=columns)),
+                                   None)
 
 #--------------Routes pour pays--------------------
 @API.get("/pays/nom/{nomPays}", response_model=List[Pays], tags=["Pays"])
-def read_pays_by_nom(nomPays: str, skip: int = 0, limit: int = 150, db: Session = Depends(get_db)):
+def read_pays_by_nom(nomPays: str, skip: int = 0, limit: int = 150,
+                     fields: Optional[str] = FIELDS_QUERY, db: Session = Depends(get_db)):
     """
-    Récupérer les pays par nom (recherche insensible à la casse et partielle).
+    Récupérer les pays par nom (recherche partielle, insensible à la casse et aux accents).
     """
-    return crud.get_pays_by_nom(db, nomPays=nomPays, skip=skip, limit=limit)
+    columns = schema_columns(models.Pays, Pays, fields)
+    return rows_response(columns, crud.get_pays_by_nom(db, nomPays=nomPays, skip=skip, limit=limit, columns=columns))
 
 @API.get("/pays/iso/{isoPays}", response_model=List[Pays], tags=["Pays"])
-def read_pays_by_iso(isoPays: str, skip: int = 0, limit: int = 150, db: Session = Depends(get_db)):
+def read_pays_by_iso(isoPays: str, skip: int = 0, limit: int = 150,
+                     fields: Optional[str] = FIELDS_QUERY, db: Session = Depends(get_db)):
     """
-    Récupérer les pays par code ISO (recherche insensible à la casse et partielle).
+    Récupérer les pays par code ISO (recherche partielle, insensible à la casse).
     """
-    return crud.get_pays_by_iso(db, isoPays=isoPays, skip=skip, limit=limit)
+    columns = schema_columns(models.Pays, Pays, fields)
+    return rows_response(columns, crud.get_pays_by_iso(db, isoPays=isoPays, skip=skip, limit=limit, columns=columns))
 
 @API.get("/pays/superficie/", response_model=List[Pays], tags=["Pays"])
 def read_pays_by_superficie_range(
@@ -371,12 +558,15 @@ def read_pays_by_superficie_range(
     max_superficie: Decimal = Query(..., description="Superficie maximale"),
     skip: int = 0,
     limit: int = 150,
+    fields: Optional[str] = FIELDS_QUERY,
     db: Session = Depends(get_db)
 ):
     """
     Récupérer les pays par plage de superficie.
     """
-    return crud.get_pays_by_superficie_range(db, min_superficie=min_superficie, max_superficie=max_superficie, skip=skip, limit=limit)
+    columns = schema_columns(models.Pays, Pays, fields)
+    return rows_response(columns, crud.get_pays_by_superficie_range(db, min_superficie=min_superficie, max_superficie=max_superficie,
+                                                                    skip=skip, limit=limit, columns=columns))
 
 @API.get("/pays/population/", response_model=List[Pays], tags=["Pays"])
 def read_pays_by_population_range(
@@ -384,12 +574,33 @@ def read_pays_by_population_range(
     max_population: int = Query(..., description="Population maximale"),
     skip: int = 0,
     limit: int = 150,
+    fields: Optional[str] = FIELDS_QUERY,
     db: Session = Depends(get_db)
 ):
     """
     Récupérer les pays par plage de population.
     """
-    return crud.get_pays_by_population_range(db, min_population=min_population, max_population=max_population, skip=skip, limit=limit)
+    columns = schema_columns(models.Pays, Pays, fields)
+    return rows_response(columns, crud.get_pays_by_population_range(db, min_population=min_population, max_population=max_population,
+                                                                    skip=skip, limit=limit, columns=columns))
+
+#----------------Recherche----------------
+@API.get("/search/autocomplete", response_model=List[Suggestion], tags=["Recherche"])
+def autocomplete(
+    q: str = Query(..., min_length=1, description="Début, partie ou nom approché (ex: etats-u, frnace)"),
+    type: str = Query("all", pattern="^(all|pays|regions)$", description="Entités recherchées"),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db)
+):
+    """Suggestions de pays et de régions : préfixe, sous-chaîne puis fautes de frappe"""
+    indexes = {"pays": name_search.pays_index, "regions": name_search.regions_index}
+    suggestions = []
+    for kind, index in indexes.items():
+        if type in ("all", kind):
+            suggestions += [{"type": kind, "id": m.id, "label": m.label, "match": m.match, **m.extra}
+                            for m in index.search(db, q, limit=limit)]
+    suggestions.sort(key=lambda s: (name_search.RANKS[s["match"]], s["label"]))
+    return suggestions[:limit]
 
 @API.get("/releves/region/{idRegion}/range/", response_model=List[Releve], tags=["Releves"])
 def read_releves_by_region_and_date_range(
@@ -398,76 +609,44 @@ def read_releves_by_region_and_date_range(
     end_date: str,
     skip: int = 0,
     limit: int = 2000,
+    fields: Optional[str] = FIELDS_QUERY,
     db: Session = Depends(get_db)
 ):
-    releves = crud.get_releves_by_region_and_date_range(db, idRegion, start_date, end_date, skip, limit)
+    """Récupérer les relevés par région et intervalle de dates"""
+    columns = schema_columns(models.Releve, Releve, fields)
+    releves = crud.get_releves_by_region_and_date_range(db, idRegion, start_date, end_date, skip, limit, columns=columns)
     if not releves:
         raise HTTPException(status_code=404, detail="Aucun relevé trouvé pour cette région et cette période")
-    """Récupérer les relevés par région et intervalle de dates"""
-    return releves
+    return rows_response(columns, releves)
 
 #----------------Routes pour prédiction----------------
-BASE_DIR = Path(os.path.dirname(os.path.abspath(__file__)))
-MORTALITY_MODEL_DIR = BASE_DIR / "models" / "classique" / "tauxMortalite"
-HOSPITALIZATION_MODEL_DIR = BASE_DIR / "models" / "classique" / "nbHospitalisation"
-
-@lru_cache()
-def load_mortality_model(pays: str):
-    pays = pays.lower() 
-    
-    # Format exact du fichier selon votre convention de nommage
-    pattern = f"model_tauxMortalite_{pays}_*_opt.pkl"
-    
-    # Afficher tous les fichiers disponibles
-    all_files = list(MORTALITY_MODEL_DIR.glob("*.pkl"))
-    
-    # Recherche des fichiers pour ce pays
-    files_found = list(MORTALITY_MODEL_DIR.glob(pattern))
-    print(f"Fichiers trouvés pour '{pays}': {files_found}")
-    
-    if files_found:
-        model_path = files_found[0]
-        print(f"Chargement du modèle: {model_path}")
-        try:
-            with open(model_path, "rb") as f:
-                return pickle.load(f)
-        except Exception as e:
-            print(f"Erreur lors du chargement du modèle: {e}")
-            raise HTTPException(status_code=500, detail=f"Impossible de charger le modèle: {str(e)}")
-    else:
-        raise HTTPException(
-            status_code=404,
-            detail=f"Aucun modèle de taux de mortalité trouvé pour le pays '{pays}'."
-        )
-
-@lru_cache()
-def load_hospitalization_model(pays: str):
-    pays = pays.lower() 
-    
-    # Format exact du fichier selon votre convention de nommage
-    pattern = f"model_hosp_{pays}_*_opt.pkl"
-    
-    # Afficher tous les fichiers disponibles
-    all_files = list(HOSPITALIZATION_MODEL_DIR.glob("*.pkl"))
-    
-    # Recherche des fichiers pour ce pays
-    files_found = list(HOSPITALIZATION_MODEL_DIR.glob(pattern))
-    print(f"Fichiers trouvés pour '{pays}': {files_found}")
-    
-    if files_found:
-        model_path = files_found[0]
-        print(f"Chargement du modèle: {model_path}")
-        try:
-            with open(model_path, "rb") as f:
-                return pickle.load(f)
-        except Exception as e:
-            print(f"Erreur lors du chargement du modèle: {e}")
-            raise HTTPException(status_code=500, detail=f"Impossible de charger le modèle: {str(e)}")
-    else:
-        raise HTTPException(
-            status_code=404,
-            detail=f"Aucun modèle d'hospitalisation trouvé pour le pays '{pays}'."
-        )
+# Inférences exécutées hors du processus de l'API (inference.executor, INFERENCE_BACKEND) ;
+# leur durée est mesurée ici (prometheus.observe_inference), autour de l'appel à l'exécuteur
+_inline = inference.InlineExecutor()
+
+def run_inference(task: str, key: str, *args):
+    """Tâche d'inférence ; 429 si l'exécuteur est saturé, 504 sans résultat après INFERENCE_TIMEOUT"""
+    # pendant une session de profilage, dans ce processus : le profileur voit le chemin de prédiction
+    executor = _inline if profiling.profiler.session is not None else inference.executor
+    try:
+        return executor.run(task, key, args)
+    except inference.InferenceSaturated as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except inference.InferenceTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+
+def predict_classical(target: str, pays: str, rows: List[dict], missing: str) -> List[float]:
+    pays = pays.lower()
+    try:
+        with prometheus.observe_inference(pays, target, len(rows)):
+            return run_inference("classical", f"{target}/{pays}", target, pays, rows)
+    except HTTPException:
+        raise
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=missing)
+    except Exception as e:
+        logger.exception(f"Erreur de prédiction {target}/{pays}: {e}")
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la prédiction: {str(e)}")
 
 
 class HospitalizationPredictionInput(BaseModel):
@@ -483,9 +662,9 @@ class HospitalizationPredictionOutput(BaseModel):
 
 @API.post("/prediction/mortalite/", response_model=MortalityPredictionOutput, tags=["Prediction"])
 def predict_mortality(data: MortalityPredictionInput):
-    model = load_mortality_model(data.pays)
-    input_df = pd.DataFrame([data.model_dump(exclude={"pays"})])
-    prediction = model.predict(input_df)[0]
+    prediction = predict_classical(
+        "tauxMortalite", data.pays, [data.model_dump(exclude={"pays"})],
+        f"Aucun modèle de taux de mortalité trouvé pour le pays '{data.pays.lower()}'.")[0]
     percentage = round(float(prediction) * 100, 2)
     """Prédire le taux de mortalité pour un pays donné"""
     return {
@@ -495,11 +674,10 @@ def predict_mortality(data: MortalityPredictionInput):
 
 @API.post("/prediction/hospitalisation/", response_model=HospitalizationPredictionOutput, tags=["Prediction"])
 def predict_hospitalization(data: HospitalizationPredictionInput):
-    model = load_hospitalization_model(data.pays)
-    input_df = pd.DataFrame([data.model_dump(exclude={"pays"})])
-    
     try:
-        prediction = model.predict(input_df)[0]
+        prediction = predict_classical(
+            "nbHospitalisation", data.pays, [data.model_dump(exclude={"pays"})],
+            f"Aucun modèle d'hospitalisation trouvé pour le pays '{data.pays.lower()}'.")[0]
         # Arrondir la prédiction à un nombre entier d'hospitalisations
         prediction_int = max(0, round(float(prediction)))
         
@@ -507,8 +685,10 @@ def predict_hospitalization(data: HospitalizationPredictionInput):
             "pays": data.pays,
             "nombre_hospitalisations": prediction_int
         }
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Erreur de prédiction: {e}")
+        logger.exception(f"Erreur de prédiction des hospitalisations ({data.pays}): {e}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la prédiction: {str(e)}")
 
 @API.post("/prediction/hospitalisation/csv/", response_model=HospitalizationPredictionOutput, tags=["Prediction"])
@@ -516,6 +696,8 @@ async def predict_hospitalization_from_csv(
     file: UploadFile = File(...),
     pays: str = Query(..., description="Pays pour la prédiction")
 ):
+    import pandas as pd
+
     # Vérifier l'extension du fichier
     if not file.filename.endswith('.csv'):
         raise HTTPException(
@@ -538,9 +720,6 @@ async def predict_hospitalization_from_csv(
                 detail=f"Colonnes manquantes dans le CSV: {', '.join(missing_columns)}"
             )
         
-        # Charger le modèle
-        model = load_hospitalization_model(pays)
-        
         # Prendre la première ligne pour la prédiction
         first_row = df.iloc[0]
         input_data = {
@@ -550,8 +729,10 @@ async def predict_hospitalization_from_csv(
             'populationTotale': first_row['populationTotale']
         }
         
-        input_df = pd.DataFrame([input_data])
-        prediction = model.predict(input_df)[0]
+        # route asynchrone : l'attente du résultat ne doit pas bloquer la boucle d'événements
+        prediction = (await run_in_threadpool(
+            predict_classical, "nbHospitalisation", pays, [input_data],
+            f"Aucun modèle d'hospitalisation trouvé pour le pays '{pays.lower()}'."))[0]
         prediction_int = max(0, round(float(prediction)))
         
         return {
@@ -559,19 +740,64 @@ async def predict_hospitalization_from_csv(
             "nombre_hospitalisations": prediction_int
         }
     
+    except HTTPException:
+        raise
     except pd.errors.EmptyDataError:
         raise HTTPException(status_code=400, detail="Le fichier CSV est vide.")
     except pd.errors.ParserError:
         raise HTTPException(status_code=400, detail="Erreur lors de l'analyse du fichier CSV.")
     except Exception as e:
-        print(f"Erreur lors du traitement du CSV: {e}")
+        logger.exception(f"Erreur lors du traitement du CSV: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur lors du traitement du fichier: {str(e)}")
 
+@API.post("/prediction/scenarios/", tags=["Prediction"],
+          responses={200: {"content": {"application/x-ndjson": {}, "application/json": {}}}})
+def predict_scenarios(data: ScenarioSweepInput):
+    """Balayage what-if : produit cartésien des `ranges`, évalué en un seul appel au modèle.
+
+    output=rows : flux NDJSON, une ligne par scénario (variables balayées + prédiction) ;
+    output=surface : moyenne / min / max par valeur de `surface_axes` (SweepSurface).
+    Au plus SWEEP_MAX_POINTS scénarios (400 au-delà).
+    """
+    input_model = MortalityPredictionInput if data.target == "tauxMortalite" else HospitalizationPredictionInput
+    features = [name for name in input_model.model_fields if name != "pays"]
+    pays = data.pays.lower()
+    try:
+        axes = scenario_sweep.plan(features, data.fixed,
+                                   {name: scenario_sweep.axis_values(**spec.model_dump())
+                                    for name, spec in data.ranges.items()})
+        if data.output == "surface":
+            if not data.surface_axes:
+                raise scenario_sweep.SweepError("surface_axes est requis avec output=surface")
+            scenario_sweep.check_surface_axes(axes, data.surface_axes)
+    except scenario_sweep.SweepError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    points = scenario_sweep.grid_size(axes)
+    try:
+        with prometheus.observe_inference(pays, data.target, points):
+            raw = run_inference("sweep", f"{data.target}/{pays}", data.target, pays, features, data.fixed, axes)
+    except HTTPException:
+        raise
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Aucun modèle {data.target} trouvé pour le pays '{pays}'.")
+    except Exception as e:
+        logger.exception(f"Erreur de balayage {data.target}/{pays}: {e}")
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la prédiction: {str(e)}")
+
+    name, predictions = scenario_sweep.format_predictions(data.target, raw)
+    if data.output == "surface":
+        return SweepSurface(target=data.target, pays=data.pays,
+                            **scenario_sweep.surface(axes, predictions, data.surface_axes))
+    return StreamingResponse(scenario_sweep.stream_rows(axes, predictions, name),
+                             media_type="application/x-ndjson",
+                             headers={"X-Scenario-Count": str(points)})
+
 @API.post("/prediction/temporal/", response_model=TemporalPredictionOutput, tags=["Prediction"])
 def predict_temporal(data: TemporalPredictionInput):
     """Prédiction temporelle avec modèles GRU/LSTM"""
     try:
-        print(f"Réception requête prédiction temporelle pour {data.country}")
+        logger.info(f"Réception requête prédiction temporelle pour {data.country}")
         
         # Validation des données d'entrée
         historical_data = data.historical_data.model_dump()
@@ -579,34 +805,44 @@ def predict_temporal(data: TemporalPredictionInput):
         # Vérifier que toutes les listes ont 30 éléments
         for key, values in historical_data.items():
             if key != 'dates' and len(values) != 30:
-                print(f"Erreur: {key} a {len(values)} valeurs au lieu de 30")
                 raise HTTPException(
                     status_code=400,
                     detail=f"La série {key} doit contenir exactement 30 valeurs, {len(values)} fournies"
                 )
         
         if len(historical_data['dates']) != 30:
-            print(f"Erreur: {len(historical_data['dates'])} dates au lieu de 30")
             raise HTTPException(
                 status_code=400,
                 detail=f"Il faut exactement 30 dates, {len(historical_data['dates'])} fournies"
             )
         
         # Log des données reçues pour debug
-        print(f"Données historiques reçues:")
-        print(f"  - Nouveaux cas: {historical_data['nbNouveauCas'][:5]}... (moyenne: {sum(historical_data['nbNouveauCas'])/30:.1f})")
-        print(f"  - Décès: {historical_data['nbDeces'][:5]}... (moyenne: {sum(historical_data['nbDeces'])/30:.1f})")
-        print(f"  - Hospitalisations: {historical_data['nbHospitalisation'][:5]}... (moyenne: {sum(historical_data['nbHospitalisation'])/30:.1f})")
+        logger.debug(
+            f"Données historiques reçues: nouveaux cas {historical_data['nbNouveauCas'][:5]}... "
+            f"(moyenne: {sum(historical_data['nbNouveauCas'])/30:.1f}), décès {historical_data['nbDeces'][:5]}... "
+            f"(moyenne: {sum(historical_data['nbDeces'])/30:.1f}), hospitalisations "
+            f"{historical_data['nbHospitalisation'][:5]}... (moyenne: {sum(historical_data['nbHospitalisation'])/30:.1f})")
         
         # Effectuer la prédiction
-        result = temporal_predictor.predict(
-            country=data.country.lower(),
-            historical_data=historical_data,
-            model_type=data.model_type,
-            prediction_horizon=data.prediction_horizon
+        # Même historique, même modèle, même horizon : prévision partagée entre workers
+        def forecast():
+            # séquence d'entrée, plus les trajectoires MC dropout le cas échéant
+            rows = 1 + (data.mc_samples if data.uncertainty == "mc_dropout" else 0)
+            with prometheus.observe_inference(data.country, data.model_type, rows):
+                return run_inference(
+                    "temporal", f"{data.model_type}/{data.country.lower()}",
+                    data.country.lower(), historical_data, data.model_type, data.prediction_horizon,
+                    data.uncertainty, data.mc_samples, data.confidence_level
+                )
+
+        result = shared_cache.get_or_set(
+            "forecasts/temporal",
+            shared_cache.make_key(data.country.lower(), data.model_type, data.prediction_horizon, historical_data,
+                                  data.uncertainty, data.mc_samples, data.confidence_level),
+            forecast
         )
         
-        print(f"Résultat de prédiction: {result['predictions']}")
+        logger.debug(f"Résultat de prédiction: {result['predictions']}")
         
         return TemporalPredictionOutput(
             country=data.country,
@@ -620,16 +856,14 @@ def predict_temporal(data: TemporalPredictionInput):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Erreur prédiction temporelle: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Erreur prédiction temporelle ({data.country}, {data.model_type}): {e}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la prédiction: {str(e)}")
 
 @API.get("/prediction/temporal/models/", tags=["Prediction"])
 def get_temporal_models():
     """Obtenir la liste des modèles temporels disponibles"""
     try:
-        models = temporal_predictor.get_available_models()
+        models = get_temporal_predictor().get_available_models()
         return {"models": models}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de la récupération des modèles: {str(e)}")
@@ -645,7 +879,8 @@ generate_routes(
     crud.get_maladie, 
     lambda db, id, data: crud.update_maladie(db, id, data.get("nomMaladie")),
     crud.delete_maladie, 
-    "Maladies"
+    "Maladies",
+    cached=True
 )
 
 # Pour les continents
@@ -658,7 +893,8 @@ generate_routes(
     crud.get_continent, 
     lambda db, id, data: crud.update_continent(db, id, data.get("nomContinent")),
     crud.delete_continent, 
-    "Continents"
+    "Continents",
+    cached=True
 )
 
 # Pour les symptômes
@@ -671,7 +907,8 @@ generate_routes(
     crud.get_symptome, 
     lambda db, id, data: crud.update_symptome(db, id, data.get("nomSymptome")),
     crud.delete_symptome, 
-    "Symptomes"
+    "Symptomes",
+    cached=True
 )
 
 # Pour les variants
@@ -684,7 +921,8 @@ generate_routes(
     crud.get_variant, 
     crud.update_variant,
     crud.delete_variant, 
-    "Variants"
+    "Variants",
+    cached=True
 )
 
 # Pour les traitements
@@ -697,7 +935,8 @@ generate_routes(
     crud.get_traitement, 
     lambda db, id, data: crud.update_traitement(db, id, data.get("natureTraitement")),
     crud.delete_traitement, 
-    "Traitements"
+    "Traitements",
+    cached=True
 )
 
 # Pour les pays
@@ -716,7 +955,9 @@ generate_routes(
     crud.get_pays_by_id, 
     crud.update_pays,
     crud.delete_pays, 
-    "Pays"
+    "Pays",
+    cached=True,
+    fast_model=models.Pays
 )
 
 # Pour les regions
@@ -734,7 +975,9 @@ generate_routes(
     crud.get_region, 
     crud.update_region,
     crud.delete_region, 
-    "Regions"
+    "Regions",
+    cached=True,
+    fast_model=models.Regions
 )
 
 # Pour les relevés
@@ -753,19 +996,80 @@ generate_routes(
     crud.get_releve, 
     crud.update_releve,
     crud.delete_releve, 
-    "Releves"
+    "Releves",
+    fast_model=models.Releve
 )
 
 # Nouvelle route pour récupérer les variants par maladie
 @API.get("/variants/by-maladie/{maladie_id}", response_model=List[Variant], tags=["Variants"])
-def read_variants_by_maladie(maladie_id: int, db: Session = Depends(get_db)):
+def read_variants_by_maladie(request: Request, maladie_id: int, db: Session = Depends(get_db)):
     """Récupérer les variants par maladie"""
-    return crud.get_variants_by_maladie(db, maladie_id)
+    return reference_cache.respond(request, "variants", ("by_maladie", maladie_id),
+                                   lambda: crud.get_variants_by_maladie(db, maladie_id), List[Variant])
+
+@API.get("/metrics", include_in_schema=False)
+def metrics():
+    """Métriques du processus au format Prometheus"""
+    return Response(prometheus.registry.render(), media_type=prometheus.CONTENT_TYPE)
 
 @API.get("/")
 def read_root():
     return {"status": "online", "message": "L'API fonctionne correctement"}
 
+@API.get("/health/live", tags=["Health"])
+def liveness():
+    """Le processus répond (aucun accès à la base)"""
+    return {"status": "alive"}
+
+@API.get("/health/ready", tags=["Health"])
+def readiness():
+    """Démarrage terminé et base joignable ; 503 sinon"""
+    if not _ready.is_set():
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"status": "database unavailable", "detail": str(e)})
+    return {"status": "ready"}
+
 # Ajout des routes ETL et API technique
 API.include_router(etl_service.router)
 API.include_router(technical_api_service.router)
+
+def prime_anomaly_monitor():
+    """Initialiser la surveillance des anomalies avec l'historique récent, en arrière-plan"""
+    days = int(os.getenv("ANOMALY_MONITOR_PRIME_DAYS", "60"))
+    if days <= 0:
+        return
+
+    def run():
+        db = SessionLocal()
+        try:
+            anomaly_monitor.prime(db, days)
+        except Exception as e:
+            logger.warning(f"Initialisation de la surveillance des anomalies impossible: {e}")
+        finally:
+            db.close()
+
+    threading.Thread(target=run, name="anomaly-monitor-prime", daemon=True).start()
+
+def build_name_search():
+    """Construire les index de recherche des noms de pays et de régions"""
+    db = SessionLocal()
+    try:
+        name_search.pays_index.build(db)
+        name_search.regions_index.build(db)
+    except Exception as e:
+        # reconstruits à la première recherche
+        logger.warning(f"Construction de l'index des noms impossible: {e}")
+    finally:
+        db.close()
+
+def start_request_metrics():
+    """Démarrer l'écriture par lots des métriques de requêtes"""
+    request_metrics.recorder.start()
+
+def stop_request_metrics():
+    """Écrire les métriques encore en tampon"""
+    request_metrics.recorder.stop()
@@ -0,0 +1,63 @@
+
+# Migrations de schéma versionnées, appliquées une seule fois (table schema_migrations)
+#
+#   cd fast-api && python -m API.migrations upgrade
+#   cd fast-api && python -m API.migrations status
+#
+# Une migration est un module `mNNNN_nom.py` qui définit VERSION, DESCRIPTION
+# et `upgrade(conn)`. `upgrade` doit être idempotent : sous MySQL, chaque
+# instruction DDL est validée immédiatement, une migration interrompue est
+# donc rejouée depuis le début au lancement suivant.
+
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import Column, DateTime, MetaData, String, Table, select
+from sqlalchemy.engine import Engine
+
+from . import (m0001_releve_indexes, m0002_releve_date_catalog, m0003_performance_metrics_payload,
+               m0004_anomaly_tables)
+
+# ordre d'application
+MIGRATIONS = [
+    m0001_releve_indexes,
+    m0002_releve_date_catalog,
+    m0003_performance_metrics_payload,
+    m0004_anomaly_tables,
+]
+
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("version", String(32), primary_key=True),
+    Column("description", String(200)),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def applied_versions(engine: Engine) -> List[str]:
+    _metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        return [row[0] for row in conn.execute(select(schema_migrations.c.version))]
+
+
+def pending(engine: Engine) -> List:
+    done = set(applied_versions(engine))
+    return [migration for migration in MIGRATIONS if migration.VERSION not in done]
+
+
+def upgrade(engine: Optional[Engine] = None) -> List[str]:
+    """Applique les migrations en attente, dans l'ordre ; retourne les versions appliquées"""
+    if engine is None:
+        from ..database import engine
+    applied = []
+    for migration in pending(engine):
+        with engine.begin() as conn:
+            migration.upgrade(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=migration.VERSION,
+                description=migration.DESCRIPTION,
+                applied_at=datetime.utcnow(),
+            ))
+        applied.append(migration.VERSION)
+    return applied
@@ -0,0 +1,86 @@
+
+# cd fast-api && python -m API.migrations {upgrade,status,explain} [--sqlite] [--update]
+
+import argparse
+import sys
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from . import MIGRATIONS, applied_versions, upgrade
+
+
+def _engine(sqlite: bool):
+    if not sqlite:
+        from ..database import engine
+        return engine
+    # schéma des modèles dans une base SQLite en mémoire (sans MySQL, ex: CI)
+    from ..database import Base
+    from .. import models
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    # données de référence minimales : les recherches par nom de pays aboutissent à de vraies
+    # requêtes, et plusieurs parents par niveau font apparaître un chargement N+1 des graphes
+    with Session(bind=engine) as db:
+        symptomes = [models.Symptome(idSymptome=1, nomSymptome="fièvre"),
+                     models.Symptome(idSymptome=2, nomSymptome="toux")]
+        traitement = models.Traitement(idTraitement=1, natureTraitement="vaccin")
+        db.add_all([
+            models.Continent(idContinent=1, nomContinent="Europe"),
+            models.Pays(idPays=1, nomPays="Suisse", isoPays="CHE", idContinent=1),
+            models.Pays(idPays=2, nomPays="France", isoPays="FRA", idContinent=1),
+            models.Regions(idRegion=1, nomEtat="Genève", codeEtat="GE", idPays=1),
+            models.Regions(idRegion=2, nomEtat="Vaud", codeEtat="VD", idPays=1),
+            models.Regions(idRegion=3, nomEtat="Bretagne", codeEtat="BRE", idPays=2),
+            models.Maladie(idMaladie=1, nomMaladie="covid", traitements=[traitement]),
+            models.Maladie(idMaladie=2, nomMaladie="mpox", traitements=[traitement]),
+            models.Variant(idVariant=1, nomVariant="alpha", idMaladie=1, symptomes=symptomes),
+            models.Variant(idVariant=2, nomVariant="delta", idMaladie=1, symptomes=symptomes[:1]),
+            models.Variant(idVariant=3, nomVariant="clade I", idMaladie=2, symptomes=symptomes[1:]),
+        ])
+        db.commit()
+    return engine
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m API.migrations")
+    parser.add_argument("command", choices=["upgrade", "status", "explain"])
+    parser.add_argument("--sqlite", action="store_true", help="base SQLite en mémoire créée depuis les modèles")
+    parser.add_argument("--update", action="store_true", help="explain : réécrire l'instantané")
+    args = parser.parse_args()
+    engine = _engine(args.sqlite)
+
+    if args.command == "upgrade":
+        try:
+            applied = upgrade(engine)
+        except Exception as e:
+            # ex. relevés en double (0001) : la migration reste en attente, rejouée au prochain lancement
+            print(f"Migration non appliquée : {e}", file=sys.stderr)
+            return 1
+        print(f"Migrations appliquées : {', '.join(applied)}" if applied else "Schéma à jour")
+        return 0
+
+    if args.command == "status":
+        done = set(applied_versions(engine))
+        for migration in MIGRATIONS:
+            state = "appliquée " if migration.VERSION in done else "en attente"
+            print(f"{migration.VERSION}  {state}  {migration.DESCRIPTION}")
+        return 0
+
+    from . import query_plans
+    upgrade(engine)
+    plans = query_plans.collect(engine)
+    if args.update:
+        query_plans.save_snapshot(engine.dialect.name, plans)
+        print(f"Instantané {engine.dialect.name} mis à jour ({len(plans)} cas) : {query_plans.SNAPSHOT_PATH}")
+        return 0
+    problems = query_plans.check(engine, plans)
+    for problem in problems:
+        print(f"✗ {problem}")
+    if not problems:
+        print(f"✓ {len(plans)} plans conformes à l'instantané {engine.dialect.name}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
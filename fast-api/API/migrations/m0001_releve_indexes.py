@@ -0,0 +1,83 @@
+
+# Index composites de Releve alignés sur les requêtes de l'API, clé unique (région, date, maladie)
+#
+# Formes de requête visées :
+#   - idRegion = ? AND dateReleve BETWEEN ...        (crud.get_releves_by_region_and_date_range)
+#   - idRegion IN (...) AND dateReleve BETWEEN ...   (analytics/trends, détection d'anomalies)
+#   - dateReleve BETWEEN ... / dateReleve = ?        (crud.get_releves_by_date_range, get_releves_by_date)
+#   - DISTINCT dateReleve ORDER BY dateReleve        (crud.get_available_dates, parcours d'index seul)
+#
+# La clé unique est déclarée (idRegion, dateReleve, idMaladie) : même ensemble de
+# colonnes que (idRegion, idMaladie, dateReleve), mais la date en deuxième position
+# sert aussi les plages de dates par région. L'index idRegion seul devient un
+# préfixe redondant et est supprimé.
+#
+# Base vide : rien à faire, create_all crée ensuite les tables avec ces index
+# (déclarés aussi dans models.py).
+
+from sqlalchemy import Column, Date, Index, Integer, MetaData, Table, func, inspect, select
+
+VERSION = "0001"
+DESCRIPTION = "Releve : clé unique (idRegion, dateReleve, idMaladie), index date / maladie"
+
+# copie figée des tables au moment de la migration (indépendante de models.py)
+_metadata = MetaData()
+_releve = Table(
+    "Releve", _metadata,
+    Column("idReleve", Integer, primary_key=True),
+    Column("dateReleve", Date),
+    Column("idRegion", Integer),
+    Column("idMaladie", Integer),
+)
+_regions = Table(
+    "Regions", _metadata,
+    Column("idRegion", Integer, primary_key=True),
+    Column("idPays", Integer),
+)
+
+CREATE = [
+    Index("uq_releve_region_date_maladie", _releve.c.idRegion, _releve.c.dateReleve, _releve.c.idMaladie,
+          unique=True),
+    Index("idx_releve_date", _releve.c.dateReleve),
+    Index("idx_releve_maladie", _releve.c.idMaladie),
+    Index("idx_region_pays", _regions.c.idPays),
+]
+DROP = [
+    Index("idx_releve_region", _releve.c.idRegion),
+]
+
+
+def _duplicates(conn, limit: int = 5):
+    key = (_releve.c.idRegion, _releve.c.dateReleve, _releve.c.idMaladie)
+    return conn.execute(
+        select(*key, func.count().label("n")).group_by(*key).having(func.count() > 1).limit(limit)
+    ).all()
+
+
+def upgrade(conn):
+    inspector = inspect(conn)
+    if not all(inspector.has_table(table) for table in ("Releve", "Regions")):
+        return
+    existing = {
+        table: {index["name"] for index in inspector.get_indexes(table)}
+        for table in ("Releve", "Regions")
+    }
+
+    unique = CREATE[0]
+    if unique.name not in existing["Releve"]:
+        duplicates = _duplicates(conn)
+        if duplicates:
+            examples = ", ".join(f"(idRegion={r[0]}, dateReleve={r[1]}, idMaladie={r[2]}) x{r[3]}"
+                                 for r in duplicates)
+            raise RuntimeError(
+                f"Migration {VERSION} : relevés en double, la clé unique ne peut pas être créée. "
+                f"Dédoublonner Releve puis relancer. Exemples : {examples}"
+            )
+
+    # créer avant de supprimer : la clé étrangère idRegion garde toujours un index utilisable
+    for index in CREATE:
+        if index.name not in existing[index.table.name]:
+            index.create(conn)
+    for index in DROP:
+        if index.name in existing[index.table.name]:
+            index.drop(conn)
@@ -0,0 +1,44 @@
+
+# Catalogue des dates de relevé (ReleveDateCatalog), rempli depuis Releve
+#
+# Une ligne par (date, pays, maladie) avec le nombre de relevés ; tenu à jour
+# ensuite par crud.py (voir date_catalog.py). Base vide : rien à remplir, la
+# table est créée par create_all au démarrage.
+
+from sqlalchemy import Column, Date, Integer, MetaData, Table, delete, func, insert, inspect, select
+
+VERSION = "0002"
+DESCRIPTION = "ReleveDateCatalog : dates de relevé par pays et maladie"
+
+_metadata = MetaData()
+_catalog = Table(
+    "ReleveDateCatalog", _metadata,
+    Column("dateReleve", Date, primary_key=True),
+    Column("idPays", Integer, primary_key=True),
+    Column("idMaladie", Integer, primary_key=True),
+    Column("nbReleves", Integer, nullable=False, default=0),
+)
+_releve = Table(
+    "Releve", _metadata,
+    Column("dateReleve", Date),
+    Column("idRegion", Integer),
+    Column("idMaladie", Integer),
+)
+_regions = Table(
+    "Regions", _metadata,
+    Column("idRegion", Integer, primary_key=True),
+    Column("idPays", Integer),
+)
+
+
+def upgrade(conn):
+    inspector = inspect(conn)
+    if not all(inspector.has_table(table) for table in ("Releve", "Regions")):
+        return
+    _catalog.create(conn, checkfirst=True)
+    # la table peut déjà exister (create_all au démarrage) : remplissage complet
+    conn.execute(delete(_catalog))
+    aggregated = select(_releve.c.dateReleve, _regions.c.idPays, _releve.c.idMaladie, func.count()) \
+        .join(_regions, _regions.c.idRegion == _releve.c.idRegion) \
+        .group_by(_releve.c.dateReleve, _regions.c.idPays, _releve.c.idMaladie)
+    conn.execute(insert(_catalog).from_select(["dateReleve", "idPays", "idMaladie", "nbReleves"], aggregated))
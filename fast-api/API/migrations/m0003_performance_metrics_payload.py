@@ -0,0 +1,33 @@
+
+# performance_metrics : colonne payload_size (taille des réponses)
+#
+# La table est créée par docker/mysql-init/01-init.sql sans cette colonne ;
+# elle est créée ici si elle n'existe pas encore (base sans script d'init).
+
+from sqlalchemy import DECIMAL, Column, DateTime, Index, Integer, MetaData, String, Table, func, inspect, text
+
+VERSION = "0003"
+DESCRIPTION = "performance_metrics : colonne payload_size"
+
+_metadata = MetaData()
+_metrics = Table(
+    "performance_metrics", _metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("service_name", String(50), nullable=False),
+    Column("endpoint", String(100), nullable=False),
+    Column("response_time", DECIMAL(10, 3), nullable=False),
+    Column("status_code", Integer, nullable=False),
+    Column("payload_size", Integer),
+    Column("timestamp", DateTime, server_default=func.now()),
+    Index("idx_service_time", "service_name", "timestamp"),
+)
+
+
+def upgrade(conn):
+    inspector = inspect(conn)
+    if not inspector.has_table("performance_metrics"):
+        _metrics.create(conn)
+        return
+    columns = {column["name"] for column in inspector.get_columns("performance_metrics")}
+    if "payload_size" not in columns:
+        conn.execute(text("ALTER TABLE performance_metrics ADD COLUMN payload_size INT NULL"))
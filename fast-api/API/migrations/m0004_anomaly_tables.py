@@ -0,0 +1,47 @@
+
+# Surveillance des anomalies en base : statistiques par série et alertes
+#
+# Tables créées aussi par create_all au démarrage ; ici pour les bases gérées
+# à part (DB_CREATE_ALL=false). Les statistiques sont initialisées au premier
+# démarrage de l'API (AnomalyMonitor.prime), pas par la migration.
+
+from sqlalchemy import Column, Date, DateTime, Float, Integer, MetaData, String, Table
+
+VERSION = "0004"
+DESCRIPTION = "AnomalySeries / AnomalyAlert : surveillance des anomalies partagée entre workers"
+
+_metadata = MetaData()
+_series = Table(
+    "AnomalySeries", _metadata,
+    Column("idRegion", Integer, primary_key=True),
+    Column("idMaladie", Integer, primary_key=True),
+    Column("metric", String(40), primary_key=True),
+    Column("mean", Float, nullable=False),
+    Column("var", Float, nullable=False),
+    Column("count", Integer, nullable=False),
+    Column("last_date", Date),
+    Column("base_mean", Float, nullable=False),
+    Column("base_var", Float, nullable=False),
+    Column("base_count", Integer, nullable=False),
+    Column("last_value", Float),
+)
+_alerts = Table(
+    "AnomalyAlert", _metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("detected_at", DateTime, nullable=False),
+    Column("idRegion", Integer, nullable=False),
+    Column("idMaladie", Integer, nullable=False),
+    Column("metric", String(40), nullable=False),
+    Column("dateReleve", Date, nullable=False),
+    Column("value", Float, nullable=False),
+    Column("expected", Float, nullable=False),
+    Column("scale", Float, nullable=False),
+    Column("z_score", Float, nullable=False),
+    Column("direction", String(8), nullable=False),
+    Column("severity", String(8), nullable=False),
+)
+
+
+def upgrade(conn):
+    _series.create(conn, checkfirst=True)
+    _alerts.create(conn, checkfirst=True)
@@ -0,0 +1,195 @@
+
+# Instantanés EXPLAIN des fonctions de crud.py : détecte les plans qui régressent
+#
+#   cd fast-api && python -m API.migrations explain --sqlite   # schéma des modèles, SQLite en mémoire
+#   cd fast-api && python -m API.migrations explain            # base configurée (MySQL)
+#   cd fast-api && python -m API.migrations explain --update   # réécrit l'instantané du dialecte
+#
+# Chaque cas exécute une fonction de crud.py en capturant ses SELECT, puis
+# rejoue EXPLAIN sur chacun. La vérification échoue si le plan diffère de
+# l'instantané (query_plans.json), si une table de GUARDED_TABLES est
+# parcourue en entier hors de FULL_SCAN_ALLOWED, ou si un cas de
+# QUERY_BUDGETS émet plus de requêtes que prévu (N+1 sur les relations).
+
+from typing import Callable, Dict, List, Tuple
+import json
+import os
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from .. import crud, date_catalog
+from ..services import anomaly_engine
+
+SNAPSHOT_PATH = os.path.join(os.path.dirname(__file__), "query_plans.json")
+
+# tables pour lesquelles un parcours complet est une régression
+GUARDED_TABLES = ("Releve",)
+# parcours complets attendus (liste paginée sans filtre)
+FULL_SCAN_ALLOWED = {"get_releves"}
+
+# nombre maximal de SELECT par cas, indépendant du nombre de lignes : les
+# graphes (crud.get_*_graph) chargent leurs relations en une requête par niveau
+QUERY_BUDGETS = {
+    "get_maladies_graph": 4,
+    "get_maladies_graph.one": 4,
+    "get_pays_graph": 2,
+    "get_continents_graph": 3,
+}
+
+START, END = "2022-01-01", "2022-01-31"
+
+
+# parcourent tout le graphe retourné, comme la sérialisation des réponses :
+# une relation non chargée déclencherait une requête (ou une erreur avec raiseload)
+def _walk_maladies(maladies):
+    for maladie in maladies:
+        for variant in maladie.variants:
+            list(variant.symptomes)
+        list(maladie.traitements)
+
+def _walk_pays(pays):
+    for item in pays:
+        item.continent
+        list(item.regions)
+
+def _walk_continents(continents):
+    for continent in continents:
+        for pays in continent.pays:
+            list(pays.regions)
+
+# fonctions en lecture seule ; les mises à jour / suppressions par plage
+# (update_releves_by_date_range, delete_releves_by_date_range) partagent le
+# filtre de get_releves_by_date_range
+CASES: Dict[str, Callable[[Session], object]] = {
+    "get_releves": lambda db: crud.get_releves(db, limit=100),
+    "get_releves_by_date_range": lambda db: crud.get_releves_by_date_range(db, START, END),
+    "get_releves_by_date": lambda db: crud.get_releves_by_date(db, START),
+    "get_releves_by_region_and_date_range":
+        lambda db: crud.get_releves_by_region_and_date_range(db, 1, START, END),
+    "get_releves_by_regions_and_date_range":
+        lambda db: crud.get_releves_by_regions_and_date_range(db, [1, 2, 3], START, END),
+    "get_available_dates": lambda db: crud.get_available_dates(db),
+    "get_available_dates.scoped": lambda db: crud.get_available_dates(db, idPays=1, idMaladie=1),
+    "date_catalog.summary": lambda db: date_catalog.summary(db),
+    "get_regions_by_pays": lambda db: crud.get_regions_by_pays(db, 1),
+    "get_variants_by_maladie": lambda db: crud.get_variants_by_maladie(db, 1),
+    "get_pays_by_nom": lambda db: crud.get_pays_by_nom(db, "suisse"),
+    "get_maladies_graph": lambda db: _walk_maladies(crud.get_maladies_graph(db)),
+    "get_maladies_graph.one": lambda db: _walk_maladies([crud.get_maladies_graph(db, maladie_id=1)]),
+    "get_pays_graph": lambda db: _walk_pays(crud.get_pays_graph(db)),
+    "get_continents_graph": lambda db: _walk_continents(crud.get_continents_graph(db)),
+    "anomaly_engine.latest_date": lambda db: anomaly_engine.latest_date(db, "suisse"),
+    "anomaly_engine.load_region_series":
+        lambda db: anomaly_engine.load_region_series(db, START, END, "nbNouveauCas", "suisse"),
+}
+
+
+def _capture(engine: Engine, case: Callable[[Session], object]) -> List[Tuple[str, object]]:
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        with Session(bind=engine) as db:
+            case(db)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return statements
+
+
+def _explain(conn, statement: str, parameters) -> List[str]:
+    if conn.dialect.name == "sqlite":
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+        return [row[3] for row in rows]
+    # MySQL : une ligne par table ; seules les colonnes stables sont gardées (pas `rows`)
+    lines = []
+    for row in conn.exec_driver_sql("EXPLAIN " + statement, parameters).mappings():
+        extra = [item for item in (row.get("Extra") or "").split("; ")
+                 if item in ("Using index", "Using filesort", "Using temporary")]
+        lines.append(" ".join([str(row["table"]), str(row["type"]), f"key={row['key'] or '-'}", *extra]))
+    return lines
+
+
+def _is_full_scan(dialect: str, line: str) -> bool:
+    for table in GUARDED_TABLES:
+        if dialect == "sqlite":
+            # "SCAN Releve" (table) ou "SCAN Releve USING INDEX x" (index puis table) ;
+            # "USING COVERING INDEX" ne lit que l'index
+            if line.startswith(f"SCAN {table}") and "COVERING INDEX" not in line:
+                return True
+        else:
+            parts = line.split()
+            if parts[0] == table and (parts[1] == "ALL" or (parts[1] == "index" and "Using index" not in line)):
+                return True
+    return False
+
+
+def collect(engine: Engine) -> Dict[str, List[str]]:
+    """Plan de chaque cas : une ligne par étape, requêtes successives séparées par '--'.
+
+    Après la première requête, les plans sont triés : l'ordre dans lequel
+    l'ORM émet les chargements frères (selectinload) varie d'un processus à
+    l'autre sans changer les requêtes.
+    """
+    # sans la vérification « catalogue vide ? » du premier appel, propre à chaque processus
+    date_catalog._checked = True
+    plans = {}
+    for name, case in CASES.items():
+        statements = _capture(engine, case)
+        with engine.connect() as conn:
+            groups = [_explain(conn, statement, parameters) for statement, parameters in statements]
+        groups[1:] = sorted(groups[1:])
+        lines = []
+        for i, group in enumerate(groups):
+            if i:
+                lines.append("--")
+            lines.extend(group)
+        plans[name] = lines
+    return plans
+
+
+def load_snapshot() -> Dict[str, Dict[str, List[str]]]:
+    if not os.path.exists(SNAPSHOT_PATH):
+        return {}
+    with open(SNAPSHOT_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_snapshot(dialect: str, plans: Dict[str, List[str]]):
+    snapshot = load_snapshot()
+    snapshot[dialect] = plans
+    with open(SNAPSHOT_PATH, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, indent=2, ensure_ascii=False, sort_keys=True)
+        f.write("\n")
+
+
+def check(engine: Engine, plans: Dict[str, List[str]]) -> List[str]:
+    """Écarts avec l'instantané et parcours complets interdits ; liste vide = OK"""
+    dialect = engine.dialect.name
+    problems = []
+    for name, lines in plans.items():
+        if name not in FULL_SCAN_ALLOWED:
+            for line in lines:
+                if _is_full_scan(dialect, line):
+                    problems.append(f"{name} : parcours complet ({line})")
+
+    for name, budget in QUERY_BUDGETS.items():
+        lines = plans.get(name, [])
+        count = lines.count("--") + 1 if lines else 0
+        if count > budget:
+            problems.append(f"{name} : {count} requêtes pour un budget de {budget}")
+
+    expected = load_snapshot().get(dialect)
+    if expected is None:
+        problems.append(f"pas d'instantané pour {dialect} : lancer `explain --update`")
+        return problems
+    for name in sorted(set(expected) | set(plans)):
+        if expected.get(name) != plans.get(name):
+            problems.append(f"{name} : plan modifié\n"
+                            f"    attendu : {expected.get(name)}\n"
+                            f"    obtenu  : {plans.get(name)}")
+    return problems
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DECIMAL, Date, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, DECIMAL, Date, DateTime, Float, ForeignKey, Index, Table, func
 from sqlalchemy.orm import relationship
 from .database import Base
 
@@ -84,6 +84,10 @@ class Regions(Base):
     pays = relationship("Pays", back_populates="regions")
     releves = relationship("Releve", back_populates="region")
 
+    __table_args__ = (
+        Index("idx_region_pays", "idPays"),
+    )
+
 class Releve(Base):
     __tablename__ = "Releve"
     idReleve = Column(Integer, primary_key=True, autoincrement=True)
@@ -102,3 +106,69 @@ class Releve(Base):
 
     region = relationship("Regions", back_populates="releves")
     maladie = relationship("Maladie", back_populates="releves")
+
+    # Index alignés sur les requêtes de l'API (voir migrations/m0001_releve_indexes.py)
+    __table_args__ = (
+        # un relevé par région, jour et maladie ; sert aussi idRegion = ? / IN (...) + plage de dates
+        Index("uq_releve_region_date_maladie", "idRegion", "dateReleve", "idMaladie", unique=True),
+        # plages de dates toutes régions, DISTINCT dateReleve ORDER BY (parcours d'index seul)
+        Index("idx_releve_date", "dateReleve"),
+        Index("idx_releve_maladie", "idMaladie"),
+    )
+
+# Dates de relevé par pays et maladie, tenues à jour par crud.py (voir date_catalog.py)
+class ReleveDateCatalog(Base):
+    __tablename__ = "ReleveDateCatalog"
+    dateReleve = Column(Date, primary_key=True)
+    idPays = Column(Integer, primary_key=True)
+    idMaladie = Column(Integer, primary_key=True)
+    nbReleves = Column(Integer, nullable=False, default=0)
+
+# Statistiques glissantes par série (région, maladie, métrique), tenues à jour par crud.py
+# dans la transaction des écritures sur Releve (voir services/anomaly_monitor.py)
+class AnomalySeries(Base):
+    __tablename__ = "AnomalySeries"
+    idRegion = Column(Integer, primary_key=True)
+    idMaladie = Column(Integer, primary_key=True)
+    metric = Column(String(40), primary_key=True)
+    mean = Column(Float, nullable=False, default=0.0)
+    var = Column(Float, nullable=False, default=0.0)
+    count = Column(Integer, nullable=False, default=0)
+    last_date = Column(Date)
+    # état avant l'intégration de last_date et valeur cumulée de ce jour : un
+    # relevé du même jour est ajouté à cette valeur au lieu d'être ignoré
+    base_mean = Column(Float, nullable=False, default=0.0)
+    base_var = Column(Float, nullable=False, default=0.0)
+    base_count = Column(Integer, nullable=False, default=0)
+    last_value = Column(Float)
+
+# Alertes de la surveillance continue, lues par tous les workers (flux SSE, /technical/alerts/recent)
+class AnomalyAlert(Base):
+    __tablename__ = "AnomalyAlert"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    detected_at = Column(DateTime, nullable=False)
+    idRegion = Column(Integer, nullable=False)
+    idMaladie = Column(Integer, nullable=False)
+    metric = Column(String(40), nullable=False)
+    dateReleve = Column(Date, nullable=False)
+    value = Column(Float, nullable=False)
+    expected = Column(Float, nullable=False)
+    scale = Column(Float, nullable=False)
+    z_score = Column(Float, nullable=False)
+    direction = Column(String(8), nullable=False)
+    severity = Column(String(8), nullable=False)
+
+# Temps de réponse des requêtes HTTP, écrits par lots (voir request_metrics.py)
+class PerformanceMetric(Base):
+    __tablename__ = "performance_metrics"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    service_name = Column(String(50), nullable=False)
+    endpoint = Column(String(100), nullable=False)
+    response_time = Column(DECIMAL(10, 3), nullable=False)  # millisecondes
+    status_code = Column(Integer, nullable=False)
+    payload_size = Column(Integer)                          # octets envoyés
+    timestamp = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        Index("idx_service_time", "service_name", "timestamp"),
+    )
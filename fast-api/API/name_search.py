@@ -0,0 +1,210 @@
+
+# Recherche en mémoire des noms de pays et de régions : préfixe, sous-chaîne, fautes de frappe
+#
+# Les noms et codes sont « repliés » (minuscules, sans accents ni ponctuation :
+# "États-Unis" -> "etats unis") puis indexés de deux façons :
+#   - une liste triée des clés et de leurs suffixes de mots, parcourue par
+#     dichotomie pour les préfixes ("uni" trouve "etats unis") ;
+#   - un index de bigrammes, qui donne les candidats des recherches par
+#     sous-chaîne et par distance d'édition (Damerau-Levenshtein bornée).
+# L'index est reconstruit après chaque écriture sur l'espace de noms de
+# reference_cache correspondant : immédiatement dans le worker qui écrit, au
+# plus REFRESH_INTERVAL secondes plus tard dans les autres.
+
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+import threading
+import time
+import unicodedata
+from sqlalchemy.orm import Session
+
+from .http_cache import reference_cache
+from .models import Pays, Regions
+
+REFRESH_INTERVAL = 1.0  # secondes entre deux lectures de la version partagée
+
+# rang des correspondances, du plus au moins pertinent
+EXACT, PREFIX, WORD_PREFIX, SUBSTRING, FUZZY = "exact", "prefix", "word_prefix", "substring", "fuzzy"
+RANKS = {EXACT: 0, PREFIX: 1, WORD_PREFIX: 2, SUBSTRING: 3, FUZZY: 4}
+
+# ligatures non décomposées par NFKD
+_LIGATURES = str.maketrans({"œ": "oe", "Œ": "oe", "æ": "ae", "Æ": "ae", "ß": "ss"})
+
+
+def fold(text: Optional[str]) -> str:
+    """Forme de comparaison : minuscules, sans accents, ponctuation remplacée par des espaces"""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", text.translate(_LIGATURES))
+    chars = [c if c.isalnum() else " " for c in text.lower() if not unicodedata.combining(c)]
+    return " ".join("".join(chars).split())
+
+def _bigrams(text: str) -> Set[str]:
+    padded = f" {text} "
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+def _distance(a: str, b: str, limit: int) -> int:
+    """Distance de Damerau-Levenshtein (transpositions adjacentes), arrêtée au-delà de `limit`"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+def _max_typos(term: str) -> int:
+    return 1 if len(term) <= 5 else 2
+
+
+@dataclass
+class Match:
+    id: int
+    label: str
+    match: str
+    extra: dict = field(default_factory=dict)
+
+
+class NameIndex:
+    """Index des noms d'une entité de référence.
+
+    `load(db)` retourne des tuples (id, libellé, {colonne: texte indexé}, extra),
+    par exemple (1, "France", {"nomPays": "France", "isoPays": "FRA"}, {...}) ;
+    `search(..., columns=[...])` se limite à certaines colonnes.
+    """
+
+    def __init__(self, name: str, load: Callable[[Session], List[Tuple[int, str, Dict[str, str], dict]]]):
+        self.name = name
+        self._load = load
+        self._lock = threading.Lock()
+        self._dirty = True
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        self._labels: Dict[int, Tuple[str, dict]] = {}
+        self._keys: List[Tuple[str, int, str]] = []      # (clé repliée, id, colonne)
+        self._sorted: List[Tuple[str, int, bool]] = []   # (clé ou suffixe de mot, n° de clé, début de clé ?)
+        self._grams: Dict[str, Set[int]] = {}            # bigramme -> n° de clés
+        reference_cache.subscribe(name, self.invalidate)
+
+    def invalidate(self):
+        self._dirty = True
+
+    def build(self, db: Session):
+        version = reference_cache.version(self.name)
+        labels, keys = {}, []
+        for id_, label, texts, extra in self._load(db):
+            labels[id_] = (label, extra)
+            for column, text in texts.items():
+                if fold(text):
+                    keys.append((fold(text), id_, column))
+        sorted_keys, grams = [], {}
+        for n, (key, _, _) in enumerate(keys):
+            sorted_keys.append((key, n, True))
+            for i, char in enumerate(key):
+                if char == " ":
+                    sorted_keys.append((key[i + 1:], n, False))
+            for gram in _bigrams(key):
+                grams.setdefault(gram, set()).add(n)
+        sorted_keys.sort()
+        with self._lock:
+            self._labels, self._keys, self._sorted, self._grams = labels, keys, sorted_keys, grams
+            self._version, self._dirty, self._checked_at = version, False, time.monotonic()
+
+    def _refresh(self, db: Session):
+        now = time.monotonic()
+        if not self._dirty and now - self._checked_at < REFRESH_INTERVAL:
+            return
+        if not self._dirty:
+            self._checked_at = now
+            version = reference_cache.version(self.name)
+            if version is not None and version == self._version:
+                return
+        self.build(db)
+
+    def search(self, db: Session, term: str, limit: Optional[int] = 10, fuzzy: bool = True,
+               columns: Optional[Sequence[str]] = None) -> List[Match]:
+        """Correspondances triées par pertinence : exacte, préfixe, préfixe d'un mot, sous-chaîne, puis
+        fautes de frappe (si `fuzzy`, seulement quand les autres ne suffisent pas à remplir `limit`)"""
+        self._refresh(db)
+        query = fold(term)
+        if not query:
+            return []
+        with self._lock:
+            keys, sorted_keys, grams, labels = self._keys, self._sorted, self._grams, self._labels
+        best: Dict[int, Tuple[int, int, str]] = {}   # id -> (rang, distance, type)
+
+        def offer(n: int, kind: str, distance: int = 0):
+            _, id_, column = keys[n]
+            if columns is not None and column not in columns:
+                return
+            rank = (RANKS[kind], distance)
+            if id_ not in best or rank < best[id_][:2]:
+                best[id_] = (*rank, kind)
+
+        # préfixes : dichotomie dans les clés et suffixes de mots triés
+        i = bisect_left(sorted_keys, (query,))
+        while i < len(sorted_keys) and sorted_keys[i][0].startswith(query):
+            _, n, whole = sorted_keys[i]
+            offer(n, EXACT if whole and keys[n][0] == query else PREFIX if whole else WORD_PREFIX)
+            i += 1
+
+        # sous-chaînes : clés contenant tous les bigrammes internes de la requête
+        inner = {query[i:i + 2] for i in range(len(query) - 1)}
+        if inner:
+            candidates = set.intersection(*(grams.get(gram, set()) for gram in inner))
+        else:
+            candidates = range(len(keys))
+        for n in candidates:
+            if query in keys[n][0]:
+                offer(n, SUBSTRING)
+
+        # fautes de frappe : clés partageant assez de bigrammes, comparées en entier et sur leur début
+        if fuzzy and len(query) >= 3 and (limit is None or len(best) < limit):
+            typos = _max_typos(query)
+            query_grams = _bigrams(query)
+            counts: Dict[int, int] = {}
+            for gram in query_grams:
+                for n in grams.get(gram, ()):
+                    counts[n] = counts.get(n, 0) + 1
+            # chaque modification détruit au plus deux bigrammes
+            needed = max(1, len(query_grams) - 2 * typos)
+            for n, shared in counts.items():
+                if shared < needed:
+                    continue
+                key, id_, _ = keys[n]
+                if id_ in best and best[id_][0] < RANKS[FUZZY]:
+                    continue
+                distance = min(_distance(query, key, typos), _distance(query, key[:len(query)], typos))
+                if distance <= typos:
+                    offer(n, FUZZY, distance)
+
+        ranked = sorted(best.items(), key=lambda item: (item[1][0], item[1][1], labels[item[0]][0]))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [Match(id_, labels[id_][0], kind, labels[id_][1]) for id_, (_, _, kind) in ranked]
+
+    def ids(self, db: Session, term: str, columns: Optional[Sequence[str]] = None, fuzzy: bool = False) -> List[int]:
+        """Identifiants correspondant à `term` (sans limite), du plus au moins pertinent"""
+        return [match.id for match in self.search(db, term, limit=None, fuzzy=fuzzy, columns=columns)]
+
+
+def _load_pays(db: Session):
+    return [(id_, nom or "", {"nomPays": nom, "isoPays": iso}, {"isoPays": iso})
+            for id_, nom, iso in db.query(Pays.idPays, Pays.nomPays, Pays.isoPays)]
+
+def _load_regions(db: Session):
+    return [(id_, nom or "", {"nomEtat": nom, "codeEtat": code}, {"codeEtat": code, "idPays": idPays})
+            for id_, nom, code, idPays in db.query(Regions.idRegion, Regions.nomEtat, Regions.codeEtat, Regions.idPays)]
+
+
+# Instances partagées ; mêmes noms que les espaces de noms de reference_cache
+pays_index = NameIndex("pays", _load_pays)
+regions_index = NameIndex("regions", _load_regions)
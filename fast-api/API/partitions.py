@@ -0,0 +1,250 @@
+
+# Partitionnement optionnel de Releve par plage de dates (MySQL, RANGE COLUMNS(dateReleve))
+#
+#   cd fast-api && python -m API.partitions enable --granularity month --ahead 3
+#   cd fast-api && python -m API.partitions maintain --ahead 3 --retention-months 36 [--archive]
+#   cd fast-api && python -m API.partitions status
+#
+# Partitions nommées d'après le début de leur période (p202401 par mois,
+# p2024q1 par trimestre) plus une partition pmax (MAXVALUE) de secours.
+# `maintain` est à lancer périodiquement (cron) : il crée les partitions des
+# prochaines périodes et purge celles qui sortent de la rétention par
+# DROP PARTITION, une opération sur les métadonnées quelle que soit la
+# volumétrie, puis retire leurs dates du catalogue (ReleveDateCatalog).
+#
+# Contraintes MySQL : une table partitionnée n'a pas de clé étrangère et
+# chaque clé unique contient dateReleve. `enable` supprime donc les clés
+# étrangères de Releve (les relations ORM restent déclarées dans models.py)
+# et passe la clé primaire à (idReleve, dateReleve).
+
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import List, Optional
+import argparse
+import os
+import re
+import sys
+from sqlalchemy import inspect, text
+
+TABLE = "Releve"
+MAX_PARTITION = "pmax"
+GRANULARITIES = ("month", "quarter")
+
+
+@dataclass
+class Partition:
+    name: str
+    lower: Optional[date]   # incluse ; None = première partition, sans borne basse
+    upper: Optional[date]   # exclue ; None = MAXVALUE
+    rows: int               # estimation (information_schema)
+
+
+def _dialect_name(bind) -> str:
+    dialect = getattr(bind, "dialect", None) or bind.get_bind().dialect
+    return dialect.name
+
+
+# --- Périodes ---
+
+def period_start(day: date, granularity: str) -> date:
+    if granularity == "quarter":
+        return date(day.year, (day.month - 1) // 3 * 3 + 1, 1)
+    return date(day.year, day.month, 1)
+
+def next_period(start: date, granularity: str) -> date:
+    months = 3 if granularity == "quarter" else 1
+    month = start.month - 1 + months
+    return date(start.year + month // 12, month % 12 + 1, 1)
+
+def partition_name(start: date, granularity: str) -> str:
+    if granularity == "quarter":
+        return f"p{start.year}q{(start.month - 1) // 3 + 1}"
+    return f"p{start.year}{start.month:02d}"
+
+def _granularity_of(partitions: List[Partition]) -> str:
+    names = [p.name for p in partitions if p.name != MAX_PARTITION]
+    return "quarter" if names and re.fullmatch(r"p\d{4}q\d", names[-1]) else "month"
+
+def _definition(start: date, granularity: str) -> str:
+    upper = next_period(start, granularity)
+    return f"PARTITION {partition_name(start, granularity)} VALUES LESS THAN ('{upper.isoformat()}')"
+
+
+# --- Lecture de l'état ---
+
+def list_partitions(bind) -> List[Partition]:
+    """Partitions de Releve dans l'ordre ; liste vide si la table n'est pas partitionnée"""
+    if _dialect_name(bind) != "mysql":
+        return []
+    rows = bind.execute(text(
+        "SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION"
+    ), {"table": TABLE}).all()
+    partitions, lower = [], None
+    for name, description, table_rows in rows:
+        upper = None if description == "MAXVALUE" else date.fromisoformat(description.strip("'"))
+        partitions.append(Partition(name, lower, upper, table_rows or 0))
+        lower = upper
+    return partitions
+
+def covered_partitions(bind, start_date, end_date) -> List[Partition]:
+    """Partitions entièrement comprises dans [start_date, end_date] (bornes incluses)"""
+    start, end = date.fromisoformat(str(start_date)), date.fromisoformat(str(end_date))
+    return [
+        p for p in list_partitions(bind)
+        if p.lower is not None and p.upper is not None
+        and p.lower >= start and p.upper - timedelta(days=1) <= end
+    ]
+
+
+# --- Opérations ---
+
+def truncate_partitions(bind, partitions: List[Partition]) -> int:
+    """Vide les partitions (métadonnées, sans parcourir les lignes) ; retourne le nombre de lignes supprimées"""
+    if not partitions:
+        return 0
+    names = ", ".join(p.name for p in partitions)
+    count = bind.execute(text(f"SELECT COUNT(*) FROM {TABLE} PARTITION ({names})")).scalar()
+    bind.execute(text(f"ALTER TABLE {TABLE} TRUNCATE PARTITION {names}"))
+    return count
+
+def enable(conn, granularity: str = "month", ahead: int = 3, today: Optional[date] = None) -> List[str]:
+    """Partitionne Releve de la première date de relevé jusqu'à `ahead` périodes après aujourd'hui"""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Granularité inconnue : {granularity} ({', '.join(GRANULARITIES)})")
+    if list_partitions(conn):
+        raise RuntimeError(f"{TABLE} est déjà partitionnée")
+    today = today or date.today()
+    first = conn.execute(text(f"SELECT MIN(dateReleve) FROM {TABLE}")).scalar() or today
+
+    for fk in inspect(conn).get_foreign_keys(TABLE):
+        conn.execute(text(f"ALTER TABLE {TABLE} DROP FOREIGN KEY {fk['name']}"))
+    conn.execute(text(f"ALTER TABLE {TABLE} DROP PRIMARY KEY, ADD PRIMARY KEY (idReleve, dateReleve)"))
+
+    definitions, start = [], period_start(first, granularity)
+    last = _horizon(today, granularity, ahead)
+    while start < last:
+        definitions.append(_definition(start, granularity))
+        start = next_period(start, granularity)
+    definitions.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN MAXVALUE")
+    conn.execute(text(f"ALTER TABLE {TABLE} PARTITION BY RANGE COLUMNS(dateReleve) ({', '.join(definitions)})"))
+    return [d.split()[1] for d in definitions]
+
+def _horizon(today: date, granularity: str, ahead: int) -> date:
+    """Borne haute de la dernière partition à créer : fin de la période courante + `ahead` périodes"""
+    upper = next_period(period_start(today, granularity), granularity)
+    for _ in range(ahead):
+        upper = next_period(upper, granularity)
+    return upper
+
+def extend(conn, ahead: int = 3, today: Optional[date] = None) -> List[str]:
+    """Crée les partitions manquantes jusqu'à `ahead` périodes après la période courante"""
+    partitions = list_partitions(conn)
+    bounded = [p for p in partitions if p.upper is not None]
+    if not bounded:
+        return []
+    granularity = _granularity_of(partitions)
+    last = _horizon(today or date.today(), granularity, ahead)
+    definitions, start = [], bounded[-1].upper
+    while start < last:
+        definitions.append(_definition(start, granularity))
+        start = next_period(start, granularity)
+    if not definitions:
+        return []
+    definitions.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN MAXVALUE")
+    # pmax est vide en temps normal : la réorganisation ne déplace aucune ligne
+    conn.execute(text(f"ALTER TABLE {TABLE} REORGANIZE PARTITION {MAX_PARTITION} INTO ({', '.join(definitions)})"))
+    return [d.split()[1] for d in definitions[:-1]]
+
+def purge(conn, retention_months: int, archive: bool = False, today: Optional[date] = None) -> List[Partition]:
+    """Supprime les partitions antérieures à la rétention (DROP PARTITION).
+
+    `archive=True` : chaque partition est d'abord échangée avec une table
+    Releve_archive_<partition> (EXCHANGE PARTITION, sans copie de lignes).
+    La partition la plus ancienne restante reçoit alors les éventuelles
+    insertions de dates antérieures.
+    """
+    today = today or date.today()
+    month = today.year * 12 + today.month - 1 - retention_months
+    cutoff = date(month // 12, month % 12 + 1, 1)
+    bounded = [p for p in list_partitions(conn) if p.upper is not None]
+    # la dernière partition bornée n'est jamais supprimée
+    expired = [p for p in bounded[:-1] if p.upper <= cutoff]
+    for p in expired:
+        if archive:
+            archive_table = f"{TABLE}_archive_{p.name}"
+            # table neuve : EXCHANGE ramènerait dans Releve les lignes d'une table existante
+            conn.execute(text(f"CREATE TABLE {archive_table} LIKE {TABLE}"))
+            conn.execute(text(f"ALTER TABLE {archive_table} REMOVE PARTITIONING"))
+            conn.execute(text(f"ALTER TABLE {TABLE} EXCHANGE PARTITION {p.name} WITH TABLE {archive_table}"))
+    if expired:
+        conn.execute(text(f"ALTER TABLE {TABLE} DROP PARTITION {', '.join(p.name for p in expired)}"))
+    return expired
+
+
+def forget_purged(conn, purged: List[Partition]) -> bool:
+    """Retire du catalogue des dates celles des partitions purgées et valide ;
+    retourne True si le catalogue a changé. DROP PARTITION ne passe pas par
+    crud : sans cela, /releves/available-dates/ listerait encore ces dates."""
+    from sqlalchemy.orm import Session
+    from . import date_catalog
+
+    changed = False
+    with Session(bind=conn) as db:
+        for p in purged:
+            changed |= date_catalog.remove_range(db, p.lower or date.min, p.upper - timedelta(days=1))
+        db.commit()
+    conn.commit()
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m API.partitions",
+                                     description="Partitionnement de Releve par plage de dates (MySQL)")
+    parser.add_argument("command", choices=["status", "enable", "maintain"])
+    parser.add_argument("--granularity", choices=GRANULARITIES, default="month")
+    parser.add_argument("--ahead", type=int, default=int(os.getenv("RELEVE_PARTITIONS_AHEAD", "3")),
+                        help="périodes futures à créer à l'avance")
+    parser.add_argument("--retention-months", type=int,
+                        default=int(os.getenv("RELEVE_RETENTION_MONTHS", "0")) or None,
+                        help="maintain : purge des partitions plus anciennes (défaut : aucune purge)")
+    parser.add_argument("--archive", action="store_true",
+                        help="maintain : conserver les partitions purgées dans des tables d'archive")
+    args = parser.parse_args()
+
+    from .database import engine
+    if engine.dialect.name != "mysql":
+        print(f"Partitionnement disponible uniquement sous MySQL (dialecte : {engine.dialect.name})")
+        return 1
+
+    with engine.connect() as conn:
+        if args.command == "enable":
+            created = enable(conn, args.granularity, args.ahead)
+            print(f"{TABLE} partitionnée : {len(created)} partitions ({created[0]} … {created[-1]})")
+        elif args.command == "maintain":
+            created = extend(conn, args.ahead)
+            purged = purge(conn, args.retention_months, args.archive) if args.retention_months else []
+            print(f"Partitions créées : {', '.join(created) or 'aucune'} ; "
+                  f"purgées : {', '.join(p.name for p in purged) or 'aucune'}")
+            if purged:
+                from .cache_backend import shared_cache
+                from .crud import RELEVE_CACHE_NAMESPACES
+                from .http_cache import reference_cache
+                from . import date_catalog
+                dates_changed = forget_purged(conn, purged)
+                shared_cache.invalidate(*RELEVE_CACHE_NAMESPACES)
+                if dates_changed:
+                    reference_cache.invalidate(date_catalog.CACHE_NAME)
+        partitions = list_partitions(conn)
+        if not partitions:
+            print(f"{TABLE} n'est pas partitionnée")
+        for p in partitions:
+            bounds = f"[{p.lower or '…'} ; {p.upper or 'MAXVALUE'})"
+            print(f"{p.name:10} {bounds:28} ~{p.rows} lignes")
+        conn.commit()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+
+# Profilage à la demande d'un worker en production (POST /technical/admin/profile)
+#
+# Échantillonneur statistique en Python pur : un thread relève la pile de tous
+# les autres threads (sys._current_frames) toutes les `interval` secondes et
+# compte les piles identiques. Le résultat est au format « collapsed stacks »
+# (une ligne « racine;...;feuille N » par pile), lu directement par
+# flamegraph.pl, speedscope ou inferno.
+#
+# Deux modes :
+#   - `seconds` : tout ce que fait le worker pendant N secondes ;
+#   - `route` + `requests` : seulement pendant que des requêtes de cette route
+#     sont en cours, jusqu'à la fin de N requêtes (les autres requêtes servies
+#     au même moment par ce worker apparaissent aussi dans les piles).
+# Les threads en attente (pool de threads inoccupé, boucle asyncio dans
+# select) sont ignorés. Avec `allocations`, tracemalloc est actif pendant la
+# session et les lignes ayant le plus alloué sont retournées.
+#
+# Hors session : aucun thread, et le middleware ne fait qu'un test d'attribut.
+
+from collections import Counter
+from typing import Dict, List, Optional
+import hmac
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from fastapi import Header, HTTPException
+
+ADMIN_TOKEN = os.getenv("PROFILING_TOKEN", "")
+
+# feuilles de pile d'un thread qui attend : (fin du nom de fichier, fonction)
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+}
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Dépendance FastAPI : en-tête X-Admin-Token égal à PROFILING_TOKEN (endpoint absent si non défini)"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Jeton d'administration invalide")
+
+
+def _short_path(filename: str) -> str:
+    for marker in ("site-packages/", "dist-packages/", "/API/"):
+        i = filename.rfind(marker)
+        if i >= 0:
+            return ("API/" if marker == "/API/" else "") + filename[i + len(marker):]
+    return os.path.basename(filename)
+
+
+class ProfileSession:
+    def __init__(self, interval: float, route_regex=None, method: Optional[str] = None,
+                 requests: int = 0, allocations: bool = False):
+        self.interval = interval
+        self.route_regex = route_regex
+        self.method = method
+        self.requests = requests
+        self.allocations = allocations
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.active = 0          # requêtes de la route en cours
+        self.finished = 0
+        self.done = threading.Event()
+        self.started_at = time.monotonic()
+        self.sampled_seconds = 0.0
+        self._labels: Dict[object, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._tracemalloc_started = False
+        self._snapshot_before = None
+
+    # ---------- requêtes ciblées (appelé par le middleware) ----------
+    def matches(self, scope) -> bool:
+        if self.route_regex is None:
+            return False
+        return scope["method"] == self.method and self.route_regex.match(scope["path"]) is not None
+
+    def request_started(self):
+        self.active += 1
+
+    def request_finished(self):
+        self.active -= 1
+        self.finished += 1
+        if self.requests and self.finished >= self.requests:
+            self.done.set()
+
+    # ---------- échantillonnage ----------
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{_short_path(code.co_filename)}:{code.co_name}"
+        return label
+
+    def _sample(self, own_ident: int):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            code = frame.f_code
+            if (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            if self.route_regex is None or self.active > 0:
+                self._sample(own_ident)
+                self.sampled_seconds += self.interval
+
+    def start(self):
+        if self.allocations:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(10)
+                self._tracemalloc_started = True
+            self._snapshot_before = tracemalloc.take_snapshot()
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Dict:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        result = {
+            "duration": round(time.monotonic() - self.started_at, 3),
+            "sampled_seconds": round(self.sampled_seconds, 3),
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "requests_profiled": self.finished,
+            "collapsed": self.collapsed(),
+            "top_stacks": [{"stack": stack, "samples": count} for stack, count in self.stacks.most_common(10)],
+        }
+        if self.allocations:
+            result["top_allocations"] = self._allocations()
+        return result
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def _allocations(self, limit: int = 25) -> List[Dict]:
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+        if self._tracemalloc_started:
+            tracemalloc.stop()
+        stats = snapshot.compare_to(self._snapshot_before, "lineno")
+        top = sorted((s for s in stats if s.size_diff > 0), key=lambda s: s.size_diff, reverse=True)[:limit]
+        return [{
+            "location": f"{_short_path(s.traceback[0].filename)}:{s.traceback[0].lineno}",
+            "size_kb": round(s.size_diff / 1024, 1),
+            "count": s.count_diff,
+        } for s in top]
+
+
+class Profiler:
+    """Une session à la fois par worker"""
+
+    def __init__(self):
+        self.session: Optional[ProfileSession] = None
+        self._lock = threading.Lock()
+
+    def begin(self, session: ProfileSession) -> bool:
+        with self._lock:
+            if self.session is not None:
+                return False
+            self.session = session
+        session.start()
+        return True
+
+    def end(self) -> Dict:
+        session = self.session
+        try:
+            return session.stop()
+        finally:
+            self.session = None
+
+
+class ProfilingMiddleware:
+    """Compte les requêtes de la route ciblée par la session en cours"""
+
+    def __init__(self, app, profiler: "Profiler"):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        session = self.profiler.session
+        if session is None or scope["type"] != "http" or not session.matches(scope):
+            await self.app(scope, receive, send)
+            return
+        session.request_started()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            session.request_finished()
+
+
+# Instance partagée par le middleware et l'endpoint d'administration
+profiler = Profiler()
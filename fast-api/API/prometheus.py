@@ -0,0 +1,370 @@
+
+# Métriques au format d'exposition Prometheus (texte 0.0.4), servies par GET /metrics
+#
+# Collecteurs en mémoire du processus, sans dépendance : un compteur ou un
+# histogramme par combinaison d'étiquettes, mis à jour sous un verrou court
+# (quelques centaines de ns par observation). Les valeurs lues ailleurs
+# (pool de connexions, statistiques du cache) sont calculées au moment de la
+# lecture par des fonctions de collecte (`collect=`), sans rien coûter entre
+# deux lectures.
+#
+# Chaque worker uvicorn expose ses propres valeurs : Prometheus agrège les
+# séries de toutes les cibles (sum by ...).
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+import math
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# bornes par défaut (secondes), du cache mémoire aux requêtes lentes
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 collect: Callable[[], Dict[Tuple[str, ...], float]] = None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        self._collect = collect
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _values(self) -> Dict[Tuple[str, ...], float]:
+        """Valeurs calculées à la lecture par `collect`, sinon celles des enfants"""
+        if self._collect is not None:
+            return self._collect()
+        return {key: child.value for key, child in list(self._children.items())}
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def _samples(self):
+        for key, value in self._values().items():
+            yield f"{self.name}_total{_labels(self.labelnames, key)} {_number(value)}"
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def _samples(self):
+        for key, value in self._values().items():
+            yield f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)   # dernier : au-delà de la plus grande borne
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def timed(self, labels: Callable[..., Sequence[str]]):
+        """Décorateur : durée de chaque appel réussi, étiquettes calculées depuis les arguments"""
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                result = function(*args, **kwargs)
+                self.labels(*labels(*args, **kwargs)).observe(time.perf_counter() - start)
+                return result
+            return wrapper
+        return decorator
+
+    def snapshot(self) -> Dict[Tuple[str, ...], Tuple[List[int], float]]:
+        """Compteurs par combinaison d'étiquettes, pour `delta`"""
+        state = {}
+        for key, child in list(self._children.items()):
+            with child._lock:
+                state[key] = (list(child.counts), child.sum)
+        return state
+
+    def delta(self, before: Dict[Tuple[str, ...], Tuple[List[int], float]]) -> List[Tuple]:
+        """Observations faites depuis `snapshot()`, sérialisables, à reporter ailleurs par `merge`"""
+        changes = []
+        for key, (counts, total) in self.snapshot().items():
+            old_counts, old_total = before.get(key, ([0] * len(counts), 0.0))
+            diff = [new - old for new, old in zip(counts, old_counts)]
+            if any(diff):
+                changes.append((key, diff, total - old_total))
+        return changes
+
+    def merge(self, changes: Iterable[Tuple]):
+        """Ajoute les observations d'un autre processus (ex. processus d'inférence)"""
+        for key, counts, total in changes:
+            child = self.labels(*key)
+            with child._lock:
+                for i, count in enumerate(counts):
+                    child.counts[i] += count
+                child.sum += total
+
+    def _samples(self):
+        for key, child in list(self._children.items()):
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # une source indisponible (ex: cache Redis) ne doit pas vider toute l'exposition
+                lines.append(f"# {metric.name} indisponible: {_escape(e)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# ---------- requêtes HTTP (alimenté par request_metrics.RequestMetricsMiddleware) ----------
+HTTP_REQUEST_DURATION = registry.register(Histogram(
+    "http_request_duration_seconds", "Durée des requêtes HTTP par route", ("method", "route", "status")))
+
+# ---------- base de données ----------
+DB_QUERIES = registry.register(Counter(
+    "db_queries", "Requêtes SQL exécutées", ("operation",)))
+DB_QUERY_DURATION = registry.register(Histogram(
+    "db_query_duration_seconds", "Durée des requêtes SQL", ("operation",)))
+
+
+def _pool_values():
+    from .database import engine
+
+    pool = engine.pool
+    values = {}
+    for state in ("size", "checkedin", "checkedout", "overflow"):
+        method = getattr(pool, state, None)
+        if callable(method):
+            values[(state,)] = method()
+    return values
+
+registry.register(Gauge("db_pool_connections", "État du pool de connexions SQLAlchemy", ("state",),
+                        collect=_pool_values))
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("prometheus_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("prometheus_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    operation = statement.lstrip()[:6].upper()
+    if operation not in ("SELECT", "INSERT", "UPDATE", "DELETE"):
+        operation = "OTHER"
+    DB_QUERIES.labels(operation).inc()
+    DB_QUERY_DURATION.labels(operation).observe(elapsed)
+
+# ---------- modèles ----------
+MODEL_LOAD_DURATION = registry.register(Histogram(
+    "model_load_duration_seconds", "Durée de chargement des modèles (hors cache)", ("country", "model_type"),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)))
+PREDICTION_BATCH_SIZE = registry.register(Histogram(
+    "prediction_batch_size", "Nombre de lignes par appel d'inférence", ("country", "model_type"),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)))
+INFERENCE_DURATION = registry.register(Histogram(
+    "inference_duration_seconds", "Durée d'inférence par appel", ("country", "model_type")))
+
+
+@lru_cache()
+def _known_models() -> Tuple[frozenset, frozenset]:
+    from .services.model_registry import list_models
+
+    entries = list_models()
+    return frozenset(e["country"] for e in entries), frozenset(e["name"] for e in entries)
+
+def model_labels(country: str, model_type: str) -> Tuple[str, str]:
+    """Étiquettes (pays, modèle) limitées aux modèles présents dans API/models, "unknown" sinon :
+    les valeurs viennent du client, chacune créerait sinon des séries permanentes"""
+    countries, names = _known_models()
+    country = country.lower()
+    return (country if country in countries else "unknown",
+            model_type if model_type in names else "unknown")
+
+@contextmanager
+def observe_inference(country: str, model_type: str, batch_size: int):
+    """Taille du lot et durée d'un appel d'inférence réussi"""
+    start = time.perf_counter()
+    yield
+    labels = model_labels(country, model_type)
+    PREDICTION_BATCH_SIZE.labels(*labels).observe(batch_size)
+    INFERENCE_DURATION.labels(*labels).observe(time.perf_counter() - start)
+
+def _inference_values(field: str):
+    def collect():
+        from .inference import executor
+
+        values = executor.stats().get(field)
+        if isinstance(values, list):
+            return {(str(worker),): value for worker, value in enumerate(values)}
+        return {(): values} if values is not None else {}
+    return collect
+
+registry.register(Gauge("inference_pending", "Tâches d'inférence en cours ou en attente par processus",
+                        ("worker",), collect=_inference_values("pending")))
+registry.register(Counter("inference_rejected", "Inférences refusées (exécuteur saturé, HTTP 429)",
+                          collect=_inference_values("rejected")))
+registry.register(Counter("inference_timeouts", "Inférences sans résultat dans le délai (HTTP 504)",
+                          collect=_inference_values("timeouts")))
+
+# ---------- cache partagé ----------
+def _cache_values(field: str):
+    def collect():
+        from .cache_backend import shared_cache
+
+        values = {}
+        for namespace, stats in shared_cache.stats()["namespaces"].items():
+            value = stats.get(field)
+            if value is not None:
+                values[(namespace,)] = value
+        return values
+    return collect
+
+registry.register(Gauge("cache_hit_ratio", "Part des lectures du cache partagé servies depuis le cache",
+                        ("namespace",), collect=_cache_values("hit_ratio")))
+registry.register(Counter("cache_hits", "Lectures du cache partagé trouvées", ("namespace",),
+                          collect=_cache_values("hits")))
+registry.register(Counter("cache_misses", "Lectures du cache partagé absentes", ("namespace",),
+                          collect=_cache_values("misses")))
+
+# ---------- mémoire du processus ----------
+_SMAPS_FIELDS = {
+    "Rss": "rss", "Pss": "pss",
+    "Shared_Clean": "shared_clean", "Shared_Dirty": "shared_dirty",
+    "Private_Clean": "private_clean", "Private_Dirty": "private_dirty",
+}
+
+
+def process_memory(pid="self") -> Dict[str, int]:
+    """Mémoire d'un processus en octets (Linux, /proc/<pid>/smaps_rollup) : RSS, PSS (pages
+    partagées divisées entre les processus qui les lisent), partagée et privée ; {} ailleurs"""
+    values: Dict[str, int] = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in _SMAPS_FIELDS:
+                    values[_SMAPS_FIELDS[name]] = int(rest.split()[0]) * 1024
+    except (OSError, ValueError):
+        return {}
+    if values:
+        values["shared"] = values.get("shared_clean", 0) + values.get("shared_dirty", 0)
+        values["private"] = values.get("private_clean", 0) + values.get("private_dirty", 0)
+    return values
+
+def _memory_values():
+    memory = process_memory()
+    return {(kind,): memory[kind] for kind in ("rss", "pss", "shared", "private") if kind in memory}
+
+registry.register(Gauge("process_memory_bytes", "Mémoire du worker (RSS, PSS, partagée, privée)", ("kind",),
+                        collect=_memory_values))
@@ -0,0 +1,210 @@
+
+# Temps de réponse de chaque requête HTTP, écrits par lots dans performance_metrics
+#
+# Le middleware ne fait qu'ajouter une ligne à un tampon en mémoire ; une
+# tâche de fond (thread) l'écrit toutes les `flush_interval` secondes, ou dès
+# que `batch_size` lignes attendent, en un INSERT multi-lignes. Si la base ne
+# suit pas, le tampon est borné (`max_buffer`) : les lignes les plus anciennes
+# sont abandonnées et comptées dans `stats()["dropped"]`.
+
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import logging
+import os
+import threading
+import time
+from sqlalchemy import case, func, insert
+from sqlalchemy.orm import Session
+
+from . import database, prometheus
+from .models import PerformanceMetric
+
+logger = logging.getLogger(__name__)
+
+UNMATCHED = "(aucune route)"   # 404 : une seule ligne quel que soit le chemin demandé
+# méthode inventée par le client : une seule étiquette
+METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+# mesures par route chargées pour les percentiles de summary()
+SUMMARY_SAMPLE = int(os.getenv("METRICS_SUMMARY_SAMPLE", "5000"))
+
+
+class MetricsRecorder:
+    def __init__(self, service_name: str = "api", flush_interval: float = 5.0, batch_size: int = 500,
+                 max_buffer: int = 10000):
+        self.service_name = service_name
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._buffer: deque = deque(maxlen=max_buffer)
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._flush_lock = threading.Lock()
+        self.recorded = self.written = self.dropped = self.failed = 0
+
+    def record(self, endpoint: str, response_time: float, status_code: int, payload_size: int):
+        """Appelé par le middleware : aucun accès à la base"""
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append({
+            "service_name": self.service_name,
+            "endpoint": endpoint[:100],
+            "response_time": round(response_time, 3),
+            "status_code": status_code,
+            "payload_size": payload_size,
+            "timestamp": datetime.now(),
+        })
+        self.recorded += 1
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """Écrit le tampon par lots de `batch_size` ; retourne le nombre de lignes écrites"""
+        written = 0
+        with self._flush_lock:
+            while self._buffer:
+                rows = []
+                while self._buffer and len(rows) < self.batch_size:
+                    rows.append(self._buffer.popleft())
+                db = database.SessionLocal()
+                try:
+                    db.execute(insert(PerformanceMetric), rows)
+                    db.commit()
+                    written += len(rows)
+                except Exception as e:
+                    # lot abandonné : réessayer remplirait le tampon sans fin si la base est indisponible
+                    db.rollback()
+                    self.failed += len(rows)
+                    logger.warning(f"Écriture de {len(rows)} métriques de requêtes impossible: {e}")
+                    break
+                finally:
+                    db.close()
+        self.written += written
+        return written
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="request-metrics-flush", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Arrête la tâche de fond et écrit ce qui reste"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+        self.flush()
+
+    def stats(self) -> Dict:
+        return {
+            "service_name": self.service_name,
+            "buffered": len(self._buffer),
+            "recorded": self.recorded,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+
+class RequestMetricsMiddleware:
+    """Middleware ASGI : route (modèle de chemin, ex. "GET /pays/{item_id}"), durée
+    jusqu'au dernier octet envoyé, statut et taille du corps envoyé (après compression
+    s'il est placé à l'extérieur de CompressionMiddleware)."""
+
+    def __init__(self, app, recorder: MetricsRecorder):
+        self.app = app
+        self.recorder = recorder
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code, payload_size = 500, 0
+
+        async def wrapped_send(message):
+            nonlocal status_code, payload_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                payload_size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, wrapped_send)
+        finally:
+            # le routeur renseigne scope["route"] une fois la route trouvée
+            route = scope.get("route")
+            path = getattr(route, "path", None) or UNMATCHED
+            elapsed = time.perf_counter() - start
+            self.recorder.record(f"{scope['method']} {path}", elapsed * 1000, status_code, payload_size)
+            method = scope["method"] if scope["method"] in METHODS else "OTHER"
+            prometheus.HTTP_REQUEST_DURATION.labels(method, path, status_code).observe(elapsed)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    """Percentile par interpolation linéaire ; `values` trié"""
+    position = (len(values) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def summary(db: Session, minutes: int = 60, service_name: Optional[str] = None,
+            sample: Optional[int] = None) -> List[Dict]:
+    """p50 / p95 / p99 (ms) par route sur les `minutes` dernières minutes, routes les plus lentes d'abord.
+
+    Nombre, erreurs, taille moyenne et maximum sont agrégés en SQL sur toute la
+    fenêtre ; les percentiles portent sur les `sample` mesures les plus récentes
+    de chaque route (METRICS_SUMMARY_SAMPLE), pour ne pas charger toute la table.
+    """
+    sample = sample or SUMMARY_SAMPLE
+    window = (PerformanceMetric.service_name == (service_name or recorder.service_name),
+              PerformanceMetric.timestamp >= datetime.now() - timedelta(minutes=minutes))
+    totals = db.query(PerformanceMetric.endpoint, func.count(),
+                      func.sum(case((PerformanceMetric.status_code >= 500, 1), else_=0)),
+                      func.sum(PerformanceMetric.payload_size), func.max(PerformanceMetric.response_time)) \
+        .filter(*window).group_by(PerformanceMetric.endpoint).all()
+
+    rank = func.row_number().over(partition_by=PerformanceMetric.endpoint,
+                                  order_by=PerformanceMetric.timestamp.desc()).label("rank")
+    recent = db.query(PerformanceMetric.endpoint, PerformanceMetric.response_time, rank) \
+        .filter(*window).subquery()
+    times: Dict[str, List[float]] = {}
+    for endpoint, response_time in db.query(recent.c.endpoint, recent.c.response_time) \
+            .filter(recent.c.rank <= sample):
+        times.setdefault(endpoint, []).append(float(response_time))
+
+    result = []
+    for endpoint, count, errors, payload, slowest in totals:
+        values = sorted(times.get(endpoint, [])) or [float(slowest)]
+        result.append({
+            "endpoint": endpoint,
+            "count": count,
+            "sample": len(values),
+            "p50": round(_percentile(values, 0.50), 3),
+            "p95": round(_percentile(values, 0.95), 3),
+            "p99": round(_percentile(values, 0.99), 3),
+            "max": float(slowest),
+            "errors": int(errors or 0),
+            "avg_payload_size": round((payload or 0) / count),
+        })
+    return sorted(result, key=lambda item: item["p95"], reverse=True)
+
+
+# Instance partagée par le middleware et /technical/metrics/summary
+recorder = MetricsRecorder(
+    service_name=os.getenv("METRICS_SERVICE_NAME", "api"),
+    flush_interval=float(os.getenv("METRICS_FLUSH_INTERVAL", "5")),  # secondes
+    batch_size=int(os.getenv("METRICS_BATCH_SIZE", "500")),
+    max_buffer=int(os.getenv("METRICS_MAX_BUFFER", "10000")),
+)
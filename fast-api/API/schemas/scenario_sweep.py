@@ -0,0 +1,46 @@
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Dict, Literal, Optional
+import os
+
+# valeurs par variable balayée, vérifié avant de construire la moindre liste
+MAX_AXIS_VALUES = int(os.getenv("SWEEP_MAX_AXIS_VALUES", "1000"))
+
+class ParameterRange(BaseModel):
+    """Valeurs d'une variable balayée : liste explicite, ou `steps` valeurs régulières de `start` à `stop`"""
+    values: Optional[List[float]] = Field(None, min_length=1, max_length=MAX_AXIS_VALUES,
+                                          description="Valeurs explicites")
+    start: Optional[float] = Field(None, description="Première valeur")
+    stop: Optional[float] = Field(None, description="Dernière valeur (incluse)")
+    steps: Optional[int] = Field(None, ge=1, le=MAX_AXIS_VALUES, description="Nombre de valeurs entre start et stop")
+
+    @model_validator(mode="after")
+    def check_form(self):
+        regular = (self.start, self.stop, self.steps)
+        if self.values is None and None in regular:
+            raise ValueError("Donner `values`, ou `start`, `stop` et `steps`")
+        if self.values is not None and any(v is not None for v in regular):
+            raise ValueError("`values` et `start`/`stop`/`steps` sont exclusifs")
+        return self
+
+class ScenarioSweepInput(BaseModel):
+    """Grille de scénarios : produit cartésien des `ranges`, les autres variables fixées par `fixed`"""
+    target: Literal["tauxMortalite", "nbHospitalisation"] = Field(..., description="Modèle à interroger")
+    pays: str = Field(..., description="Pays du modèle (ex: france)")
+    fixed: Dict[str, float] = Field(default_factory=dict, description="Variables constantes sur toute la grille")
+    ranges: Dict[str, ParameterRange] = Field(..., min_length=1, description="Variables balayées")
+    output: Literal["rows", "surface"] = Field(
+        default="rows",
+        description="rows : une ligne NDJSON par scénario ; surface : moyenne / min / max des prédictions "
+                    "par valeur de `surface_axes`, les autres variables balayées étant agrégées")
+    surface_axes: Optional[List[str]] = Field(None, min_length=1, max_length=2,
+                                              description="Une ou deux variables balayées (output=surface)")
+
+class SweepSurface(BaseModel):
+    """Prédictions agrégées sur une ou deux variables balayées"""
+    target: str
+    pays: str
+    points: int = Field(..., description="Nombre de scénarios évalués")
+    axes: Dict[str, List[float]] = Field(..., description="Valeurs des variables de la surface, dans l'ordre")
+    mean: List = Field(..., description="Moyenne (liste, ou liste de listes [axe 1][axe 2])")
+    min: List
+    max: List
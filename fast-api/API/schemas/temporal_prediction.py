@@ -1,6 +1,6 @@
 
 from pydantic import BaseModel, Field
-from typing import List, Dict, Optional
+from typing import List, Dict, Literal, Optional
 from datetime import date
 
 class HistoricalData(BaseModel):
@@ -18,6 +18,13 @@ class TemporalPredictionInput(BaseModel):
     model_type: str = Field(default="GRU", description="Type de modèle (GRU/LSTM)")
     historical_data: HistoricalData = Field(..., description="30 jours de données historiques")
     prediction_horizon: int = Field(default=7, description="Nombre de jours à prédire")
+    uncertainty: Optional[Literal["mc_dropout", "residual"]] = Field(
+        default=None,
+        description="Intervalle de confiance : mc_dropout (K passes avec dropout actif, en un seul lot) "
+                    "ou residual (écart-type des erreurs de validation par horizon, lu dans le "
+                    "*_evaluation_summary.json publié avec les poids) ; null si la méthode ne s'applique pas")
+    mc_samples: int = Field(default=50, ge=2, le=1000, description="Nombre de tirages K pour mc_dropout")
+    confidence_level: float = Field(default=0.9, gt=0, lt=1, description="Niveau de l'intervalle (ex: 0.9)")
 
 class TemporalPredictionOutput(BaseModel):
     """Résultat de la prédiction temporelle"""
@@ -25,5 +32,6 @@ class TemporalPredictionOutput(BaseModel):
     model_type: str
     predictions: List[int] = Field(..., description="Prédictions pour les 7 prochains jours")
     prediction_dates: List[str] = Field(..., description="Dates des prédictions")
-    confidence_interval: Optional[Dict[str, List[float]]] = Field(None, description="Intervalles de confiance")
+    confidence_interval: Optional[Dict[str, List[float]]] = Field(
+        None, description="Intervalles de confiance : lower / upper (et median pour mc_dropout), par jour prédit")
     metrics: Optional[Dict[str, float]] = Field(None, description="Métriques du modèle")
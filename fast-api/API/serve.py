@@ -0,0 +1,226 @@
+
+# Serveur préforké : les modèles sont chargés une fois dans le processus parent, puis partagés
+# en lecture seule par les workers
+#
+#   cd fast-api && python -m API.serve --workers 4 --port 8000
+#
+# Le parent importe l'application, charge tous les modèles (classiques .pkl et
+# temporels .pth), gèle le tas Python (gc.freeze) puis crée les workers par
+# fork() : les pages des modèles sont partagées en copie sur écriture tant
+# qu'aucun worker ne les modifie. gc.freeze évite que le ramasse-miettes des
+# workers ne réécrive les en-têtes des objets chargés (et ne duplique ainsi
+# leurs pages) ; les tenseurs torch sont placés en mémoire partagée.
+#
+# Avec `uvicorn --workers N`, chaque worker importe l'application et charge
+# ses propres copies des modèles : N fois la mémoire, et N chargements à froid.
+# Sous ce serveur, INFERENCE_BACKEND vaut inline par défaut (modèles préchargés
+# et partagés) ; socket délègue à un seul service partagé par tous les workers
+# (voir API/inference.py). process est refusé : chaque worker démarrerait ses
+# propres processus d'inférence, chacun avec ses copies des modèles.
+# De même, avec plusieurs workers, CACHE_BACKEND vaut sqlite par défaut et
+# memory est refusé : un cache par worker ne verrait pas les invalidations
+# faites par les autres.
+#
+# Le parent relance un worker qui s'arrête (après un délai qui double à chaque
+# arrêt rapide, arrêt du serveur après SERVE_MAX_FAST_FAILURES arrêts rapides de suite,
+# ex. base injoignable au démarrage), transmet SIGTERM/SIGINT aux
+# workers et journalise la mémoire de chacun (RSS, PSS, partagée, privée)
+# toutes les SERVE_MEMORY_REPORT secondes (0 = jamais). Linux/macOS uniquement.
+
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, List
+
+logger = logging.getLogger("API.serve")
+
+
+def preload_models() -> List[str]:
+    """Charge dans le processus courant tous les modèles trouvés dans API/models"""
+    from .services.model_registry import list_models, load_classical_model, load_temporal_bundle
+
+    loaded = []
+    for entry in list_models():
+        try:
+            if entry["kind"] == "classical":
+                load_classical_model(entry["name"], entry["country"])
+            else:
+                # chargeur V4 des prédictions (lru_cache : le même objet sert ensuite les requêtes)
+                load_temporal_bundle(entry["country"], entry["name"])["model"].share_memory()
+            loaded.append(f"{entry['country']}/{entry['name']}")
+        except Exception as e:
+            logger.warning(f"Préchargement de {entry['file']} impossible: {e}")
+    return loaded
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(sock: socket.socket, log_level: str):
+    import uvicorn
+    from . import database, main
+
+    # connexions ouvertes par le parent (création des tables, préchargement) : ne pas les partager
+    database.engine.dispose(close=False)
+    config = uvicorn.Config(main.API, log_level=log_level, timeout_keep_alive=65)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Arbiter:
+    FAST_FAILURE = 10.0   # secondes : un worker arrêté avant est en échec de démarrage
+    BACKOFF = 0.5         # premier délai de relance, doublé à chaque échec rapide
+    MAX_BACKOFF = 30.0
+
+    def __init__(self, sock: socket.socket, workers: int, log_level: str, memory_report: float,
+                 max_fast_failures: int = 5):
+        self.sock = sock
+        self.workers = workers
+        self.log_level = log_level
+        self.memory_report = memory_report
+        self.max_fast_failures = max_fast_failures
+        self.children: Dict[int, int] = {}   # pid -> numéro du worker
+        self.started: Dict[int, float] = {}  # numéro du worker -> démarrage
+        self.failures: Dict[int, int] = {}   # numéro du worker -> arrêts rapides consécutifs
+        self.respawn_at: Dict[int, float] = {}
+        self.stopping = False
+        self.exit_code = 0
+
+    def spawn(self, number: int):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                _run_worker(self.sock, self.log_level)
+            except BaseException:
+                logger.exception(f"Worker {number} arrêté sur une erreur")
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = number
+        self.started[number] = time.monotonic()
+        logger.info(f"Worker {number} démarré (pid {pid})")
+
+    def _schedule_respawn(self, number: int, pid: int, status: int):
+        """Relance immédiate après un arrêt tardif ; délai exponentiel, puis abandon, après des arrêts rapides"""
+        if time.monotonic() - self.started.get(number, 0) >= self.FAST_FAILURE:
+            self.failures[number] = 0
+            logger.warning(f"Worker {number} (pid {pid}) arrêté (statut {status}), relance")
+            self.respawn_at[number] = time.monotonic()
+            return
+        failures = self.failures[number] = self.failures.get(number, 0) + 1
+        if failures >= self.max_fast_failures:
+            # même cause pour tous les workers : arrêt du serveur, à relancer par le superviseur
+            logger.error(f"Worker {number} arrêté {failures} fois au démarrage (statut {status}) : arrêt du serveur")
+            self.exit_code = 1
+            self._stop(None, None)
+            return
+        delay = min(self.BACKOFF * 2 ** (failures - 1), self.MAX_BACKOFF)
+        logger.warning(f"Worker {number} (pid {pid}) arrêté au démarrage (statut {status}), "
+                       f"relance dans {delay:.1f} s ({failures}/{self.max_fast_failures})")
+        self.respawn_at[number] = time.monotonic() + delay
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def memory_table(self) -> str:
+        from .prometheus import process_memory
+
+        rows = [("parent", os.getpid(), process_memory())]
+        rows += [(f"worker {number}", pid, process_memory(pid)) for pid, number in sorted(self.children.items())]
+        lines = [f"{'':<10} {'pid':>7} {'RSS':>8} {'PSS':>8} {'partagée':>9} {'privée':>8}  (Mo)"]
+        for name, pid, memory in rows:
+            mb = [memory.get(kind, 0) / 2 ** 20 for kind in ("rss", "pss", "shared", "private")]
+            lines.append(f"{name:<10} {pid:>7} {mb[0]:>8.1f} {mb[1]:>8.1f} {mb[2]:>9.1f} {mb[3]:>8.1f}")
+        return "\n".join(lines)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for number in range(self.workers):
+            self.spawn(number)
+
+        next_report = time.monotonic() + self.memory_report
+        while self.children or (self.respawn_at and not self.stopping):
+            for number, due in list(self.respawn_at.items()):
+                if not self.stopping and time.monotonic() >= due:
+                    del self.respawn_at[number]
+                    self.spawn(number)
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG) if self.children else (0, 0)
+            except ChildProcessError:
+                pid = 0
+            if pid == 0:
+                time.sleep(0.5)
+                if self.memory_report and not self.stopping and time.monotonic() >= next_report:
+                    logger.info("Mémoire des processus :\n" + self.memory_table())
+                    next_report = time.monotonic() + self.memory_report
+                continue
+            number = self.children.pop(pid, None)
+            if number is not None and not self.stopping:
+                self._schedule_respawn(number, pid, status)
+        return self.exit_code
+
+
+def main_serve():
+    parser = argparse.ArgumentParser(description="Serveur préforké de l'API (modèles partagés entre workers)")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))))
+    parser.add_argument("--no-preload", action="store_true", help="ne pas charger les modèles avant le fork")
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info").lower())
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
+    if not hasattr(os, "fork"):
+        sys.exit("python -m API.serve nécessite fork() (Linux/macOS) ; utiliser uvicorn --workers")
+
+    backend = os.environ.setdefault("INFERENCE_BACKEND", "inline").lower()
+    if backend not in ("inline", "socket"):
+        sys.exit(f"python -m API.serve : INFERENCE_BACKEND={backend} non supporté (inline ou socket ; "
+                 f"process créerait des processus d'inférence dans chaque worker)")
+
+    cache = os.environ.setdefault("CACHE_BACKEND", "sqlite" if args.workers > 1 else "memory").lower()
+    if cache == "memory" and args.workers > 1:
+        sys.exit("python -m API.serve : CACHE_BACKEND=memory avec plusieurs workers, les invalidations "
+                 "ne seraient vues que par le worker qui écrit (sqlite ou redis)")
+
+    from . import inference, main  # noqa: F401  (importé une fois, avant le fork)
+
+    if not isinstance(inference.executor, inference.InlineExecutor):
+        # les prédictions sont faites par l'exécuteur d'inférence, qui charge ses propres modèles
+        logger.info(f"Inférence hors processus ({inference.executor.stats()['backend']}) : pas de préchargement")
+    elif not args.no_preload:
+        start = time.perf_counter()
+        loaded = preload_models()
+        logger.info(f"{len(loaded)} modèles préchargés en {time.perf_counter() - start:.1f} s")
+    # objets existants exclus des collectes : leurs pages restent partagées après le fork
+    gc.collect()
+    gc.freeze()
+
+    sock = _bind(args.host, args.port)
+    logger.info(f"Écoute sur {args.host}:{args.port}, {args.workers} workers")
+    arbiter = Arbiter(sock, args.workers, args.log_level, float(os.getenv("SERVE_MEMORY_REPORT", "300")),
+                      int(os.getenv("SERVE_MAX_FAST_FAILURES", "5")))
+    sys.exit(arbiter.run())
+
+
+if __name__ == "__main__":
+    main_serve()
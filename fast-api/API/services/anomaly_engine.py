@@ -0,0 +1,131 @@
+
+# Détection d'anomalies par région : z-score robuste (médiane / MAD) glissant
+
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+import warnings
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..models import Releve, Pays, Regions
+from ..name_search import pays_index
+
+# colonnes de Releve pouvant être surveillées
+METRICS = [
+    "nbNouveauCas", "nbDeces", "nbGueri", "nbHospitalisation", "nbHospiSoinsIntensif",
+    "nbVaccineTotalement", "nbSousRespirateur", "nbVaccine", "nbTeste",
+]
+
+# 0.6745 = quantile 75 % de la loi normale : MAD / 0.6745 estime l'écart-type
+MAD_SCALE = 0.6745
+# sqrt(pi / 2) : écart absolu moyen -> écart-type, utilisé quand la MAD est nulle
+MEAN_AD_SCALE = 1.2533
+
+
+def latest_date(db: Session, country: Optional[str] = None) -> Optional[date]:
+    """Dernière date de relevé (toutes régions ou pour un pays)"""
+    query = db.query(func.max(Releve.dateReleve))
+    if country:
+        query = query.join(Regions, Regions.idRegion == Releve.idRegion) \
+                     .filter(Regions.idPays.in_(pays_index.ids(db, country, columns=["nomPays"])))
+    return query.scalar()
+
+def load_region_series(db: Session, start: date, end: date, metric: str,
+                       country: Optional[str] = None, idMaladie: Optional[int] = None):
+    """Séries journalières par région, en une seule requête agrégée"""
+    value = func.sum(getattr(Releve, metric))
+    query = db.query(
+        Pays.nomPays, Regions.idRegion, Regions.nomEtat, Releve.dateReleve, value
+    ).join(Regions, Regions.idRegion == Releve.idRegion) \
+     .join(Pays, Pays.idPays == Regions.idPays) \
+     .filter(Releve.dateReleve >= start, Releve.dateReleve <= end)
+    if country:
+        query = query.filter(Regions.idPays.in_(pays_index.ids(db, country, columns=["nomPays"])))
+    if idMaladie is not None:
+        query = query.filter(Releve.idMaladie == idMaladie)
+    return query.group_by(Pays.nomPays, Regions.idRegion, Regions.nomEtat, Releve.dateReleve).all()
+
+def robust_zscores(values: np.ndarray, baseline_days: int, min_periods: int, min_scale: float = 1.0):
+    """z-scores robustes de chaque jour par rapport aux `baseline_days` jours précédents.
+
+    `values` est une matrice [régions, jours] (NaN = pas de relevé). Retourne
+    (z, médiane, échelle), de forme [régions, jours - baseline_days], calculés
+    pour toutes les régions à la fois. L'échelle vaut MAD / 0.6745, ou à défaut
+    1.2533 x l'écart absolu moyen, et ne descend jamais sous `min_scale`.
+    """
+    windows = sliding_window_view(values, baseline_days, axis=1)[:, :-1, :]
+    current = values[:, baseline_days:]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        median = np.nanmedian(windows, axis=2)
+        deviation = np.abs(windows - median[..., None])
+        scale = np.nanmedian(deviation, axis=2) / MAD_SCALE
+        mean_ad = np.nanmean(deviation, axis=2) * MEAN_AD_SCALE
+    scale = np.where(scale > 0, scale, mean_ad)
+    scale = np.fmax(scale, min_scale)
+    z = (current - median) / scale
+    enough = np.sum(~np.isnan(windows), axis=2) >= min_periods
+    z[~enough] = np.nan
+    return z, median, scale
+
+def detect_anomalies(db: Session, country: Optional[str] = None, as_of: Optional[date] = None,
+                     window_days: int = 30, baseline_days: int = 28, threshold: float = 3.0,
+                     metric: str = "nbNouveauCas", idMaladie: Optional[int] = None,
+                     min_periods: int = 7) -> Dict:
+    """Anomalies de `metric` sur les `window_days` jours se terminant à `as_of`"""
+    if metric not in METRICS:
+        raise ValueError(f"Métrique inconnue '{metric}' (valeurs possibles: {', '.join(METRICS)})")
+    if as_of is None:
+        as_of = latest_date(db, country)
+        if as_of is None:
+            return {"as_of": None, "start": None, "regions_scanned": 0, "anomalies": []}
+
+    start = as_of - timedelta(days=window_days - 1)
+    fetch_start = start - timedelta(days=baseline_days)
+    rows = load_region_series(db, fetch_start, as_of, metric, country, idMaladie)
+
+    n_days = (as_of - fetch_start).days + 1
+    regions: Dict[int, int] = {}
+    labels: List = []
+    for nomPays, idRegion, nomEtat, _, _ in rows:
+        if idRegion not in regions:
+            regions[idRegion] = len(labels)
+            labels.append((idRegion, nomEtat, nomPays))
+
+    values = np.full((len(labels), n_days), np.nan)
+    if rows:
+        r_idx = np.fromiter((regions[r[1]] for r in rows), dtype=np.int64, count=len(rows))
+        d_idx = np.fromiter(((r[3] - fetch_start).days for r in rows), dtype=np.int64, count=len(rows))
+        values[r_idx, d_idx] = [np.nan if r[4] is None else float(r[4]) for r in rows]
+
+    z, median, scale = robust_zscores(values, baseline_days, min_periods)
+    current = values[:, baseline_days:]
+    with np.errstate(invalid="ignore"):
+        hits = np.argwhere(np.abs(z) > threshold)
+
+    anomalies = []
+    for r, d in hits:
+        idRegion, nomEtat, nomPays = labels[r]
+        score = float(z[r, d])
+        anomalies.append({
+            "country": nomPays,
+            "idRegion": int(idRegion),
+            "region": nomEtat,
+            "date": (start + timedelta(days=int(d))).isoformat(),
+            "value": float(current[r, d]),
+            "baseline_median": float(median[r, d]),
+            "baseline_scale": float(scale[r, d]),
+            "z_score": score,
+            "direction": "spike" if score > 0 else "drop",
+            "severity": "high" if abs(score) > 1.5 * threshold else "medium",
+        })
+    anomalies.sort(key=lambda a: abs(a["z_score"]), reverse=True)
+
+    return {
+        "as_of": as_of.isoformat(),
+        "start": start.isoformat(),
+        "regions_scanned": len(labels),
+        "anomalies": anomalies,
+    }
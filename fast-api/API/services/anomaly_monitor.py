@@ -0,0 +1,341 @@
+# Surveillance continue des relevés : statistiques glissantes mises à jour à chaque écriture
+#
+# Statistiques par série (AnomalySeries) et alertes (AnomalyAlert) vivent en
+# base et sont mises à jour dans la transaction de l'écriture sur Releve : tous
+# les workers partagent les mêmes séries (verrou de ligne par série), et chaque
+# worker diffuse à ses abonnés SSE les alertes de tous les workers, relues dans
+# AnomalyAlert toutes les ANOMALY_ALERTS_POLL secondes (aussitôt après une
+# écriture faite par ce worker).
+
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+import asyncio
+import math
+import os
+import threading
+import logging
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..models import AnomalyAlert, AnomalySeries, Releve
+from .anomaly_engine import METRICS
+
+logger = logging.getLogger(__name__)
+
+# métriques suivies par défaut
+DEFAULT_METRICS = ["nbNouveauCas", "nbDeces", "nbHospitalisation"]
+
+
+def _offer(queue: asyncio.Queue, alert: Dict):
+    # un abonné trop lent perd des alertes plutôt que de bloquer les écritures
+    if not queue.full():
+        queue.put_nowait(alert)
+
+
+def _as_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def ewm_update(mean: float, var: float, count: int, value: float, alpha: float) -> Tuple[float, float, int]:
+    """Moyenne et variance exponentiellement pondérées (Welford pondéré), mise à jour O(1).
+
+    Tant que moins de 1/alpha valeurs ont été vues, le poids vaut 1/n (Welford
+    classique) pour que la variance ne soit pas sous-estimée au démarrage.
+    """
+    if count == 0:
+        return value, 0.0, 1
+    weight = max(alpha, 1.0 / (count + 1))
+    diff = value - mean
+    incr = weight * diff
+    return mean + incr, (1 - weight) * (var + diff * incr), count + 1
+
+
+def alert_dict(alert: AnomalyAlert) -> Dict:
+    return {
+        "id": alert.id,
+        "detected_at": alert.detected_at.isoformat(),
+        "idRegion": alert.idRegion,
+        "idMaladie": alert.idMaladie,
+        "metric": alert.metric,
+        "date": alert.dateReleve.isoformat(),
+        "value": alert.value,
+        "expected": alert.expected,
+        "scale": alert.scale,
+        "z_score": alert.z_score,
+        "direction": alert.direction,
+        "severity": alert.severity,
+    }
+
+
+class AnomalyMonitor:
+    """Suit chaque (région, maladie, métrique) et émet une alerte dès qu'un relevé s'écarte.
+
+    Chaque relevé écrit est comparé à la moyenne / l'écart-type exponentiellement
+    pondérés des jours précédents de la même série, puis intégré aux
+    statistiques (écrêté à ±threshold écarts-types pour qu'un pic ne gonfle pas
+    la variance). Un relevé du jour déjà vu s'ajoute à la valeur de ce jour,
+    réévaluée depuis l'état de la veille ; un relevé antérieur (rattrapage) est
+    comparé à l'état courant sans le modifier.
+    """
+
+    def __init__(self, metrics: Optional[List[str]] = None, span: int = 28, threshold: float = 3.0,
+                 min_periods: int = 7, min_scale: float = 1.0, poll_interval: float = 1.0,
+                 retention_days: int = 30):
+        self.metrics = list(metrics or DEFAULT_METRICS)
+        unknown = set(self.metrics) - set(METRICS)
+        if unknown:
+            raise ValueError(f"Métriques inconnues: {', '.join(sorted(unknown))}")
+        self.alpha = 2.0 / (span + 1)
+        self.threshold = threshold
+        self.min_periods = min_periods
+        self.min_scale = min_scale
+        self.poll_interval = poll_interval
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._subscribers: List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = []
+        self._wake = threading.Event()
+        self._poller: Optional[threading.Thread] = None
+        # compteurs de ce processus
+        self.observations = self.folded = self.backfilled = 0
+
+    # ---------- mise à jour ----------
+    def _check(self, mean: float, var: float, count: int, idRegion: int, idMaladie: int, metric: str,
+               day: date, value: float) -> Optional[AnomalyAlert]:
+        scale = max(math.sqrt(var), self.min_scale)
+        z = (value - mean) / scale
+        if count < self.min_periods or abs(z) <= self.threshold:
+            return None
+        return AnomalyAlert(
+            detected_at=datetime.now(), idRegion=idRegion, idMaladie=idMaladie, metric=metric,
+            dateReleve=day, value=value, expected=mean, scale=scale, z_score=z,
+            direction="spike" if z > 0 else "drop",
+            severity="high" if abs(z) > 1.5 * self.threshold else "medium",
+        )
+
+    def _observe(self, series: AnomalySeries, day: date, value: float) -> Optional[AnomalyAlert]:
+        if series.last_date is not None and day < series.last_date:
+            self.backfilled += 1
+            return self._check(series.mean, series.var, series.count, series.idRegion, series.idMaladie,
+                               series.metric, day, value)
+        if series.last_date is not None and day == series.last_date:
+            self.folded += 1
+            value += series.last_value or 0.0
+        else:
+            # nouveau jour : l'état courant devient celui de la veille
+            series.base_mean, series.base_var, series.base_count = series.mean, series.var, series.count
+            series.last_date = day
+        series.last_value = value
+
+        alert = self._check(series.base_mean, series.base_var, series.base_count, series.idRegion,
+                            series.idMaladie, series.metric, day, value)
+        if series.base_count:
+            bound = self.threshold * max(math.sqrt(series.base_var), self.min_scale)
+            value = min(max(value, series.base_mean - bound), series.base_mean + bound)
+        series.mean, series.var, series.count = ewm_update(
+            series.base_mean, series.base_var, series.base_count, value, self.alpha)
+        self.observations += 1
+        return alert
+
+    def _rows(self, releves: Iterable) -> List[Tuple[date, int, int, Dict]]:
+        rows = []
+        for r in releves:
+            get = r.get if isinstance(r, dict) else (lambda k, r=r: getattr(r, k, None))
+            rows.append((_as_date(get("dateReleve")), get("idRegion"), get("idMaladie"),
+                         {m: get(m) for m in self.metrics}))
+        rows.sort(key=lambda r: r[0])
+        return rows
+
+    def _lock_series(self, db: Session, keys) -> Dict[Tuple[int, int, str], AnomalySeries]:
+        """Séries des clés `keys`, verrouillées jusqu'à la fin de la transaction (créées si absentes)"""
+        def load():
+            rows = db.query(AnomalySeries).filter(
+                AnomalySeries.idRegion.in_({k[0] for k in keys}),
+                AnomalySeries.idMaladie.in_({k[1] for k in keys}),
+                AnomalySeries.metric.in_({k[2] for k in keys}),
+            ).with_for_update().all()
+            return {(s.idRegion, s.idMaladie, s.metric): s for s in rows}
+
+        series = load()
+        missing = [key for key in keys if key not in series]
+        for idRegion, idMaladie, metric in missing:
+            try:
+                with db.begin_nested():
+                    db.execute(insert(AnomalySeries).values(idRegion=idRegion, idMaladie=idMaladie, metric=metric,
+                                                            mean=0.0, var=0.0, count=0,
+                                                            base_mean=0.0, base_var=0.0, base_count=0))
+            except IntegrityError:
+                pass  # série créée entre-temps par un autre worker
+        return load() if missing else series
+
+    def observe_many(self, db: Session, releves: Iterable) -> List[Dict]:
+        """Intégrer des relevés (objets Releve ou dicts) dans la transaction de `db`.
+
+        Retourne les alertes enregistrées, à passer à `notify` après la
+        validation. Une erreur de la surveillance est journalisée sans faire
+        échouer l'écriture.
+        """
+        rows = [row for row in self._rows(releves) if row[1] is not None and row[2] is not None]
+        if not rows:
+            return []
+        keys = {(idRegion, idMaladie, metric) for _, idRegion, idMaladie, values in rows
+                for metric in self.metrics if values.get(metric) is not None}
+        if not keys:
+            return []
+        try:
+            with db.begin_nested():
+                series = self._lock_series(db, keys)
+                alerts = []
+                for day, idRegion, idMaladie, values in rows:
+                    for metric in self.metrics:
+                        if values.get(metric) is None:
+                            continue
+                        alert = self._observe(series[(idRegion, idMaladie, metric)], day, float(values[metric]))
+                        if alert is not None:
+                            alerts.append(alert)
+                db.add_all(alerts)
+                db.flush()
+            return [alert_dict(alert) for alert in alerts]
+        except Exception as e:
+            logger.warning(f"Surveillance des anomalies non mise à jour: {e}")
+            return []
+
+    def observe(self, db: Session, releve) -> List[Dict]:
+        """Intégrer un relevé en cours d'écriture"""
+        return self.observe_many(db, [releve])
+
+    def notify(self, alerts: List[Dict]):
+        """Après la validation de l'écriture : journalise et réveille la diffusion SSE"""
+        for alert in alerts:
+            logger.warning(f"Anomalie {alert['metric']} région {alert['idRegion']} "
+                           f"le {alert['date']} (z={alert['z_score']:.1f})")
+        if alerts:
+            self._wake.set()
+
+    def prime(self, db: Session, days: int = 60) -> int:
+        """Initialiser les statistiques à partir des `days` derniers jours en base (sans alerter).
+
+        Une seule fois par base : rien à faire si des séries existent déjà.
+        Purge aussi les alertes de plus de `retention_days` jours.
+        """
+        db.execute(delete(AnomalyAlert).where(
+            AnomalyAlert.detected_at < datetime.now() - timedelta(days=self.retention_days)))
+        db.commit()
+        if db.query(AnomalySeries).first() is not None:
+            return 0
+        end = db.query(Releve.dateReleve).order_by(Releve.dateReleve.desc()).limit(1).scalar()
+        if end is None:
+            return 0
+        columns = [getattr(Releve, m) for m in self.metrics]
+        rows = db.query(Releve.dateReleve, Releve.idRegion, Releve.idMaladie, *columns) \
+                 .filter(Releve.dateReleve > end - timedelta(days=days)) \
+                 .order_by(Releve.dateReleve).all()
+        series: Dict[Tuple[int, int, str], AnomalySeries] = {}
+        for day, idRegion, idMaladie, *values in rows:
+            for metric, value in zip(self.metrics, values):
+                if value is None:
+                    continue
+                key = (idRegion, idMaladie, metric)
+                if key not in series:
+                    series[key] = AnomalySeries(idRegion=idRegion, idMaladie=idMaladie, metric=metric,
+                                                mean=0.0, var=0.0, count=0,
+                                                base_mean=0.0, base_var=0.0, base_count=0)
+                self._observe(series[key], _as_date(day), float(value))
+        for attempt in range(3):
+            # séries créées entre-temps par une écriture ou un autre worker : gardées telles quelles
+            existing = set(db.query(AnomalySeries.idRegion, AnomalySeries.idMaladie, AnomalySeries.metric).all())
+            db.add_all([s for key, s in series.items() if key not in existing])
+            try:
+                db.commit()
+                break
+            except IntegrityError:
+                db.rollback()
+        else:
+            logger.warning("Initialisation de la surveillance des anomalies abandonnée (écritures concurrentes)")
+            return 0
+        logger.info(f"Surveillance des anomalies initialisée avec {len(rows)} relevés")
+        return len(rows)
+
+    # ---------- consultation ----------
+    def recent_alerts(self, db: Session, since_id: int = 0, limit: int = 100, idRegion: Optional[int] = None,
+                      idMaladie: Optional[int] = None, metric: Optional[str] = None) -> List[Dict]:
+        query = db.query(AnomalyAlert).filter(AnomalyAlert.id > since_id)
+        if idRegion is not None:
+            query = query.filter(AnomalyAlert.idRegion == idRegion)
+        if idMaladie is not None:
+            query = query.filter(AnomalyAlert.idMaladie == idMaladie)
+        if metric is not None:
+            query = query.filter(AnomalyAlert.metric == metric)
+        alerts = query.order_by(AnomalyAlert.id.desc()).limit(limit).all()
+        return [alert_dict(alert) for alert in reversed(alerts)]
+
+    def status(self, db: Session) -> Dict:
+        with self._lock:
+            subscribers = len(self._subscribers)
+        return {
+            "metrics": self.metrics,
+            "span_alpha": self.alpha,
+            "threshold": self.threshold,
+            "min_periods": self.min_periods,
+            "series_tracked": db.scalar(select(func.count()).select_from(AnomalySeries)),
+            "alerts_stored": db.scalar(select(func.count()).select_from(AnomalyAlert)),
+            "observations": self.observations,
+            "folded": self.folded,
+            "backfilled": self.backfilled,
+            "subscribers": subscribers,
+        }
+
+    # ---------- diffusion (flux SSE) ----------
+    def _poll(self):
+        """Relit les nouvelles alertes (de tous les workers) et les passe aux abonnés de ce processus"""
+        from ..database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            last_id = db.scalar(select(func.max(AnomalyAlert.id))) or 0
+            while True:
+                with self._lock:
+                    subscribers = list(self._subscribers)
+                    if not subscribers:
+                        self._poller = None
+                        return
+                alerts = db.query(AnomalyAlert).filter(AnomalyAlert.id > last_id) \
+                           .order_by(AnomalyAlert.id).limit(1000).all()
+                db.rollback()   # fin de la transaction de lecture : la suivante voit les nouvelles lignes
+                for alert in map(alert_dict, alerts):
+                    last_id = alert["id"]
+                    for loop, queue in subscribers:
+                        try:
+                            loop.call_soon_threadsafe(_offer, queue, alert)
+                        except RuntimeError:
+                            # boucle fermée : l'abonné a disparu sans se désinscrire
+                            self.unsubscribe(queue)
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+        except Exception as e:
+            logger.warning(f"Diffusion des alertes interrompue: {e}")
+            with self._lock:
+                self._poller = None
+        finally:
+            db.close()
+
+    def subscribe(self) -> asyncio.Queue:
+        """File d'alertes pour la boucle asyncio courante (flux SSE)"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1000)
+        with self._lock:
+            self._subscribers.append((asyncio.get_running_loop(), queue))
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll, name="anomaly-alerts", daemon=True)
+                self._poller.start()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self._lock:
+            self._subscribers = [(l, q) for l, q in self._subscribers if q is not queue]
+
+
+# Instance partagée (alimentée par crud.create_releve / crud.create_releves_bulk)
+anomaly_monitor = AnomalyMonitor(poll_interval=float(os.getenv("ANOMALY_ALERTS_POLL", "1.0")),
+                                 retention_days=int(os.getenv("ANOMALY_ALERTS_RETENTION_DAYS", "30")))
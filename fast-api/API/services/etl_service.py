@@ -2,7 +2,6 @@
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any
-import pandas as pd
 import logging
 from datetime import datetime, date
 from ..database import get_db
@@ -61,6 +60,8 @@ class ETLService:
             aggregation_type: str = "daily"
         ):
             """Transformer et agréger les données"""
+            import pandas as pd
+
             try:
                 df = pd.DataFrame(data)
                 
@@ -0,0 +1,217 @@
+
+# Comparaison mesurée des modèles (précision + latence d'inférence)
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+import time
+import logging
+import numpy as np
+
+from .model_registry import (
+    CLASSICAL_TARGETS, TEMPORAL_TYPES, TRAIN_SIZE,
+    load_classical_model, load_temporal_bundle, model_feature_names,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def regression_metrics(y_true: np.ndarray, y_pred: np.ndarray) -> Dict[str, float]:
+    """MAE / RMSE / R2 / SMAPE sur les valeurs aplaties"""
+    y_true = np.asarray(y_true, dtype=float).ravel()
+    y_pred = np.asarray(y_pred, dtype=float).ravel()
+    err = y_pred - y_true
+    ss_res = float(np.sum(err ** 2))
+    ss_tot = float(np.sum((y_true - y_true.mean()) ** 2))
+    denom = np.abs(y_true) + np.abs(y_pred)
+    return {
+        "mae": float(np.mean(np.abs(err))),
+        "rmse": float(np.sqrt(np.mean(err ** 2))),
+        "r2": 1 - ss_res / ss_tot if ss_tot > 0 else (1.0 if ss_res == 0 else 0.0),
+        "smape": float(np.mean(2 * np.abs(err) / np.where(denom == 0, 1, denom)) * 100),
+    }
+
+
+class ModelComparisonEngine:
+    """Évalue les modèles d'un pays sur un jeu de test et mesure leur latence.
+
+    Les modèles temporels (GRU, LSTM, ...) sont évalués sur `test_data["X"]` /
+    `test_data["y"]` (fenêtres déjà normalisées) ou, à défaut, sur la fenêtre
+    de test stockée avec les données préparées du pays (les 20 % finaux,
+    éventuellement restreints par `start_date` / `end_date`).
+    Les modèles classiques (tauxMortalite, nbHospitalisation, nbNouveauCas)
+    sont évalués sur `test_data[<cible>] = {"features": [...], "target": [...]}`.
+    """
+
+    def __init__(self, max_workers: int = 4, batch_sizes=(1, 32, 256), repeats: int = 20):
+        self.max_workers = max_workers
+        self.batch_sizes = tuple(batch_sizes)
+        self.repeats = repeats
+
+    # ---------- préparation des jeux de test ----------
+    def _temporal_case(self, country: str, model_type: str, test_data: Dict[str, Any]):
+        import torch
+
+        bundle = load_temporal_bundle(country, model_type)
+        model = bundle["model"]
+        prep = bundle["prepared"] or {}
+        scaler = prep.get("target_scaler")
+
+        if "X" in test_data and "y" in test_data:
+            X = np.asarray(test_data["X"], dtype=np.float32)
+            y = np.asarray(test_data["y"], dtype=float)
+            window = {"source": "test_data", "n_samples": int(len(X))}
+        else:
+            if "X" not in prep:
+                raise ValueError("Pas de données préparées stockées pour ce pays, fournir test_data.X / test_data.y")
+            split = int(len(prep["X"]) * TRAIN_SIZE)
+            X = prep["X"][split:].astype(np.float32)
+            y = prep["y"][split:]
+            dates = prep.get("dates")
+            window = {"source": "holdout", "n_samples": int(len(X))}
+            if dates is not None:
+                dates = np.asarray(dates[split:], dtype="datetime64[D]")
+                mask = np.ones(len(X), dtype=bool)
+                if test_data.get("start_date"):
+                    mask &= dates >= np.datetime64(test_data["start_date"])
+                if test_data.get("end_date"):
+                    mask &= dates <= np.datetime64(test_data["end_date"])
+                X, y, dates = X[mask], y[mask], dates[mask]
+                window["n_samples"] = int(len(X))
+                if len(dates):
+                    window["start"] = str(dates[0])
+                    window["end"] = str(dates[-1])
+        if len(X) == 0:
+            raise ValueError("Fenêtre de test vide")
+
+        def predict(batch):
+            with torch.no_grad():
+                return model(torch.from_numpy(batch)).numpy()
+
+        def unscale(values):
+            # convention V4 : cible en log1p puis RobustScaler
+            if scaler is None:
+                return values
+            flat = scaler.inverse_transform(np.asarray(values).reshape(-1, 1))
+            return np.expm1(flat).reshape(np.shape(values))
+
+        return {
+            "kind": "temporal",
+            "file": bundle["files"]["weights"].name,
+            "X": X,
+            "y_true": unscale(y),
+            "predict": predict,
+            "postprocess": unscale,
+            "window": window,
+        }
+
+    def _classical_case(self, country: str, target: str, test_data: Dict[str, Any]):
+        import pandas as pd
+
+        spec = test_data.get(target)
+        if not spec or "features" not in spec or "target" not in spec:
+            raise ValueError(f"test_data['{target}'] doit contenir 'features' et 'target'")
+        model = load_classical_model(target, country)
+        df = pd.DataFrame(spec["features"])
+        cols = model_feature_names(model) or list(df.columns)
+        missing = set(cols) - set(df.columns)
+        if missing:
+            raise ValueError(f"Colonnes manquantes pour {target}: {', '.join(sorted(missing))}")
+        X = df[cols]
+        y = np.asarray(spec["target"], dtype=float)
+        if len(X) != len(y) or len(X) == 0:
+            raise ValueError(f"features et target de {target} doivent avoir la même taille non nulle")
+        return {
+            "kind": "classical",
+            "file": type(model).__name__,
+            "X": X,
+            "y_true": y,
+            "predict": lambda batch: model.predict(batch),
+            "postprocess": lambda values: values,
+            "window": {"source": "test_data", "n_samples": int(len(X))},
+        }
+
+    def _build_case(self, country: str, name: str, test_data: Dict[str, Any]):
+        if name in TEMPORAL_TYPES:
+            return self._temporal_case(country, name, test_data)
+        if name in CLASSICAL_TARGETS:
+            return self._classical_case(country, name, test_data)
+        raise ValueError(f"Modèle inconnu '{name}' (temporels: {TEMPORAL_TYPES}, "
+                         f"classiques: {list(CLASSICAL_TARGETS)})")
+
+    # ---------- mesures ----------
+    def _score(self, country: str, name: str, test_data: Dict[str, Any]) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        case = self._build_case(country, name, test_data)
+        load_time = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        y_pred = case["postprocess"](case["predict"](case["X"]))
+        score_time = time.perf_counter() - t0
+
+        case["result"] = {
+            "kind": case["kind"],
+            "file": case["file"],
+            "evaluation_window": case["window"],
+            **regression_metrics(case["y_true"], y_pred),
+            "load_time_s": load_time,
+            "scoring_time_s": score_time,
+        }
+        return case
+
+    def _latency(self, predict: Callable, X) -> Dict[str, Dict[str, float]]:
+        """p50 / p95 par taille de batch (échantillons répétés si le jeu est plus petit)"""
+        out = {}
+        for bs in self.batch_sizes:
+            idx = np.arange(bs) % len(X)
+            batch = X.iloc[idx] if hasattr(X, "iloc") else X[idx]
+            predict(batch)  # échauffement
+            timings = []
+            for _ in range(self.repeats):
+                t0 = time.perf_counter()
+                predict(batch)
+                timings.append(time.perf_counter() - t0)
+            p50, p95 = np.percentile(timings, [50, 95])
+            out[str(bs)] = {
+                "p50_ms": float(p50 * 1000),
+                "p95_ms": float(p95 * 1000),
+                "throughput_per_s": float(bs / p50) if p50 > 0 else None,
+            }
+        return out
+
+    def compare(self, country: str, models: List[str], test_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Évaluer `models` en parallèle puis mesurer leur latence un par un.
+
+        La précision est calculée dans un pool de threads ; la latence est
+        mesurée séquentiellement pour que les modèles ne se concurrencent pas
+        pendant le chronométrage.
+        """
+        country = country.lower()
+        test_data = test_data or {}
+        results: Dict[str, Dict[str, Any]] = {}
+        cases = {}
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(models)))) as pool:
+            futures = {name: pool.submit(self._score, country, name, test_data) for name in models}
+            for name, future in futures.items():
+                try:
+                    cases[name] = future.result()
+                except Exception as e:
+                    logger.warning(f"Comparaison: {country}/{name} non évalué: {e}")
+                    results[name] = {"error": str(e)}
+
+        for name, case in cases.items():
+            case["result"]["latency"] = self._latency(case["predict"], case["X"])
+            results[name] = case["result"]
+
+        # SMAPE est sans unité : il permet de classer des modèles de cibles différentes
+        scored = [name for name in models if "smape" in results.get(name, {})]
+        ranking = sorted(scored, key=lambda n: (results[n]["smape"], results[n]["rmse"]))
+        return {
+            "results": results,
+            "ranking": ranking,
+            "best_model": ranking[0] if ranking else None,
+        }
+
+
+# Instance partagée par l'API technique
+model_comparison_engine = ModelComparisonEngine()
@@ -0,0 +1,137 @@
+
+# Registre des modèles entraînés (classiques .pkl et temporels .pth)
+
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
+import json
+import os
+import pickle
+import logging
+
+from ..prometheus import MODEL_LOAD_DURATION
+
+logger = logging.getLogger(__name__)
+
+MODELS_DIR = Path(__file__).parent.parent / "models"
+CLASSICAL_DIR = MODELS_DIR / "classique"
+TEMPORAL_DIR = MODELS_DIR / "temporel"
+
+# cible -> préfixe des fichiers (models/classique/<cible>/<préfixe>_<pays>_<algo>_opt.pkl)
+CLASSICAL_TARGETS = {
+    "tauxMortalite": "model_tauxMortalite",
+    "nbHospitalisation": "model_hosp",
+    "nbNouveauCas": "model_newCas",
+}
+
+TEMPORAL_TYPES = ["GRU", "LSTM", "RNN", "TCNN", "TransformerTS", "NBEATS"]
+
+# métriques des scripts V4 (*_metrics_*.json de train_model_V4, *_evaluation_summary.json
+# de evaluate_model_V4) : à côté des poids, ou dans le paths.metrics_dir de config_V4.yaml
+# désigné par TEMPORAL_METRICS_DIR
+TEMPORAL_METRICS_DIR = os.getenv("TEMPORAL_METRICS_DIR")
+
+# part des échantillons utilisée pour l'entraînement (config_V4.yaml, split.train_size)
+TRAIN_SIZE = 0.8
+
+
+def find_classical_model(target: str, country: str) -> Optional[Path]:
+    """Fichier .pkl du modèle classique `target` pour un pays"""
+    prefix = CLASSICAL_TARGETS.get(target)
+    if prefix is None:
+        return None
+    files = sorted((CLASSICAL_DIR / target).glob(f"{prefix}_{country.lower()}_*_opt.pkl"))
+    return files[0] if files else None
+
+@lru_cache()
+@MODEL_LOAD_DURATION.timed(lambda target, country: (country.lower(), target))
+def load_classical_model(target: str, country: str):
+    """Charger (une seule fois par processus) un modèle classique"""
+    path = find_classical_model(target, country)
+    if path is None:
+        raise FileNotFoundError(f"Aucun modèle {target} trouvé pour le pays '{country}'")
+    logger.info(f"Chargement du modèle classique: {path}")
+    with open(path, "rb") as f:
+        model = pickle.load(f)
+    if not hasattr(model, "predict"):
+        raise TypeError(f"{path.name} ne contient pas de modèle (type {type(model).__name__})")
+    return model
+
+def model_feature_names(model) -> Optional[List[str]]:
+    """Ordre des colonnes attendu par un modèle sklearn/XGBoost/LightGBM/CatBoost"""
+    for attr in ("feature_names_in_", "feature_names_", "feature_name_"):
+        names = getattr(model, attr, None)
+        if names is not None and len(names):
+            return [str(n) for n in names]
+    return None
+
+
+def _newest(pattern: str, directories: List[Path]) -> List[Path]:
+    files = [path for directory in directories for path in directory.glob(pattern)]
+    return sorted(files, key=lambda p: p.stat().st_mtime, reverse=True)
+
+def _latest(pattern: str) -> Optional[Path]:
+    files = _newest(pattern, [TEMPORAL_DIR])
+    return files[0] if files else None
+
+def temporal_metrics_dirs() -> List[Path]:
+    return [TEMPORAL_DIR] + ([Path(TEMPORAL_METRICS_DIR)] if TEMPORAL_METRICS_DIR else [])
+
+def evaluation_summaries() -> List[Path]:
+    """Résumés d'évaluation V4, du plus récent au plus ancien"""
+    return _newest("*_evaluation_summary.json", temporal_metrics_dirs())
+
+def find_temporal_files(country: str, model_type: str) -> Dict[str, Optional[Path]]:
+    """Poids .pth, données préparées .pkl et métriques .json d'un modèle temporel"""
+    country = country.lower()
+    return {
+        "weights": _latest(f"{country}_{model_type}_*.pth"),
+        "prepared": _latest(f"{country}_prepared_*.pkl"),
+        "metrics": next(iter(_newest(f"{country}_{model_type}_metrics_*.json", temporal_metrics_dirs())), None),
+    }
+
+@lru_cache()
+@MODEL_LOAD_DURATION.timed(lambda country, model_type: (country.lower(), model_type))
+def load_temporal_bundle(country: str, model_type: str) -> Dict:
+    """Modèle V4 reconstruit + données préparées du pays (fenêtres, scalers, dates)"""
+    import torch
+    from .temporal_models import build_from_state_dict
+
+    files = find_temporal_files(country, model_type)
+    if files["weights"] is None:
+        raise FileNotFoundError(f"Aucun modèle {model_type} trouvé pour le pays '{country}'")
+
+    params = {}
+    if files["metrics"] is not None:
+        with open(files["metrics"], "r") as f:
+            params = json.load(f).get("best_params", {})
+
+    state = torch.load(files["weights"], map_location="cpu", weights_only=False)
+    if isinstance(state, dict) and "model_state_dict" in state:
+        state = state["model_state_dict"]
+    model = build_from_state_dict(state, params)
+
+    prepared = None
+    if files["prepared"] is not None:
+        with open(files["prepared"], "rb") as f:
+            prepared = pickle.load(f).get(country.lower())
+
+    logger.info(f"Modèle temporel {country}_{model_type} chargé depuis {files['weights']}")
+    return {"model": model, "prepared": prepared, "files": files}
+
+def list_models(country: Optional[str] = None) -> List[Dict]:
+    """Inventaire des modèles disponibles, optionnellement filtré par pays"""
+    entries = []
+    for target, prefix in CLASSICAL_TARGETS.items():
+        for path in sorted((CLASSICAL_DIR / target).glob(f"{prefix}_*_opt.pkl")):
+            parts = path.stem[len(prefix) + 1:].split("_")
+            entries.append({"kind": "classical", "name": target,
+                            "country": parts[0], "algorithm": parts[1], "file": path.name})
+    for path in sorted(TEMPORAL_DIR.glob("*.pth")):
+        parts = path.stem.split("_")
+        if len(parts) >= 2 and parts[1] in TEMPORAL_TYPES:
+            entries.append({"kind": "temporal", "name": parts[1],
+                            "country": parts[0], "algorithm": parts[1], "file": path.name})
+    if country:
+        entries = [e for e in entries if e["country"] == country.lower()]
+    return entries
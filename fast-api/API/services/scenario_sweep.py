@@ -0,0 +1,136 @@
+
+# Balayage de scénarios (what-if) sur un modèle classique
+#
+# La grille (produit cartésien des variables balayées) est construite en une
+# matrice de variables et évaluée par un seul `model.predict`, au lieu d'un
+# appel HTTP par scénario. Les lignes de résultat sont recalculées par blocs
+# depuis les indices de la grille au moment de l'envoi : seule la colonne des
+# prédictions est gardée en mémoire.
+
+from typing import Dict, Iterator, List, Sequence, Tuple
+import os
+import numpy as np
+
+from ..fast_json import dumps
+from ..schemas.scenario_sweep import MAX_AXIS_VALUES
+from .model_registry import load_classical_model, model_feature_names
+
+MAX_POINTS = int(os.getenv("SWEEP_MAX_POINTS", "200000"))       # scénarios par requête
+
+Axes = List[Tuple[str, List[float]]]
+
+# cible -> (nom de la prédiction, mise en forme), comme les routes /prediction/ unitaires
+OUTPUTS = {
+    "tauxMortalite": ("taux_mortalite", lambda p: np.round(p * 100, 2)),           # en %
+    "nbHospitalisation": ("nombre_hospitalisations", lambda p: np.maximum(0, np.round(p))),
+}
+
+
+class SweepError(ValueError):
+    """Grille invalide ou trop grande (HTTP 400)"""
+
+
+def axis_values(values=None, start=None, stop=None, steps=None) -> List[float]:
+    count = len(values) if values is not None else steps
+    if count > MAX_AXIS_VALUES:
+        # avant np.linspace : `steps` seul suffirait à épuiser la mémoire
+        raise SweepError(f"{count} valeurs pour une variable (maximum {MAX_AXIS_VALUES})")
+    if values is not None:
+        return [float(v) for v in values]
+    return [float(v) for v in np.linspace(start, stop, steps)]
+
+
+def plan(features: Sequence[str], fixed: Dict[str, float], ranges: Dict[str, List[float]]) -> Axes:
+    """Axes de la grille dans l'ordre des variables du modèle ; SweepError si la grille est invalide"""
+    unknown = (set(fixed) | set(ranges)) - set(features)
+    if unknown:
+        raise SweepError(f"Variables inconnues: {', '.join(sorted(unknown))} "
+                         f"(variables du modèle: {', '.join(features)})")
+    both = set(fixed) & set(ranges)
+    if both:
+        raise SweepError(f"Variables à la fois fixées et balayées: {', '.join(sorted(both))}")
+    missing = [name for name in features if name not in fixed and name not in ranges]
+    if missing:
+        raise SweepError(f"Variables sans valeur: {', '.join(missing)}")
+
+    axes = [(name, ranges[name]) for name in features if name in ranges]
+    for name, values in axes:
+        if len(values) > MAX_AXIS_VALUES:
+            raise SweepError(f"{name}: {len(values)} valeurs (maximum {MAX_AXIS_VALUES})")
+    points = grid_size(axes)
+    if points > MAX_POINTS:
+        raise SweepError(f"Grille trop grande: {points} scénarios (maximum {MAX_POINTS})")
+    return axes
+
+
+def grid_size(axes: Axes) -> int:
+    return int(np.prod([len(values) for _, values in axes]))
+
+
+def check_surface_axes(axes: Axes, over: Sequence[str]):
+    names = [name for name, _ in axes]
+    unknown = [name for name in over if name not in names]
+    if unknown:
+        raise SweepError(f"surface_axes doit désigner des variables balayées: {', '.join(unknown)}")
+    if len(set(over)) != len(over):
+        raise SweepError("surface_axes contient deux fois la même variable")
+
+
+def feature_matrix(features: Sequence[str], fixed: Dict[str, float], axes: Axes) -> np.ndarray:
+    """Matrice [scénarios, variables] : produit cartésien des axes (le dernier varie le plus vite)"""
+    grids = np.meshgrid(*[np.asarray(values, dtype=float) for _, values in axes], indexing="ij")
+    columns = {name: grid.ravel() for (name, _), grid in zip(axes, grids)}
+    points = grids[0].size
+    return np.column_stack([columns[name] if name in columns else np.full(points, fixed[name], dtype=float)
+                            for name in features])
+
+
+def score_grid(target: str, country: str, features: Sequence[str], fixed: Dict[str, float],
+               axes: Axes) -> List[float]:
+    """Prédictions de toute la grille en un appel (exécuté dans un processus d'inférence)"""
+    import pandas as pd
+
+    model = load_classical_model(target, country.lower())
+    frame = pd.DataFrame(feature_matrix(features, fixed, axes), columns=list(features))
+    ordered = model_feature_names(model)
+    if ordered and set(ordered) == set(features):
+        frame = frame[ordered]
+    return np.asarray(model.predict(frame), dtype=float).ravel().tolist()
+
+
+def format_predictions(target: str, raw: Sequence[float]) -> Tuple[str, np.ndarray]:
+    """Nom et valeurs des prédictions, mises en forme comme par la route unitaire de la cible"""
+    name, formatter = OUTPUTS[target]
+    return name, formatter(np.asarray(raw, dtype=float))
+
+
+def stream_rows(axes: Axes, predictions: np.ndarray, prediction_name: str,
+                chunk_size: int = 5000) -> Iterator[bytes]:
+    """Lignes NDJSON {variable: valeur, ..., prediction_name: valeur}, par blocs de `chunk_size`"""
+    shape = tuple(len(values) for _, values in axes)
+    arrays = [np.asarray(values) for _, values in axes]
+    names = [name for name, _ in axes] + [prediction_name]
+    for start in range(0, predictions.size, chunk_size):
+        stop = min(start + chunk_size, predictions.size)
+        indices = np.unravel_index(np.arange(start, stop), shape)
+        columns = [array[index].tolist() for array, index in zip(arrays, indices)]
+        columns.append(predictions[start:stop].tolist())
+        yield b"".join(dumps(dict(zip(names, row))) + b"\n" for row in zip(*columns))
+
+
+def surface(axes: Axes, predictions: np.ndarray, over: Sequence[str]) -> Dict:
+    """Moyenne / min / max des prédictions par valeur des axes `over`, les autres axes agrégés"""
+    check_surface_axes(axes, over)
+    names = [name for name, _ in axes]
+    grid = predictions.reshape(tuple(len(values) for _, values in axes))
+    kept = [names.index(name) for name in over]
+    # axes gardés en tête, dans l'ordre demandé, puis agrégation sur tous les autres
+    grid = np.moveaxis(grid, kept, list(range(len(kept))))
+    reduced = tuple(range(len(kept), grid.ndim))
+    return {
+        "points": int(predictions.size),
+        "axes": {name: dict(axes)[name] for name in over},
+        "mean": np.round(grid.mean(axis=reduced), 4).tolist(),
+        "min": grid.min(axis=reduced).tolist(),
+        "max": grid.max(axis=reduced).tolist(),
+    }
@@ -1,13 +1,22 @@
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Body, Query, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any, Optional
-import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime, date
 from ..database import get_db
-from ..models import Releve, Pays, Regions
+from .. import crud, request_metrics
+from ..profiling import ProfileSession, profiler, require_admin
+from ..cache_backend import shared_cache
+from ..name_search import pays_index
+from ..models import Pays, Regions
+from .model_comparison import model_comparison_engine
+from . import anomaly_engine
+from .anomaly_monitor import anomaly_monitor
+import asyncio
+import json
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +35,27 @@ class TechnicalAPIService:
                 "timestamp": datetime.now().isoformat()
             }
         
+        @self.router.get("/cache/stats")
+        def cache_stats():
+            """Taux de succès, écritures et taille du cache partagé, par espace de noms"""
+            return shared_cache.stats()
+        
+        @self.router.get("/metrics/summary")
+        def metrics_summary(
+            minutes: int = Query(60, ge=1, le=7 * 24 * 60, description="Fenêtre d'observation"),
+            service: Optional[str] = Query(None, description="service_name (par défaut celui de ce processus)"),
+            db: Session = Depends(get_db)
+        ):
+            """Percentiles p50 / p95 / p99 (ms) des temps de réponse, par route"""
+            # les lignes encore en tampon dans ce processus sont incluses
+            request_metrics.recorder.flush()
+            routes = request_metrics.summary(db, minutes, service)
+            return {
+                "minutes": minutes,
+                "recorder": request_metrics.recorder.stats(),
+                "routes": routes
+            }
+        
         @self.router.post("/analytics/trends")
         async def analyze_trends(
             country: str,
@@ -36,7 +66,9 @@ class TechnicalAPIService:
             """Analyser les tendances épidémiologiques avancées"""
             try:
                 # Récupérer les données du pays
-                pays = db.query(Pays).filter(Pays.nomPays.ilike(f"%{country}%")).first()
+                # meilleure correspondance de l'index des noms (accents, fautes de frappe)
+                ids = pays_index.ids(db, country, columns=["nomPays"], fuzzy=True)
+                pays = db.get(Pays, ids[0]) if ids else None
                 if not pays:
                     raise HTTPException(status_code=404, detail="Pays non trouvé")
                 
@@ -45,11 +77,7 @@ class TechnicalAPIService:
                 region_ids = [r.idRegion for r in regions]
                 
                 # Récupérer les données de relevés
-                releves = db.query(Releve).filter(
-                    Releve.idRegion.in_(region_ids),
-                    Releve.dateReleve >= start_date,
-                    Releve.dateReleve <= end_date
-                ).all()
+                releves = crud.get_releves_by_regions_and_date_range(db, region_ids, start_date, end_date)
                 
                 # Analyse des tendances
                 data = []
@@ -61,6 +89,8 @@ class TechnicalAPIService:
                         'hospitalisations': releve.nbHospitalisation or 0
                     })
                 
+                import pandas as pd
+
                 df = pd.DataFrame(data)
                 df['date'] = pd.to_datetime(df['date'])
                 df_daily = df.groupby('date').sum().reset_index()
@@ -96,100 +126,160 @@ class TechnicalAPIService:
                 raise HTTPException(status_code=500, detail=str(e))
         
         @self.router.post("/models/comparison")
-        async def compare_models(
+        def compare_models(
             country: str,
-            models: List[str],
-            test_data: Dict[str, Any]
+            models: List[str] = Body(..., description="Modèles temporels (GRU, LSTM, ...) ou cibles classiques (tauxMortalite, ...)"),
+            test_data: Dict[str, Any] = Body(default={}, description="Jeu de test ; fenêtre de test stockée si absent")
         ):
-            """Comparer les performances de différents modèles"""
+            """Comparer les performances mesurées de différents modèles"""
             try:
-                # Simulation de comparaison de modèles
-                # Dans un vrai cas, vous chargeriez et testeriez les modèles
-                
-                results = {}
-                for model in models:
-                    # Simulation de métriques
-                    results[model] = {
-                        "mae": np.random.uniform(50, 200),
-                        "rmse": np.random.uniform(100, 300),
-                        "r2": np.random.uniform(0.7, 0.95),
-                        "execution_time": np.random.uniform(0.1, 2.0)
-                    }
-                
-                # Trouver le meilleur modèle
-                best_model = min(results.keys(), key=lambda x: results[x]['rmse'])
+                comparison = model_comparison_engine.compare(country, models, test_data)
+                best_model = comparison["best_model"]
+                if best_model is None:
+                    raise HTTPException(
+                        status_code=422,
+                        detail={"message": "Aucun modèle n'a pu être évalué", "results": comparison["results"]}
+                    )
                 
                 return {
                     "country": country,
                     "models_compared": models,
                     "best_model": best_model,
-                    "results": results,
+                    "ranking": comparison["ranking"],
+                    "results": comparison["results"],
                     "recommendation": f"Le modèle {best_model} est recommandé pour {country}"
                 }
                 
+            except HTTPException:
+                raise
             except Exception as e:
                 logger.error(f"Erreur comparaison modèles: {e}")
                 raise HTTPException(status_code=500, detail=str(e))
         
         @self.router.post("/alerts/anomalies")
-        async def detect_anomalies(
-            country: str,
-            threshold: float = 2.0,
+        def detect_anomalies(
+            country: Optional[str] = Query(None, description="Pays (tous les pays si absent)"),
+            threshold: float = Query(3.0, gt=0, description="Seuil sur le z-score robuste (en valeur absolue)"),
+            as_of: Optional[date] = Query(None, description="Fin de la période analysée (dernier relevé si absent)"),
+            window_days: int = Query(30, ge=1, le=366, description="Nombre de jours analysés"),
+            baseline_days: int = Query(28, ge=7, le=366, description="Jours de référence précédant chaque jour"),
+            metric: str = Query("nbNouveauCas", description="Colonne de Releve surveillée"),
+            idMaladie: Optional[int] = Query(None, description="Restreindre à une maladie"),
             db: Session = Depends(get_db)
         ):
-            """Détecter les anomalies dans les données"""
+            """Détecter les anomalies par région (z-score robuste médiane/MAD glissant)"""
             try:
-                # Récupérer les données récentes
-                end_date = datetime.now().date()
-                start_date = end_date - timedelta(days=30)
-                
-                pays = db.query(Pays).filter(Pays.nomPays.ilike(f"%{country}%")).first()
-                if not pays:
+                # même recherche que anomaly_engine : un nom inconnu ne filtre sur aucun pays
+                if country and not pays_index.ids(db, country, columns=["nomPays"]):
                     raise HTTPException(status_code=404, detail="Pays non trouvé")
-                
-                regions = db.query(Regions).filter(Regions.idPays == pays.idPays).all()
-                region_ids = [r.idRegion for r in regions]
-                
-                releves = db.query(Releve).filter(
-                    Releve.idRegion.in_(region_ids),
-                    Releve.dateReleve >= start_date,
-                    Releve.dateReleve <= end_date
-                ).all()
-                
-                # Analyse des anomalies
-                cases = [r.nbNouveauCas or 0 for r in releves]
-                if len(cases) < 7:
-                    return {"anomalies": [], "message": "Pas assez de données"}
-                
-                mean_cases = np.mean(cases)
-                std_cases = np.std(cases)
-                
-                anomalies = []
-                for releve in releves:
-                    if releve.nbNouveauCas:
-                        z_score = abs((releve.nbNouveauCas - mean_cases) / std_cases)
-                        if z_score > threshold:
-                            anomalies.append({
-                                "date": releve.dateReleve.isoformat(),
-                                "value": releve.nbNouveauCas,
-                                "z_score": float(z_score),
-                                "severity": "high" if z_score > 3 else "medium"
-                            })
-                
+                params = dict(country=country, as_of=as_of, window_days=window_days,
+                              baseline_days=baseline_days, threshold=threshold, metric=metric,
+                              idMaladie=idMaladie, min_periods=min(7, baseline_days))
+                result = shared_cache.get_or_set(
+                    "aggregates/releves",
+                    shared_cache.make_key("anomalies", sorted(params.items())),
+                    lambda: anomaly_engine.detect_anomalies(db, **params)
+                )
                 return {
                     "country": country,
+                    "metric": metric,
+                    "method": "robust_zscore",
                     "detection_period": {
-                        "start": start_date.isoformat(),
-                        "end": end_date.isoformat()
+                        "start": result["start"],
+                        "end": result["as_of"]
                     },
+                    "baseline_days": baseline_days,
                     "threshold": threshold,
-                    "anomalies_detected": len(anomalies),
-                    "anomalies": anomalies
+                    "regions_scanned": result["regions_scanned"],
+                    "anomalies_detected": len(result["anomalies"]),
+                    "anomalies": result["anomalies"]
                 }
                 
+            except HTTPException:
+                raise
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
             except Exception as e:
                 logger.error(f"Erreur détection anomalies: {e}")
                 raise HTTPException(status_code=500, detail=str(e))
 
+        @self.router.get("/alerts/recent")
+        def recent_alerts(
+            since_id: int = Query(0, ge=0, description="Ne retourner que les alertes d'identifiant supérieur"),
+            limit: int = Query(100, ge=1, le=1000),
+            idRegion: Optional[int] = None,
+            idMaladie: Optional[int] = None,
+            metric: Optional[str] = None,
+            db: Session = Depends(get_db)
+        ):
+            """Dernières alertes émises par la surveillance continue des relevés (tous workers)"""
+            alerts = anomaly_monitor.recent_alerts(db, since_id, limit, idRegion, idMaladie, metric)
+            return {
+                "alerts_count": len(alerts),
+                "last_id": alerts[-1]["id"] if alerts else since_id,
+                "alerts": alerts
+            }
+        
+        @self.router.get("/alerts/stream")
+        async def stream_alerts(request: Request, heartbeat: float = Query(15.0, gt=0, le=300)):
+            """Flux SSE des alertes, émises dès l'écriture des relevés"""
+            queue = anomaly_monitor.subscribe()
+            
+            async def events():
+                try:
+                    while not await request.is_disconnected():
+                        try:
+                            alert = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+                        except asyncio.TimeoutError:
+                            yield ": keep-alive\n\n"
+                            continue
+                        yield f"id: {alert['id']}\nevent: anomaly\ndata: {json.dumps(alert)}\n\n"
+                finally:
+                    anomaly_monitor.unsubscribe(queue)
+            
+            return StreamingResponse(events(), media_type="text/event-stream",
+                                     headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        
+        @self.router.post("/admin/profile", dependencies=[Depends(require_admin)])
+        async def profile_worker(
+            request: Request,
+            seconds: float = Query(10.0, gt=0, le=300, description="Durée, ou attente maximale avec `route`"),
+            route: Optional[str] = Query(None, description='Route ciblée, ex. "POST /prediction/temporal/"'),
+            requests: int = Query(10, ge=1, le=1000, description="Avec `route` : nombre de requêtes à profiler"),
+            interval_ms: float = Query(5.0, ge=1, le=100),
+            allocations: bool = Query(False, description="tracemalloc pendant la session"),
+            format: str = Query("json", pattern="^(json|collapsed)$")
+        ):
+            """Profil échantillonné du worker qui reçoit la requête (piles « collapsed » pour flamegraph)"""
+            route_regex = method = None
+            if route:
+                method, _, path = route.strip().partition(" ")
+                method = method.upper()
+                matching = [r for r in request.app.routes
+                            if getattr(r, "path", None) == path and method in (getattr(r, "methods", None) or ())]
+                if not matching:
+                    raise HTTPException(status_code=404, detail=f"Route inconnue : {route}")
+                route_regex = matching[0].path_regex
+            
+            session = ProfileSession(interval_ms / 1000, route_regex, method, requests if route else 0, allocations)
+            if not profiler.begin(session):
+                raise HTTPException(status_code=409, detail="Un profilage est déjà en cours sur ce worker")
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline and not session.done.is_set():
+                await asyncio.sleep(0.05)
+            # arrêt du thread et instantané tracemalloc hors de la boucle asyncio
+            result = await asyncio.to_thread(profiler.end)
+            
+            if format == "collapsed":
+                return PlainTextResponse(result["collapsed"], headers={
+                    "Content-Disposition": 'attachment; filename="profile.collapsed"'})
+            return result
+        
+        @self.router.get("/alerts/monitor")
+        def monitor_status(db: Session = Depends(get_db)):
+            """État de la surveillance continue (séries suivies, observations, alertes)"""
+            return anomaly_monitor.status(db)
+
+
 # Instance du service technique
 technical_api_service = TechnicalAPIService()
@@ -0,0 +1,60 @@
+
+# Reconstruction des modèles temporels V4 depuis leurs poids ; les architectures
+# sont celles de l'entraînement (assets/addon/models_V4.py)
+
+import torch.nn as nn
+from typing import Dict, Optional
+
+from ..assets.addon.models_V4 import NBEATSModel, TCNNModel, TimeSeriesModel, TransformerTSModel
+
+
+def _count_indexed(state: Dict, prefix: str) -> int:
+    """Nombre de sous-modules `prefix.N.` présents dans un state_dict"""
+    idx = {k[len(prefix):].split('.')[0] for k in state if k.startswith(prefix)}
+    return len([i for i in idx if i.isdigit()])
+
+def build_from_state_dict(state: Dict, params: Optional[Dict] = None) -> nn.Module:
+    """Reconstruire un modèle V4 à partir de son state_dict.
+
+    Les dimensions sont déduites des poids ; `params` (best_params du fichier
+    de métriques) fournit ce qui ne se lit pas dans les poids : le dropout et
+    le nombre de têtes du TransformerTS.
+    """
+    params = params or {}
+    if 'rnn.weight_ih_l0' in state:
+        hid   = state['rnn.weight_hh_l0'].shape[1]
+        gates = state['rnn.weight_ih_l0'].shape[0] // hid
+        rnn_type = {4: "LSTM", 3: "GRU"}.get(gates, "RNN")
+        nl = len([k for k in state if k.startswith('rnn.weight_ih_l')])
+        model = TimeSeriesModel(rnn_type,
+                                state['rnn.weight_ih_l0'].shape[1],
+                                hid, nl,
+                                float(params.get('dropout', 0.0)) if nl > 1 else 0.0,
+                                state['proj.weight'].shape[0])
+    elif 'conv1.weight' in state:
+        model = TCNNModel(state['conv1.weight'].shape[1], state['fc.weight'].shape[0])
+    elif 'blocks.0.net.0.weight' in state:
+        first = state['blocks.0.net.0.weight']
+        last  = state['blocks.0.net.4.weight']
+        model = NBEATSModel(first.shape[1], last.shape[0],
+                            params.get('stack_types'),
+                            _count_indexed(state, 'blocks.'), first.shape[0])
+    elif 'input_proj.weight' in state:
+        if 'n_heads' not in params:
+            raise ValueError("n_heads introuvable : best_params requis pour un TransformerTS")
+        model = TransformerTSModel(
+            None,
+            state['input_proj.weight'].shape[1],
+            d_model=state['input_proj.weight'].shape[0],
+            n_heads=int(params['n_heads']),
+            num_layers=_count_indexed(state, 'transformer.layers.'),
+            dim_feedforward=state['transformer.layers.0.linear1.weight'].shape[0],
+            dropout=float(params.get('dropout', 0.0)),
+            output_window=state['output_proj.weight'].shape[0]
+        )
+    else:
+        raise ValueError("Architecture non reconnue dans le state_dict")
+
+    model.load_state_dict(state)
+    model.eval()
+    return model
@@ -3,17 +3,26 @@ import torch
 import torch.nn as nn
 import numpy as np
 import pandas as pd
+from contextlib import contextmanager
+from statistics import NormalDist
 from typing import List, Dict, Tuple, Optional
 from datetime import date, timedelta
 from pathlib import Path
+import copy
+import json
 import pickle
 import os
 import logging
 
+from ..prometheus import MODEL_LOAD_DURATION, model_labels
+
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# retards de la cible ajoutés aux variables par prepare_data_V4 (features.lags de config_V4.yaml)
+V4_LAGS = (1, 7)
+
 class SimpleGRU(nn.Module):
     """Modèle GRU simple pour la reconstruction"""
     def __init__(self, input_size=5, hidden_size=64, num_layers=2, output_size=1):
@@ -47,12 +56,49 @@ class TemporalPredictionService:
         self.sequence_length = 30  # 30 jours d'historique
         
     def load_model(self, country: str, model_type: str = "GRU"):
-        """Charger un modèle temporel pour un pays donné"""
+        """Charger un modèle temporel pour un pays donné : modèle V4 (model_registry) si ses poids
+        et ses données préparées le permettent, sinon ancien format, sinon simulation"""
         cache_key = f"{country}_{model_type}"
         
         if cache_key in self.models_cache:
             return self.models_cache[cache_key]
         
+        model_data = self._load_v4(country, model_type)
+        if model_data is not None:
+            self.models_cache[cache_key] = model_data
+            return model_data
+        
+        with MODEL_LOAD_DURATION.labels(*model_labels(country, model_type)).time():
+            return self._load_model(country, model_type, cache_key)
+    
+    def _load_v4(self, country: str, model_type: str) -> Optional[Dict]:
+        """Modèle V4 reconstruit par load_temporal_bundle, avec les scalers de ses données préparées ;
+        None sans poids V4 exploitables"""
+        from .model_registry import load_temporal_bundle
+        
+        try:
+            bundle = load_temporal_bundle(country, model_type)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Poids {country}_{model_type} non reconnus comme modèle V4: {e}")
+            return None
+        prepared = bundle['prepared'] or {}
+        if prepared.get('input_scaler') is None or prepared.get('target_scaler') is None:
+            logger.warning(f"Pas de données préparées V4 (scalers) pour {country}, modèle {model_type} ignoré")
+            return None
+        window = prepared['X'].shape[1] if 'X' in prepared else self.sequence_length
+        return {
+            'model': bundle['model'],
+            'preprocessor': None,
+            'scaler_params': None,
+            'has_real_model': True,
+            'v4': {'input_scaler': prepared['input_scaler'], 'target_scaler': prepared['target_scaler'],
+                   'input_window': window},
+        }
+    
+    def _load_model(self, country: str, model_type: str, cache_key: str):
+        """Chargement depuis les fichiers, résultat mis en cache sous `cache_key`"""
         # Rechercher les fichiers modèle et preprocesseur
         model_pattern = f"{country}_{model_type}_*.pth"
         prep_pattern = f"{country}_prepared_*.pkl"
@@ -265,6 +311,39 @@ class TemporalPredictionService:
         
         return predictions
     
+    def _rollout(self, model, input_sequence, prediction_horizon):
+        """Prédiction autorégressive de toutes les lignes d'un lot : une passe avant par jour.
+
+        input_sequence : [lot, jours, variables] ; retourne un tableau [lot, horizon].
+        """
+        predictions = []
+        current_sequence = input_sequence.clone()
+        
+        with torch.no_grad():
+            for i in range(prediction_horizon):
+                output = model(current_sequence)
+                
+                # Extraire la prédiction de chaque ligne du lot
+                if not isinstance(output, torch.Tensor):
+                    raise TypeError(f"Output inattendu: {type(output)}")
+                if len(output.shape) == 2:  # [batch, features]
+                    next_pred = output[:, 0]
+                else:
+                    next_pred = output.reshape(current_sequence.shape[0], -1)[:, 0]
+                
+                # Dénormaliser si nécessaire (approximation simple)
+                next_pred = torch.where(next_pred.abs() < 10, next_pred * 100 + 50, next_pred)
+                predictions.append(torch.clamp(torch.round(next_pred.abs()), min=1))
+                
+                # Mettre à jour la séquence pour la prochaine prédiction
+                new_entry = torch.zeros(current_sequence.shape[0], 1, current_sequence.shape[2])
+                new_entry[:, 0, 0] = next_pred / 100.0  # Renormaliser
+                
+                # Faire glisser la fenêtre temporelle
+                current_sequence = torch.cat([current_sequence[:, 1:, :], new_entry], dim=1)
+        
+        return torch.stack(predictions, dim=1).numpy()
+    
     def predict_with_real_model(self, model_data, input_sequence, prediction_horizon):
         """Prédiction avec un vrai modèle PyTorch"""
         model = model_data['model']
@@ -274,47 +353,10 @@ class TemporalPredictionService:
             return None
         
         try:
-            predictions = []
-            current_sequence = input_sequence.clone()
-            
             logger.info(f"Utilisation du modèle: {type(model)}")
             logger.info(f"Modèle en mode eval: {not model.training}")
             
-            with torch.no_grad():
-                for i in range(prediction_horizon):
-                    logger.info(f"Prédiction jour {i+1}, input shape: {current_sequence.shape}")
-                    
-                    # Prédiction
-                    output = model(current_sequence)
-                    logger.info(f"Output shape: {output.shape}, type: {type(output)}")
-                    
-                    # Extraire la prédiction
-                    if isinstance(output, torch.Tensor):
-                        if len(output.shape) == 2:  # [batch, features]
-                            next_pred = output[0, 0].item()
-                        elif len(output.shape) == 1:  # [features]
-                            next_pred = output[0].item()
-                        else:
-                            next_pred = output.item()
-                    else:
-                        logger.error(f"Output inattendu: {type(output)}")
-                        return None
-                    
-                    # Dénormaliser si nécessaire (approximation simple)
-                    if abs(next_pred) < 10:  # Probablement normalisé
-                        next_pred = next_pred * 100 + 50  # Approximation de dénormalisation
-                    
-                    predicted_value = max(1, int(round(abs(next_pred))))
-                    predictions.append(predicted_value)
-                    
-                    logger.info(f"Prédiction brute: {next_pred:.3f}, valeur finale: {predicted_value}")
-                    
-                    # Mettre à jour la séquence pour la prochaine prédiction
-                    new_entry = torch.zeros(1, 1, current_sequence.shape[2])
-                    new_entry[0, 0, 0] = next_pred / 100.0  # Renormaliser
-                    
-                    # Faire glisser la fenêtre temporelle
-                    current_sequence = torch.cat([current_sequence[:, 1:, :], new_entry], dim=1)
+            predictions = [int(value) for value in self._rollout(model, input_sequence, prediction_horizon)[0]]
             
             logger.info(f"Prédictions du modèle réel: {predictions}")
             return predictions
@@ -325,20 +367,168 @@ class TemporalPredictionService:
             traceback.print_exc()
             return None
     
+    def v4_inputs(self, raw: np.ndarray, dates: pd.DatetimeIndex, v4: Dict) -> torch.Tensor:
+        """Fenêtres [lot, input_window, variables] construites comme prepare_data_V4 : cible en log1p,
+        jour de la semaine et mois en sin/cos, retards t-1 / t-7 de la cible brute, puis RobustScaler.
+        Un retard antérieur au début de l'historique reprend son premier jour.
+
+        raw : [lot, jours, variables de `feature_names`] en valeurs brutes, `dates` de ces jours.
+        """
+        cases = np.maximum(raw[:, :, 0], 0)
+        lags = [np.concatenate([np.repeat(cases[:, :1], lag, axis=1), cases[:, :-lag]], axis=1)
+                for lag in V4_LAGS]
+        calendar = np.column_stack([
+            np.sin(2 * np.pi * dates.dayofweek / 7), np.cos(2 * np.pi * dates.dayofweek / 7),
+            np.sin(2 * np.pi * dates.month / 12), np.cos(2 * np.pi * dates.month / 12),
+        ])
+        features = np.concatenate([
+            np.log1p(cases)[..., None],
+            raw[:, :, 1:],
+            np.broadcast_to(calendar, cases.shape + (calendar.shape[1],)),
+            np.stack(lags, axis=-1),
+        ], axis=-1)[:, -v4['input_window']:]
+        scaled = v4['input_scaler'].transform(features.reshape(-1, features.shape[-1]))
+        return torch.tensor(scaled.reshape(features.shape), dtype=torch.float32)
+    
+    def v4_rollout(self, model, v4: Dict, raw: np.ndarray, dates: pd.DatetimeIndex,
+                   prediction_horizon: int) -> np.ndarray:
+        """Cas prédits [lot, horizon] par un modèle V4, qui donne output_window jours par passe ;
+        au-delà, la fenêtre est prolongée des cas prédits (autres variables du dernier jour reconduites)"""
+        blocks = []
+        done = 0
+        with torch.no_grad():
+            while done < prediction_horizon:
+                scaled = model(self.v4_inputs(raw, dates, v4)).numpy()
+                # convention V4 : cible en log1p puis RobustScaler
+                cases = np.expm1(v4['target_scaler'].inverse_transform(scaled.reshape(-1, 1)))
+                cases = np.maximum(0, cases.reshape(scaled.shape)[:, :prediction_horizon - done])
+                blocks.append(cases)
+                done += cases.shape[1]
+                if done < prediction_horizon:
+                    extension = np.repeat(raw[:, -1:, :], cases.shape[1], axis=1)
+                    extension[:, :, 0] = cases
+                    raw = np.concatenate([raw, extension], axis=1)
+                    dates = dates.append(pd.date_range(dates[-1] + timedelta(days=1), periods=cases.shape[1]))
+        return np.concatenate(blocks, axis=1)
+    
+    @staticmethod
+    def has_dropout(model) -> bool:
+        """Au moins une couche de dropout non nulle : sans elle, les tirages MC dropout sont identiques"""
+        for module in model.modules():
+            if isinstance(module, nn.modules.dropout._DropoutNd) and module.p > 0:
+                return True
+            if isinstance(module, nn.RNNBase) and module.num_layers > 1 and module.dropout > 0:
+                return True
+        return False
+    
+    @contextmanager
+    def _dropout_active(self, model):
+        """Copie du modèle avec le dropout actif (mode entraînement) sauf pour les couches de
+        normalisation. Le modèle en cache est partagé par les requêtes concurrentes (threads,
+        workers préforkés) : il reste en eval, ses prévisions ponctuelles ne voient jamais le dropout"""
+        sampler = copy.deepcopy(model)
+        sampler.train()
+        for module in sampler.modules():
+            if isinstance(module, nn.modules.batchnorm._BatchNorm):
+                module.eval()
+        yield sampler
+    
+    def mc_dropout_samples(self, model, rollout, samples: int = 50):
+        """K trajectoires avec dropout actif : `rollout(modèle, K)` répète la fenêtre d'entrée
+        K fois dans un seul lot, soit une passe avant par pas au lieu de K × horizon"""
+        with self._dropout_active(model) as sampler:
+            return rollout(sampler, samples)
+    
+    @staticmethod
+    def quantile_bands(samples: np.ndarray, level: float = 0.9) -> Dict[str, List[float]]:
+        """Bornes inférieure / supérieure et médiane de chaque jour, calculées sur tout le lot"""
+        alpha = (1 - level) / 2
+        lower, median, upper = np.quantile(samples, [alpha, 0.5, 1 - alpha], axis=0)
+        return {
+            'lower': [round(float(v), 2) for v in lower],
+            'median': [round(float(v), 2) for v in median],
+            'upper': [round(float(v), 2) for v in upper],
+        }
+    
+    def residual_std(self, country: str, model_type: str) -> Optional[List[float]]:
+        """STD_ERR par horizon (t+1, t+2, ...) du dernier *_evaluation_summary.json (evaluate_model_V4),
+        cherché à côté des poids puis dans TEMPORAL_METRICS_DIR"""
+        from .model_registry import evaluation_summaries
+
+        for path in evaluation_summaries():
+            try:
+                with open(path, "r") as f:
+                    entry = json.load(f).get(f"{country}_{model_type}")
+            except (OSError, ValueError) as e:
+                logger.warning(f"Résumé d'évaluation illisible {path}: {e}")
+                continue
+            if entry and entry.get('by_horizon'):
+                horizons = sorted(entry['by_horizon'], key=lambda h: int(h.split('+')[-1]))
+                return [float(entry['by_horizon'][h]['STD_ERR']) for h in horizons]
+        return None
+    
+    def residual_bands(self, predictions: List[int], std_err: List[float], level: float = 0.9):
+        """Prédiction ± z × STD_ERR de l'horizon (dernier horizon évalué au-delà)"""
+        z = NormalDist().inv_cdf(0.5 + level / 2)
+        std = np.array([std_err[min(i, len(std_err) - 1)] for i in range(len(predictions))])
+        center = np.array(predictions, dtype=float)
+        return {
+            'lower': [round(float(v), 2) for v in np.maximum(0, center - z * std)],
+            'upper': [round(float(v), 2) for v in center + z * std],
+        }
+    
+    def confidence_interval(self, country: str, model_type: str, model, rollout,
+                            predictions: List[int], uncertainty: Optional[str], samples: int, level: float):
+        """Intervalle demandé ; None si la méthode n'est pas applicable, et toujours pour une
+        prédiction simulée (`model` None) : aucun intervalle n'en dit quelque chose"""
+        if uncertainty is None:
+            return None
+        if model is None:
+            logger.info(f"Prédiction simulée pour {country}_{model_type} : pas d'intervalle {uncertainty}")
+            return None
+        if uncertainty == "residual":
+            std_err = self.residual_std(country, model_type)
+            if std_err is None:
+                logger.info(f"Pas de STD_ERR d'évaluation pour {country}_{model_type}")
+                return None
+            return self.residual_bands(predictions, std_err, level)
+        if uncertainty == "mc_dropout":
+            if not self.has_dropout(model):
+                logger.info(f"Modèle {country}_{model_type} sans dropout (taux absent des métriques "
+                            f"d'entraînement ?) : pas d'intervalle MC dropout")
+                return None
+            try:
+                return self.quantile_bands(self.mc_dropout_samples(model, rollout, samples), level)
+            except Exception as e:
+                logger.error(f"Erreur MC dropout: {e}")
+                return None
+        return None
+    
     def predict(self, country: str, historical_data: Dict, 
-                model_type: str = "GRU", prediction_horizon: int = 7):
-        """Effectuer une prédiction temporelle"""
+                model_type: str = "GRU", prediction_horizon: int = 7,
+                uncertainty: Optional[str] = None, mc_samples: int = 50, confidence_level: float = 0.9):
+        """Effectuer une prédiction temporelle, avec un intervalle de confiance si `uncertainty`
+        (mc_dropout ou residual) est donné"""
         
         logger.info(f"Début prédiction pour {country}, modèle {model_type}, horizon {prediction_horizon}")
         
         # Charger le modèle
         model_data = self.load_model(country, model_type)
-        
-        # Vérifier si on a un vrai modèle
-        if not model_data['has_real_model'] or model_data['model'] is None:
-            logger.info(f"Utilisation de la prédiction simulée pour {country}")
-            predictions = self.simulate_prediction(historical_data, prediction_horizon)
-        else:
+        model = model_data['model'] if model_data['has_real_model'] else None
+        rollout = None
+        predictions = None
+        
+        if model is not None and model_data.get('v4'):
+            logger.info(f"Prédiction avec le modèle V4 pour {country}")
+            raw = np.asarray([historical_data[name] for name in self.feature_names], dtype=float).T[None]
+            dates = pd.DatetimeIndex(pd.to_datetime(historical_data['dates']))
+            rollout = lambda m, k: self.v4_rollout(m, model_data['v4'], np.repeat(raw, k, axis=0), dates,
+                                                   prediction_horizon)
+            try:
+                predictions = [int(round(value)) for value in rollout(model, 1)[0]]
+            except Exception as e:
+                logger.exception(f"Erreur lors de la prédiction avec le modèle V4: {e}")
+        elif model is not None:
             logger.info(f"Tentative de prédiction avec le modèle réel pour {country}")
             
             # Préprocesser les données
@@ -347,14 +537,17 @@ class TemporalPredictionService:
                 model_data['preprocessor'], 
                 model_data['scaler_params']
             )
-            
-            # Essayer la prédiction avec le modèle réel
+            rollout = lambda m, k: self._rollout(m, input_sequence.expand(k, -1, -1), prediction_horizon)
             predictions = self.predict_with_real_model(model_data, input_sequence, prediction_horizon)
-            
-            # Si ça échoue, fallback vers simulation
-            if predictions is None:
-                logger.warning("Échec de la prédiction avec le modèle, utilisation de la simulation")
-                predictions = self.simulate_prediction(historical_data, prediction_horizon)
+        
+        if predictions is None:
+            # pas de modèle, ou échec du modèle : simulation, sans intervalle
+            logger.info(f"Utilisation de la prédiction simulée pour {country}")
+            predictions = self.simulate_prediction(historical_data, prediction_horizon)
+            model = None
+        
+        confidence_interval = self.confidence_interval(
+            country, model_type, model, rollout, predictions, uncertainty, mc_samples, confidence_level)
         
         # Générer les dates de prédiction
         last_date = pd.to_datetime(historical_data['dates'][-1])
@@ -369,7 +562,7 @@ class TemporalPredictionService:
         return {
             'predictions': predictions,
             'prediction_dates': prediction_dates,
-            'confidence_interval': None,
+            'confidence_interval': confidence_interval,
             'metrics': {'mse': 0.0, 'mae': 0.0}
         }
     
@@ -0,0 +1,168 @@
+
+# Profilage des requêtes SQL : requêtes par requête HTTP, journal des requêtes lentes
+#
+#   - chaque requête SQL émise pendant une requête HTTP est comptée et chronométrée
+#     pour la route courante ; la route est ajoutée en commentaire à l'instruction
+#     (`/* route=GET /pays/{item_id} */`), visible dans le slow log MySQL et
+#     SHOW PROCESSLIST ;
+#   - au-delà de SQL_SLOW_QUERY_MS, l'instruction est journalisée avec ses
+#     paramètres et son plan (EXPLAIN) ;
+#   - en mode debug (SQL_PROFILER_HEADERS=true), les réponses portent
+#     X-DB-Queries (nombre d'instructions) et X-DB-Time (ms) ;
+#   - `query_budget(n)` échoue si un bloc de code exécute plus de n instructions :
+#
+#       with query_budget(3):
+#           client.put("/pays/1", json=...)
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import List, Optional
+import logging
+import os
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "200"))
+TAG_STATEMENTS = os.getenv("SQL_TAG_STATEMENTS", "true").lower() == "true"
+DEBUG_HEADERS = os.getenv("SQL_PROFILER_HEADERS", "false").lower() == "true"
+
+
+@dataclass
+class RequestProfile:
+    scope: dict
+    queries: int = 0
+    time: float = 0.0   # secondes
+
+    @property
+    def template(self) -> Optional[str]:
+        """Modèle de chemin de la route trouvée (ex. "/pays/{item_id}"), None avant le routage"""
+        return getattr(self.scope.get("route"), "path", None)
+
+    @property
+    def route(self) -> str:
+        return f"{self.scope['method']} {self.template or self.scope['path']}"
+
+
+# profil de la requête HTTP en cours ; copié dans le thread des endpoints synchrones
+_current: ContextVar[Optional[RequestProfile]] = ContextVar("sql_profile", default=None)
+
+
+@dataclass
+class _Budget:
+    statements: List[str] = field(default_factory=list)
+
+
+_budgets: List[_Budget] = []
+_budgets_lock = threading.Lock()
+
+
+def _explain(dialect: str, cursor, statement: str, parameters) -> List[str]:
+    """Plan de l'instruction, sur un nouveau curseur de la même connexion DBAPI"""
+    explain = cursor.connection.cursor()
+    try:
+        explain.execute(("EXPLAIN QUERY PLAN " if dialect == "sqlite" else "EXPLAIN ") + statement, parameters)
+        columns = [column[0] for column in explain.description or ()]
+        if dialect == "sqlite":
+            return [row[3] for row in explain.fetchall()]
+        return [", ".join(f"{name}={value}" for name, value in zip(columns, row) if value is not None)
+                for row in explain.fetchall()]
+    finally:
+        explain.close()
+
+
+@event.listens_for(Engine, "before_cursor_execute", retval=True)
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("sql_profiler_start", []).append(time.perf_counter())
+    profile = _current.get()
+    # pas pour executemany : pymysql ne regroupe plus les INSERT multi-lignes après un commentaire ;
+    # seulement le modèle de la route, jamais le chemin brut envoyé par le client
+    if TAG_STATEMENTS and profile is not None and profile.template and not executemany:
+        statement = f"{statement} /* route={profile.scope['method']} {profile.template} */"
+    return statement, parameters
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("sql_profiler_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    profile = _current.get()
+    if profile is not None:
+        profile.queries += 1
+        profile.time += elapsed
+    if _budgets:
+        with _budgets_lock:
+            for budget in _budgets:
+                budget.statements.append(statement)
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        plan: List[str] = []
+        if statement.lstrip().upper().startswith("SELECT") and not executemany:
+            try:
+                plan = _explain(conn.dialect.name, cursor, statement, parameters)
+            except Exception as e:
+                plan = [f"EXPLAIN impossible: {e}"]
+        logger.warning(
+            f"Requête SQL lente ({elapsed * 1000:.1f} ms, route {profile.route if profile else '-'}): "
+            f"{statement} | paramètres: {parameters!r}" + "".join(f"\n    {line}" for line in plan)
+        )
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(max_queries: int):
+    """Échoue (QueryBudgetExceeded) si le bloc exécute plus de `max_queries` instructions SQL,
+    tous threads confondus (l'application d'un TestClient tourne dans un autre thread)"""
+    budget = _Budget()
+    with _budgets_lock:
+        _budgets.append(budget)
+    try:
+        yield budget
+    finally:
+        with _budgets_lock:
+            _budgets.remove(budget)
+    if len(budget.statements) > max_queries:
+        listing = "\n".join(f"  {i}. {statement}" for i, statement in enumerate(budget.statements, 1))
+        raise QueryBudgetExceeded(
+            f"{len(budget.statements)} requêtes SQL pour un budget de {max_queries} :\n{listing}")
+
+
+class SQLProfilerMiddleware:
+    """Middleware ASGI : ouvre le profil de chaque requête HTTP ; avec `headers=True`,
+    ajoute X-DB-Queries / X-DB-Time (instructions exécutées avant l'envoi des en-têtes)"""
+
+    def __init__(self, app, headers: bool = DEBUG_HEADERS):
+        self.app = app
+        self.headers = headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope)
+        token = _current.set(profile)
+
+        async def wrapped_send(message):
+            if self.headers and message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = [
+                    *message["headers"],
+                    (b"x-db-queries", str(profile.queries).encode()),
+                    (b"x-db-time", f"{profile.time * 1000:.2f}".encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, wrapped_send)
+        finally:
+            _current.reset(token)
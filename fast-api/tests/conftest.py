@@ -0,0 +1,26 @@
+# Base SQLite en mémoire (schéma des modèles et données de référence de
+# `python -m API.migrations explain --sqlite`) branchée sur l'application
+# avant son import : aucun MySQL nécessaire.
+
+import pytest
+
+from API import database
+from API.migrations.__main__ import _engine
+
+engine = _engine(True)
+database.engine = engine
+database.SessionLocal.configure(bind=engine)
+
+
+@pytest.fixture(scope="session")
+def sqlite_engine():
+    return engine
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from API.main import API
+
+    # sans `with` : pas de lifespan (préchargement des modèles, file des métriques)
+    return TestClient(API)
@@ -0,0 +1,42 @@
+# Routes /…/graph : nombre de requêtes SQL fixe quel que soit le nombre de
+# parents (budgets de query_plans.QUERY_BUDGETS), avec ou sans barre finale
+
+import pytest
+
+from API.migrations.query_plans import QUERY_BUDGETS
+from API.sql_profiler import query_budget
+
+
+@pytest.mark.parametrize("path, budget", [
+    ("/maladies/graph/", QUERY_BUDGETS["get_maladies_graph"]),
+    ("/maladies/graph", QUERY_BUDGETS["get_maladies_graph"]),
+    ("/maladies/1/graph", QUERY_BUDGETS["get_maladies_graph.one"]),
+    ("/pays/graph/", QUERY_BUDGETS["get_pays_graph"]),
+    ("/pays/graph", QUERY_BUDGETS["get_pays_graph"]),
+    ("/pays/1/graph", QUERY_BUDGETS["get_pays_graph"]),
+    ("/continents/graph/", QUERY_BUDGETS["get_continents_graph"]),
+    ("/continents/graph", QUERY_BUDGETS["get_continents_graph"]),
+])
+def test_graph_route_within_budget(client, path, budget):
+    with query_budget(budget):
+        response = client.get(path)
+    assert response.status_code == 200
+
+
+def test_maladies_graph_nested(client):
+    maladies = {m["nomMaladie"]: m for m in client.get("/maladies/graph").json()}
+    assert [v["nomVariant"] for v in maladies["covid"]["variants"]] == ["alpha", "delta"]
+    assert sorted(s["nomSymptome"] for s in maladies["covid"]["variants"][0]["symptomes"]) == ["fièvre", "toux"]
+    assert [t["natureTraitement"] for t in maladies["mpox"]["traitements"]] == ["vaccin"]
+
+
+def test_continents_graph_nested(client):
+    (europe,) = client.get("/continents/graph/").json()
+    regions = {p["nomPays"]: sorted(r["codeEtat"] for r in p["regions"]) for p in europe["pays"]}
+    assert regions == {"Suisse": ["GE", "VD"], "France": ["BRE"]}
+
+
+def test_pays_graph_filter_and_missing(client):
+    assert {p["nomPays"] for p in client.get("/pays/graph/", params={"idContinent": 2}).json()} == set()
+    assert client.get("/pays/99/graph").status_code == 404
+    assert client.get("/maladies/99/graph").status_code == 404
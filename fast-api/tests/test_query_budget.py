@@ -0,0 +1,58 @@
+# Routes CRUD génériques sous sql_profiler.query_budget : une liste ou une
+# lecture en une requête, une écriture sans rechargement ligne par ligne,
+# une lecture servie par le cache de référence sans aucune requête
+
+import pytest
+
+from API.http_cache import reference_cache
+from API.sql_profiler import QueryBudgetExceeded, query_budget
+
+REFERENCE = ("pays", "regions", "maladies", "variants", "continents", "symptomes")
+
+PAYS = {"isoPays": "CHE", "nomPays": "Suisse", "populationTotale": 8700000, "latitudePays": "46.80",
+        "longitudePays": "8.23", "Superficie": "41285.00", "densitePopulation": "210.7", "idContinent": 1}
+
+
+@pytest.fixture(autouse=True)
+def empty_reference_cache():
+    reference_cache.invalidate(*REFERENCE)
+
+
+@pytest.mark.parametrize("path", ["/pays/", "/pays/1", "/regions/", "/maladies/", "/variants/", "/continents/",
+                                  "/releves/"])
+def test_read_in_one_query(client, path):
+    with query_budget(1) as budget:
+        response = client.get(path)
+    assert response.status_code == 200
+    assert len(budget.statements) == 1
+
+
+def test_cached_read_without_query(client):
+    client.get("/pays/1")
+    with query_budget(0):
+        response = client.get("/pays/1")
+    assert response.status_code == 200
+
+
+def test_update_within_budget(client):
+    with query_budget(3):
+        response = client.put("/pays/1", json=PAYS)
+    assert response.status_code == 200
+    assert response.json()["populationTotale"] == PAYS["populationTotale"]
+
+
+def test_create_and_delete_within_budget(client):
+    with query_budget(2):
+        created = client.post("/symptomes/", json={"nomSymptome": "céphalée"}).json()
+    with query_budget(3):
+        response = client.delete(f"/symptomes/{created['idSymptome']}")
+    assert response.status_code == 200
+    assert client.get(f"/symptomes/{created['idSymptome']}").status_code == 404
+
+
+def test_budget_exceeded_lists_statements(client):
+    with pytest.raises(QueryBudgetExceeded, match="2 requêtes SQL pour un budget de 1") as excinfo:
+        with query_budget(1):
+            client.get("/pays/1")
+            client.get("/regions/")
+    assert "/* route=GET /pays/{item_id} */" in str(excinfo.value)
@@ -0,0 +1,29 @@
+# Plans EXPLAIN des requêtes de l'API comparés à l'instantané SQLite
+# (API/migrations/query_plans.json, régénéré par `explain --sqlite --update`)
+
+import pytest
+
+from API.migrations import query_plans, upgrade
+
+
+@pytest.fixture(scope="module")
+def plans(sqlite_engine):
+    upgrade(sqlite_engine)
+    return query_plans.collect(sqlite_engine)
+
+
+def test_query_plans_match_snapshot(sqlite_engine, plans):
+    assert query_plans.check(sqlite_engine, plans) == []
+
+
+def test_full_scan_is_reported(sqlite_engine, plans):
+    name = next(name for name in plans if name not in query_plans.FULL_SCAN_ALLOWED)
+    changed = dict(plans, **{name: plans[name] + ["SCAN Releve"]})
+    problems = query_plans.check(sqlite_engine, changed)
+    assert any(problem.startswith(f"{name} : parcours complet") for problem in problems)
+
+
+def test_query_budget_is_reported(sqlite_engine, plans):
+    changed = dict(plans, get_pays_graph=plans["get_pays_graph"] + ["--", "SCAN Regions"])
+    problems = query_plans.check(sqlite_engine, changed)
+    assert "get_pays_graph : 3 requêtes pour un budget de 2" in problems
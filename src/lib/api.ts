@@ -154,6 +154,9 @@ export const auth = {
 export const maladies = {
   getAll: () => api.get('/maladies/'),
   getById: (id: number) => api.get(`/maladies/${id}`),
+  // maladies avec variants, symptômes et traitements en un seul appel
+  getGraph: () => api.get('/maladies/graph/'),
+  getGraphById: (id: number) => api.get(`/maladies/${id}/graph`),
   create: (data: { nomMaladie: string }) => api.post('/maladies/', data),
   update: (id: number, data: { nomMaladie: string }) => api.put(`/maladies/${id}`, data),
   delete: (id: number) => api.delete(`/maladies/${id}`),
@@ -164,6 +167,9 @@ export const pays = {
   getAll: () => api.get('/pays/'),
   getById: (id: number) => api.get(`/pays/${id}`),
   getByNom: (nom: string) => api.get(`/pays/nom/${nom}`),
+  // pays avec continent et régions en un seul appel
+  getGraph: (idContinent?: number) => api.get('/pays/graph/', { params: { idContinent } }),
+  getGraphById: (id: number) => api.get(`/pays/${id}/graph`),
   create: (data: any) => api.post('/pays/', data),
   update: (id: number, data: any) => api.put(`/pays/${id}`, data),
   delete: (id: number) => api.delete(`/pays/${id}`),
@@ -233,9 +239,22 @@ export const predictions = {
       dates: string[];
     };
     prediction_horizon: number;
+    uncertainty?: 'mc_dropout' | 'residual';
+    mc_samples?: number;
+    confidence_level?: number;
   }) => api.post('/prediction/temporal/', data),
 
   getTemporalModels: () => api.get('/prediction/temporal/models/'),
+
+  // output=rows : texte NDJSON (une ligne JSON par scénario) ; output=surface : objet JSON
+  sweepScenarios: (data: {
+    target: 'tauxMortalite' | 'nbHospitalisation';
+    pays: string;
+    fixed?: Record<string, number>;
+    ranges: Record<string, { values: number[] } | { start: number; stop: number; steps: number }>;
+    output?: 'rows' | 'surface';
+    surface_axes?: string[];
+  }) => api.post('/prediction/scenarios/', data, data.output === 'surface' ? {} : { responseType: 'text' }),
 };
 
 export default api;